@@ -1,4 +1,4 @@
-from typing import Any, Collection, Type, Optional
+from typing import Any, Collection, List, Sequence, Tuple, Type, Optional
 
 class ExType:
     def __init__(self,
@@ -6,14 +6,17 @@ class ExType:
         *,
         val_range: Optional[Collection[int]] = None,
         len_range: Optional[Collection[int]] = None,
+        other_types: Sequence[Type] = (),
     ) -> None:
         self.basetype = basetype
         self.val_range = val_range
         self.len_range = len_range
+        # The accepted types (such as int for float, converted by the database)
+        self.types:Tuple[Type, ...] = (basetype, *other_types)
 
     def is_valid(self, val:Any) -> bool:
         return (
-            isinstance(val, self.basetype)
+            isinstance(val, self.types)
             and (self.val_range is None or val in self.val_range)
             and (self.len_range is None or len(val) in self.len_range)
         )
@@ -22,6 +25,32 @@ class ExType:
         if not self.is_valid(val):
             raise TypeError('The given value is not valid.')
 
+    def invalid_indexes(self, vals:Sequence[Any]) -> List[int]:
+        """ Get the indexes of the invalid values in the given values
+            The values are checked in batch (the type set, and the min/max of the values
+            and the lengths), and checked one by one only if the batch check fails.
+        """
+        if not all(issubclass(t, self.types) for t in set(map(type, vals))):
+            return [i for i, val in enumerate(vals) if not self.is_valid(val)]
+
+        invalids = set()
+        if self.val_range is not None and not _all_in(vals, self.val_range):
+            invalids.update(i for i, val in enumerate(vals) if val not in self.val_range)
+        if self.len_range is not None:
+            lens = list(map(len, vals))
+            if not _all_in(lens, self.len_range):
+                invalids.update(i for i, l in enumerate(lens) if l not in self.len_range)
+        return sorted(invalids)
+
+
+def _all_in(vals:Sequence[Any], collection:Collection[Any]) -> bool:
+    """ Check if all values are in the collection (by the min/max for the range) """
+    if not vals:
+        return True
+    if isinstance(collection, range) and collection.step == 1:
+        return collection.start <= min(vals) and max(vals) < collection.stop
+    return all(val in collection for val in vals)
+
 
 class RangedType(ExType):
     def __init__(self, basetype:Type, val_range:Collection[int]):
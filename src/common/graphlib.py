@@ -7,7 +7,7 @@ Edges = Dict[Optional[Node], Set[Node]]
 class Graph:
     def __init__(self, edges:Edges):
         self._edges = edges
-        self.roots:Set[Node] = set(n for n in edges.keys() if n is not None) - set(chain(nodes for key, nodes in edges.items() if key is not None))
+        self.roots:Set[Node] = set(n for n in edges.keys() if n is not None) - set(chain.from_iterable(nodes for key, nodes in edges.items() if key is not None))
 
 
     def edges(self, node:Node) -> Set[Node]:
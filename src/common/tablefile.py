@@ -0,0 +1,332 @@
+"""
+    common.tablefile - Compact columnar binary format of the tables
+
+    Layout (all integers are little-endian):
+        magic `b'TBLC'`, version (u16), header length (u32), header (JSON),
+        and the column sections (aligned to 8 bytes).
+    The header has the number of rows, and the name, the kind and the sections
+    (the offset and the length in the file) of each column:
+        'nulls'   - the null bitmap (empty if the column has no NULL)
+        'data'    - int64/float64/uint8 array, the concatenated UTF-8 or bytes,
+                    or the pickled values (the kind 'pickle')
+        'offsets' - int64 array of the start/end offsets of the values (for 'str' and 'bytes')
+    so that a column is loaded without touching the sections of the other columns,
+    and the numeric arrays are used from the mmap without copying.
+"""
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Sequence, Type, Union
+import array
+import datetime
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+from common.tablelib import Table
+
+MAGIC = b'TBLC'
+VERSION = 1
+
+_preamble = struct.Struct('<4sHI')
+
+_epoch = datetime.datetime(1970, 1, 1)
+
+# The kinds of the columns, and the python types stored as the kinds
+_kind_types:Dict[str, Type] = {
+    'bool': bool,
+    'int': int,
+    'float': float,
+    'str': str,
+    'bytes': bytes,
+    'datetime': datetime.datetime,
+    'date': datetime.date,
+    'time': datetime.time,
+}
+
+_int64_range = range(-(2 ** 63), 2 ** 63)
+
+
+def _kind_of(vals:Sequence[Any], basetype:Optional[Type]) -> str:
+    """ Choose the kind of the column by the type (if given) or the values """
+    types = {type(v) for v in vals if v is not None}
+    if basetype is not None:
+        types.add(basetype)
+    if types <= {bytes, bytearray, memoryview}:
+        return 'bytes' if types else 'pickle'
+    if len(types) != 1:
+        return 'pickle'
+    t = types.pop()
+    for kind, kind_type in _kind_types.items():
+        if t is kind_type:
+            if kind == 'int' and vals and not _in_int64(vals):
+                return 'pickle'
+            if kind in ('datetime', 'time') and any(v is not None and v.tzinfo is not None for v in vals):
+                return 'pickle'
+            return kind
+    return 'pickle'
+
+
+def _in_int64(vals:Sequence[Any]) -> bool:
+    vals = [v for v in vals if v is not None]
+    return not vals or (_int64_range.start <= min(vals) and max(vals) < _int64_range.stop)
+
+
+def _int64_array(vals:Iterable[int]) -> bytes:
+    a = array.array('q', vals)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes()
+
+
+def _datetime_micros(v:datetime.datetime) -> int:
+    d = v - _epoch
+    return (d.days * 86400 + d.seconds) * 1000000 + d.microseconds
+
+
+def _time_micros(v:datetime.time) -> int:
+    return ((v.hour * 60 + v.minute) * 60 + v.second) * 1000000 + v.microsecond
+
+
+def _encode_column(kind:str, vals:Sequence[Any]) -> Dict[str, bytes]:
+    """ Encode the values of a column into the sections """
+    nulls = b''
+    if None in vals:
+        bits = bytearray((len(vals) + 7) // 8)
+        for i, v in enumerate(vals):
+            if v is None:
+                bits[i >> 3] |= 1 << (i & 7)
+        nulls = bytes(bits)
+
+    if kind == 'pickle':
+        return {'nulls': b'', 'data': pickle.dumps(list(vals), pickle.HIGHEST_PROTOCOL)}
+
+    if kind in ('str', 'bytes'):
+        blobs = [
+            b'' if v is None else (v.encode() if kind == 'str' else bytes(v))
+            for v in vals
+        ]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return {'nulls': nulls, 'data': b''.join(blobs), 'offsets': _int64_array(offsets)}
+
+    if kind == 'float':
+        a = array.array('d', (0.0 if v is None else v for v in vals))
+        if sys.byteorder != 'little':
+            a.byteswap()
+        return {'nulls': nulls, 'data': a.tobytes()}
+
+    if kind == 'bool':
+        return {'nulls': nulls, 'data': bytes(bool(v) for v in vals)}
+
+    to_int = {
+        'int': int,
+        'date': datetime.date.toordinal,
+        'datetime': _datetime_micros,
+        'time': _time_micros,
+    }[kind]
+    return {'nulls': nulls, 'data': _int64_array(0 if v is None else to_int(v) for v in vals)}
+
+
+def dump(
+    table:Table,
+    fp:BinaryIO,
+    *,
+    types:Optional[Sequence[Optional[Type]]] = None,
+) -> int:
+    """ Write the table into the binary file object in the columnar format
+        `types` are the python types of the columns (such as the basetypes of the column
+        datatypes), which are inferred from the values if not given (or None).
+        Returns the number of the bytes written.
+    """
+    columns = table.to_columns()
+    if types is None:
+        types = [None] * len(table.column_names)
+
+    sections:List[bytes] = []
+    column_headers = []
+    offset = 0
+    for name, basetype in zip(table.column_names, types):
+        vals = columns[name]
+        kind = _kind_of(vals, basetype)
+        column_header:Dict[str, Any] = {'name': name, 'kind': kind}
+        for section_name, section in _encode_column(kind, vals).items():
+            column_header[section_name] = [offset, len(section)]
+            padding = -len(section) % 8
+            sections.append(section + b'\0' * padding)
+            offset += len(section) + padding
+        if kind == 'str':
+            column_header['ascii'] = all(v is None or v.isascii() for v in vals)
+        column_headers.append(column_header)
+
+    header = json.dumps({'rows': len(table), 'columns': column_headers}, separators=(',', ':')).encode()
+    header += b' ' * (-(_preamble.size + len(header)) % 8)
+    fp.write(_preamble.pack(MAGIC, VERSION, len(header)))
+    fp.write(header)
+    for section in sections:
+        fp.write(section)
+    return _preamble.size + len(header) + offset
+
+
+def dumps(table:Table, *, types:Optional[Sequence[Optional[Type]]] = None) -> bytes:
+    """ Serialize the table into the bytes in the columnar format (See `dump`) """
+    buf = io.BytesIO()
+    dump(table, buf, types=types)
+    return buf.getvalue()
+
+
+class TableFile:
+    """ The columnar table data (in the bytes or the mmap), loaded column by column """
+
+    def __init__(self, buffer:Any) -> None:
+        self.buffer = memoryview(buffer)
+        if len(self.buffer) < _preamble.size:
+            raise RuntimeError('Not a table file (too short).')
+        magic, version, header_len = _preamble.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise RuntimeError('Not a table file (wrong magic).')
+        if version > VERSION:
+            raise RuntimeError('Unsupported table file version {} (supported up to {}).'.format(version, VERSION))
+        self.version = version
+        header = json.loads(bytes(self.buffer[_preamble.size:_preamble.size + header_len]))
+        self.n_rows:int = header['rows']
+        self.column_headers:Dict[str, Dict[str, Any]] = {c['name']: c for c in header['columns']}
+        self.column_names:List[str] = [c['name'] for c in header['columns']]
+        self.data_offset = _preamble.size + header_len
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def _section(self, column_header:Dict[str, Any], name:str) -> memoryview:
+        offset, length = column_header.get(name, (0, 0))
+        return self.buffer[self.data_offset + offset:self.data_offset + offset + length]
+
+    def _int64s(self, section:memoryview) -> Sequence[int]:
+        if sys.byteorder == 'little':
+            return section.cast('q') # Zero-copy
+        a = array.array('q', section)
+        a.byteswap()
+        return a
+
+    def kind(self, name:str) -> str:
+        """ Get the kind of the column """
+        return self._column_header(name)['kind']
+
+    def _column_header(self, name:str) -> Dict[str, Any]:
+        try:
+            return self.column_headers[name]
+        except KeyError:
+            raise RuntimeError('Column `{}` not found.'.format(name))
+
+    def raw_column(self, name:str) -> Optional[Sequence[Any]]:
+        """ Get the array of the int / float column without NULLs as the view of the buffer
+            (without copying), or None for the other columns
+        """
+        column_header = self._column_header(name)
+        if column_header['kind'] not in ('int', 'float') or len(self._section(column_header, 'nulls')):
+            return None
+        data = self._section(column_header, 'data')
+        if column_header['kind'] == 'int':
+            return self._int64s(data)
+        return self._floats(data)
+
+    def column(self, name:str) -> List[Any]:
+        """ Get the values of the column (only the sections of the column are read) """
+        column_header = self._column_header(name)
+        kind = column_header['kind']
+        data = self._section(column_header, 'data')
+
+        if kind == 'pickle':
+            return pickle.loads(data)
+
+        if kind in ('str', 'bytes'):
+            offsets = self._int64s(self._section(column_header, 'offsets'))
+            if kind == 'str' and column_header.get('ascii'):
+                text = str(data, 'ascii') # The byte offsets are the same as the char offsets
+                vals:List[Any] = [text[offsets[i]:offsets[i + 1]] for i in range(self.n_rows)]
+            else:
+                blob = bytes(data)
+                vals = [blob[offsets[i]:offsets[i + 1]] for i in range(self.n_rows)]
+                if kind == 'str':
+                    vals = [v.decode() for v in vals]
+        elif kind == 'float':
+            vals = list(self._floats(data))
+        elif kind == 'bool':
+            vals = [b != 0 for b in data]
+        else:
+            ints = self._int64s(data)
+            if kind == 'int':
+                vals = list(ints)
+            elif kind == 'date':
+                vals = [datetime.date.fromordinal(v) if v else None for v in ints]
+            elif kind == 'datetime':
+                vals = [_epoch + datetime.timedelta(microseconds=v) for v in ints]
+            else:
+                vals = [_micros_time(v) for v in ints]
+
+        nulls = self._section(column_header, 'nulls')
+        if len(nulls):
+            for i in range(self.n_rows):
+                if nulls[i >> 3] & (1 << (i & 7)):
+                    vals[i] = None
+        return vals
+
+    def _floats(self, section:memoryview) -> Sequence[float]:
+        if sys.byteorder == 'little':
+            return section.cast('d')
+        a = array.array('d', section)
+        a.byteswap()
+        return a
+
+    def to_columns(self, column_names:Optional[Sequence[str]] = None) -> Dict[str, List[Any]]:
+        """ Get the columnar values of the given columns (all columns by default) """
+        if column_names is None:
+            column_names = self.column_names
+        return {name: self.column(name) for name in column_names}
+
+    def to_table(self, column_names:Optional[Sequence[str]] = None) -> Table:
+        """ Load the given columns (all columns by default) into the table """
+        if column_names is None:
+            column_names = self.column_names
+        columns = [self.column(name) for name in column_names]
+        return Table(list(column_names), map(list, zip(*columns)) if columns else ([] for _ in range(self.n_rows)))
+
+    def close(self) -> None:
+        """ Release the buffer (and the mmap) """
+        obj = self.buffer.obj
+        self.buffer.release()
+        if isinstance(obj, mmap.mmap):
+            obj.close()
+
+    def __enter__(self) -> 'TableFile':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def _micros_time(v:int) -> datetime.time:
+    seconds, micros = divmod(v, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return datetime.time(hour, minute, second, micros)
+
+
+def open_file(path:Union[str, os.PathLike]) -> TableFile:
+    """ Open the table file by mmap (The columns are read from the pages on demand) """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        buffer = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else b''
+    return TableFile(buffer)
+
+
+def loads(data:Any, column_names:Optional[Sequence[str]] = None) -> Table:
+    """ Deserialize the given columns (all columns by default) of the bytes into the table """
+    return TableFile(data).to_table(column_names)
+
+
+def load(path:Union[str, os.PathLike], column_names:Optional[Sequence[str]] = None) -> Table:
+    """ Load the given columns (all columns by default) of the table file into the table """
+    with open_file(path) as table_file:
+        return table_file.to_table(column_names)
@@ -1,4 +1,8 @@
-from typing import Dict, Iterable, Iterator, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Type, Union
+from bisect import bisect_left, bisect_right
+import keyword
+
+ColumnNames = Union[str, Sequence[str]]
 
 class Table:
     def __init__(self, column_names:List[str], rows:Iterable[List]) -> None:
@@ -6,17 +10,327 @@ class Table:
         self.column_name_to_index = {name: i for i, name in enumerate(self.column_names)}
         if len(self.column_names) != len(self.column_name_to_index):
             raise RuntimeError('There are columns of the same name.')
-        self.rows = rows
+        self.rows = list(rows)
+        self.record_class = record_class(self.column_names)
+        self._hash_indexes:Dict[Tuple[str, ...], HashIndex] = {}
+        self._sorted_indexes:Dict[Tuple[str, ...], SortedIndex] = {}
+
+    def __iter__(self) -> Iterator['RecordBase']:
+        return map(self.record_class, self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i:int) -> 'RecordBase':
+        return self.record_class(self.rows[i])
+
+    def column_values(self, column_name:str) -> List[Any]:
+        """ Get the values of the column """
+        ci = self.column_name_to_index[column_name]
+        return [row[ci] for row in self.rows]
+
+    def to_columns(self) -> Dict[str, List[Any]]:
+        """ Get the columnar values (the column name to the values of the column) """
+        if not self.rows:
+            return {name: [] for name in self.column_names}
+        return {name: list(vals) for name, vals in zip(self.column_names, zip(*self.rows))}
+
+
+    ## ---- mutation methods ---- ##
+
+    def append(self, row:Sequence) -> None:
+        """ Append a row (The indexes are dropped) """
+        self.rows.append(row)
+        self.invalidate_indexes()
+
+    def extend(self, rows:Iterable[Sequence]) -> None:
+        """ Append rows (The indexes are dropped) """
+        self.rows.extend(rows)
+        self.invalidate_indexes()
+
+    def clear(self) -> None:
+        """ Remove all rows (The indexes are dropped) """
+        self.rows.clear()
+        self.invalidate_indexes()
+
+    def invalidate_indexes(self) -> None:
+        """ Drop the built indexes
+            Call this after modifying `self.rows` directly.
+        """
+        self._hash_indexes.clear()
+        self._sorted_indexes.clear()
+
+
+    ## ---- index methods ---- ##
+
+    def column_indexes(self, column_names:ColumnNames) -> Tuple[int, ...]:
+        """ Get the indexes of the given column name(s) """
+        if isinstance(column_names, str):
+            column_names = (column_names,)
+        try:
+            return tuple(self.column_name_to_index[name] for name in column_names)
+        except KeyError as err:
+            raise RuntimeError('Column `{}` not found.'.format(err.args[0]))
+
+    def hash_index(self, column_names:ColumnNames) -> 'HashIndex':
+        """ Get the hash index on the given column(s) (built on the first use) """
+        key = self._index_key(column_names)
+        if key not in self._hash_indexes:
+            self._hash_indexes[key] = HashIndex(self.rows, self.column_indexes(key))
+        return self._hash_indexes[key]
+
+    def sorted_index(self, column_names:ColumnNames) -> 'SortedIndex':
+        """ Get the sorted index on the given column(s) (built on the first use) """
+        key = self._index_key(column_names)
+        if key not in self._sorted_indexes:
+            self._sorted_indexes[key] = SortedIndex(self.rows, self.column_indexes(key))
+        return self._sorted_indexes[key]
+
+    def lookup(self, column_names:ColumnNames, value:Any) -> 'TableView':
+        """ Get the rows whose column value(s) equal to the given value
+            (Give a tuple of values for multiple columns)
+        """
+        return TableView(self, self.hash_index(column_names).positions(value))
+
+    def range(self,
+        column_names:ColumnNames,
+        low:Any = None,
+        high:Any = None,
+        *,
+        include_low:bool = True,
+        include_high:bool = False,
+    ) -> 'TableView':
+        """ Get the rows whose column value(s) are in the given range in sorted order
+            (`low` or `high` of None means unbounded)
+        """
+        return TableView(self, self.sorted_index(column_names).positions(
+            low, high, include_low=include_low, include_high=include_high))
+
+    @staticmethod
+    def _index_key(column_names:ColumnNames) -> Tuple[str, ...]:
+        if isinstance(column_names, str):
+            return (column_names,)
+        return tuple(column_names)
+
+
+class TableView:
+    """ A view of the specific rows in the table (without copying rows) """
+
+    def __init__(self, table:Table, positions:Sequence[int]) -> None:
+        self.table = table
+        self.positions = positions
+
+    def __iter__(self) -> Iterator['RecordBase']:
+        rows = self.table.rows
+        return map(self.table.record_class, (rows[i] for i in self.positions))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, i:int) -> 'RecordBase':
+        return self.table.record_class(self.table.rows[self.positions[i]])
+
+    @property
+    def rows(self) -> List[Sequence]:
+        """ Get the raw rows in this view """
+        rows = self.table.rows
+        return [rows[i] for i in self.positions]
+
+
+def _key_getter(column_indexes:Tuple[int, ...]) -> Callable[[Sequence], Any]:
+    if len(column_indexes) == 1:
+        ci = column_indexes[0]
+        return lambda row: row[ci]
+    return lambda row: tuple(row[ci] for ci in column_indexes)
+
+
+class HashIndex:
+    """ Hash index for the equality lookup """
+
+    def __init__(self, rows:Sequence[Sequence], column_indexes:Tuple[int, ...]) -> None:
+        self.column_indexes = column_indexes
+        self.key_positions:Dict[Any, List[int]] = {}
+        get_key = _key_getter(column_indexes)
+        for i, row in enumerate(rows):
+            key = get_key(row)
+            if key in self.key_positions:
+                self.key_positions[key].append(i)
+            else:
+                self.key_positions[key] = [i]
+
+    def positions(self, key:Any) -> List[int]:
+        """ Get the row positions of the given key """
+        return self.key_positions.get(key, [])
+
+    def __contains__(self, key:Any) -> bool:
+        return key in self.key_positions
+
+
+class SortedIndex:
+    """ Sorted index for the range lookup (The rows which have NULL keys are excluded) """
+
+    def __init__(self, rows:Sequence[Sequence], column_indexes:Tuple[int, ...]) -> None:
+        self.column_indexes = column_indexes
+        get_key = _key_getter(column_indexes)
+        if len(column_indexes) == 1:
+            is_null = lambda key: key is None
+        else:
+            is_null = lambda key: None in key
+        key_positions = sorted(
+            (item for item in ((get_key(row), i) for i, row in enumerate(rows)) if not is_null(item[0])),
+            key=lambda item: item[0],
+        )
+        self.keys = [key for key, _ in key_positions]
+        self.row_positions = [i for _, i in key_positions]
+
+    def positions(self,
+        low:Any = None,
+        high:Any = None,
+        *,
+        include_low:bool = True,
+        include_high:bool = False,
+    ) -> List[int]:
+        """ Get the row positions of the keys in the given range in sorted order """
+        begin = 0 if low is None else (
+            bisect_left(self.keys, low) if include_low else bisect_right(self.keys, low))
+        end = len(self.keys) if high is None else (
+            bisect_right(self.keys, high) if include_high else bisect_left(self.keys, high))
+        return self.row_positions[begin:end]
+
+
+_tuple_getitem = tuple.__getitem__
+
+
+class RecordBase(tuple):
+    """ Base class of the generated record classes (see `record_class`)
+
+        A record is a tuple of the column values, so it can be unpacked,
+        compared and indexed like a tuple.
+        In addition, a column value can be got by the column name
+        (`record.value('Item.name')`) or by the attribute (`record.Item.name`).
+        The column name as the index (`record['Item.name']`) is also accepted
+        for the compatibility with the former `Record` class.
+    """
+    __slots__ = ()
+
+    _fields:Tuple[str, ...] = ()
+    _field_to_index:Dict[str, int] = {}
+
+    def __new__(cls, row:Iterable):
+        return tuple.__new__(cls, row)
+
+    def __getitem__(self, key):
+        if type(key) is str:
+            return _tuple_getitem(self, self._field_to_index[key])
+        return _tuple_getitem(self, key)
+
+    def value(self, column_name:str) -> Any:
+        """ Get the column value by the column name """
+        return _tuple_getitem(self, self._field_to_index[column_name])
+
+    def __repr__(self) -> str:
+        return type(self).__name__ + '(' + ', '.join(
+            name + '=' + repr(val) for name, val in zip(self._fields, self)
+        ) + ')'
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Get a dict of column name to the column value """
+        return dict(zip(self._fields, self))
+
+
+class RecordPath:
+    """ Base class of the attribute-access nodes for the dotted column names
+        (For example, the `record.Item.group` part of `record.Item.group.name`)
+    """
+    __slots__ = ('_record',)
+
+    def __init__(self, record:RecordBase) -> None:
+        self._record = record
+
+    def __repr__(self) -> str:
+        return type(self).__name__ + '(' + repr(self._record) + ')'
+
+
+_record_classes:Dict[Tuple[str, ...], Type[RecordBase]] = {}
+
+def record_class(column_names:Sequence[str]) -> Type[RecordBase]:
+    """ Get the record class for the given column names (result shape)
+        The classes are generated once per shape and cached.
+    """
+    key = tuple(column_names)
+    if key not in _record_classes:
+        _record_classes[key] = _make_record_class(key)
+    return _record_classes[key]
+
+
+def _is_attr_name(name:str) -> bool:
+    return name.isidentifier() and not keyword.iskeyword(name) and not name.startswith('_')
+
+
+def _same(obj:Any) -> Any:
+    return obj
+
+
+def _value_getter(i:int) -> Callable[[RecordBase], Any]:
+    return lambda record: _tuple_getitem(record, i)
+
+
+def _path_value_getter(i:int) -> Callable[[RecordPath], Any]:
+    return lambda path: _tuple_getitem(path._record, i)
+
+
+def _path_getter(path_class:Type[RecordPath]) -> Callable[[Any], RecordPath]:
+    return lambda obj: path_class(obj if isinstance(obj, RecordBase) else obj._record)
+
+
+def _make_attrs(tree:Dict[str, Any], name:str, in_path:bool) -> Dict[str, Any]:
+    """ Make the attribute properties from the tree of the dotted column names
+        (The leaf of the tree is the column index)
+        The attributes of a prefix are merged into the current node if their names are not
+        taken, and the prefix attribute returns the node itself (no path object is allocated,
+        such as `record.Item` of the columns of a table). Otherwise the prefix attribute
+        returns a new path object.
+        If a name is both of a column and a prefix of the other columns,
+        the attribute refers to the prefix (the column is still available by `record.value(name)`).
+    """
+    attrs:Dict[str, Any] = {'__slots__': ()}
+    taken = set(tree)
+    entries = list(tree.items())
+    for attr_name, sub in entries: # (The merged entries are appended)
+        if isinstance(sub, dict):
+            if taken.isdisjoint(sub):
+                attrs[attr_name] = property(_same)
+                taken.update(sub)
+                entries.extend(sub.items())
+                continue
+            sub_attrs = _make_attrs(sub, name + '_' + attr_name, True)
+            path_class = type(name + '_' + attr_name, (RecordPath,), sub_attrs)
+            attrs[attr_name] = property(_path_getter(path_class))
+        else:
+            attrs[attr_name] = property(_path_value_getter(sub) if in_path else _value_getter(sub))
+    return attrs
 
-    def __iter__(self) -> Iterator['Record']:
-        return (Record(self.column_name_to_index, row) for row in self.rows)
 
+def _make_record_class(column_names:Tuple[str, ...]) -> Type[RecordBase]:
+    """ Generate a new record class for the given column names """
+    field_to_index = {name: i for i, name in enumerate(column_names)}
+    if len(field_to_index) != len(column_names):
+        raise RuntimeError('There are columns of the same name.')
 
-class Record:
-    def __init__(self, column_name_to_index:Dict[str, int], row:List) -> None:
-        self.column_name_to_index = column_name_to_index
-        self.row = row
-    
-    def __getitem__(self, column_name:str):
-        return self.row[self.column_name_to_index[column_name]]
+    tree:Dict[str, Any] = {}
+    for i, name in enumerate(column_names):
+        attr_names = name.split('.')
+        if not all(map(_is_attr_name, attr_names)):
+            continue # Available only by the index or `record.value(name)`
+        node = tree
+        for attr_name in attr_names[:-1]:
+            if not isinstance(node.get(attr_name), dict):
+                node[attr_name] = {}
+            node = node[attr_name]
+        if attr_names[-1] not in node:
+            node[attr_names[-1]] = i
 
+    attrs = _make_attrs(tree, 'Record', False)
+    attrs['_fields'] = column_names
+    attrs['_field_to_index'] = field_to_index
+    return type('Record', (RecordBase,), attrs)
@@ -0,0 +1,234 @@
+"""
+    sql.advisor - Index advisor from the recorded workload of the selects
+
+    The workload is the profile of the executed selects: the columns used in the
+    equality / range conditions, the joins, ORDER BY and GROUP BY, per query shape
+    (the same shape is merged with the counts and the times). It is recorded at runtime
+    (`db.workload = Workload()`) and saved into a JSON file, and the advisor recommends
+    the indexes missing in the `Table` definitions from it (also offline).
+"""
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
+import json
+import os
+import threading
+from sql.expression import OpExpr, Value, Values
+from sql.objects import ColumnExpr, Database, Index, Table
+from sql.stats import RANGE_OPS, column_and_value, conjuncts
+
+VERSION = 1
+
+# A column in the workload: (table name, column name)
+ColumnKey = Tuple[str, str]
+
+
+class QueryShape:
+    """ Profile of the selects of the same shape """
+
+    def __init__(self,
+        equality:Sequence[ColumnKey] = (),
+        range:Sequence[ColumnKey] = (),
+        joins:Sequence[ColumnKey] = (),
+        order:Sequence[ColumnKey] = (),
+        group:Sequence[ColumnKey] = (),
+        count:int = 0,
+        seconds:float = 0.0,
+    ) -> None:
+        self.equality = [tuple(c) for c in equality] # Columns compared by =, IN, IS NULL
+        self.range = [tuple(c) for c in range] # Columns compared by <, >, LIKE 'prefix%', ...
+        self.joins = [tuple(c) for c in joins] # Columns looked up by the joins
+        self.order = [tuple(c) for c in order]
+        self.group = [tuple(c) for c in group]
+        self.count = count
+        self.seconds = seconds
+
+    def key(self) -> Tuple:
+        return (tuple(self.equality), tuple(self.range), tuple(self.joins), tuple(self.order), tuple(self.group))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'equality': self.equality, 'range': self.range, 'joins': self.joins,
+            'order': self.order, 'group': self.group, 'count': self.count, 'seconds': self.seconds,
+        }
+
+    @classmethod
+    def from_json(cls, obj:Dict[str, Any]) -> 'QueryShape':
+        return cls(**obj)
+
+    @classmethod
+    def of_select(cls, select) -> 'QueryShape':
+        """ Get the shape of the select """
+        shape = cls()
+        for expr in conjuncts(select.where_expr):
+            if not isinstance(expr, OpExpr):
+                continue
+            op = expr.op.upper()
+            column, other, _ = column_and_value(expr)
+            if column is None or isinstance(other, ColumnExpr):
+                continue
+            key = (column.table.name, column.name)
+            if op in ('=', '<=>') or (op == 'IN' and isinstance(other, Values)) or (
+                    op == 'IS' and isinstance(other, Value) and other.v is None):
+                shape.equality.append(key)
+            elif op in RANGE_OPS or (op == 'LIKE' and isinstance(other, Value)
+                    and isinstance(other.v, str) and other.v[:1] not in ('%', '_')):
+                shape.range.append(key)
+
+        for column_connections in select.table_joins().values():
+            for _, column_to in column_connections:
+                shape.joins.append((column_to.entity().table.name, column_to.entity().name))
+
+        if select.order_exprs:
+            shape.order = [
+                (expr.entity().table.name, expr.entity().name)
+                for expr, _ in select.order_exprs if isinstance(expr, ColumnExpr)
+            ]
+        if select.group_exprs:
+            shape.group = [
+                (expr.entity().table.name, expr.entity().name)
+                for expr in select.group_exprs if isinstance(expr, ColumnExpr)
+            ]
+        return shape
+
+
+class Workload:
+    """ The recorded workload (thread-safe) """
+
+    def __init__(self, shapes:Iterable[QueryShape] = ()) -> None:
+        self.shapes:Dict[Tuple, QueryShape] = {}
+        self._lock = threading.Lock()
+        for shape in shapes:
+            self._merge(shape)
+
+    def _merge(self, shape:QueryShape) -> None:
+        key = shape.key()
+        if key in self.shapes:
+            self.shapes[key].count += shape.count
+            self.shapes[key].seconds += shape.seconds
+        else:
+            self.shapes[key] = shape
+
+    def record(self, select, seconds:float) -> None:
+        """ Record the executed select (called by `Select` if `db.workload` is set) """
+        shape = QueryShape.of_select(select)
+        shape.count, shape.seconds = 1, seconds
+        with self._lock:
+            self._merge(shape)
+
+    def save(self, path:Union[str, os.PathLike]) -> None:
+        """ Save the workload into the JSON file (replaced atomically) """
+        with self._lock:
+            shapes = [shape.to_json() for shape in self.shapes.values()]
+        tmp_path = os.fspath(path) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': VERSION, 'shapes': shapes}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, *paths:Union[str, os.PathLike]) -> 'Workload':
+        """ Load the workload from the JSON files (merged) """
+        workload = cls()
+        for path in paths:
+            with open(path, 'r') as f:
+                obj = json.load(f)
+            if obj.get('version', 0) > VERSION:
+                raise RuntimeError('Unsupported workload file version {}.'.format(obj.get('version')))
+            for shape in obj['shapes']:
+                workload._merge(QueryShape.from_json(shape))
+        return workload
+
+
+class IndexRecommendation:
+    """ A recommended index """
+
+    def __init__(self, table:Table, column_names:List[str], benefit:float, queries:int) -> None:
+        self.table = table
+        self.column_names = column_names
+        self.benefit = benefit # Estimated benefit (the seconds, or the count if not timed)
+        self.queries = queries # Number of the recorded selects using this index
+
+    def index(self) -> Index:
+        """ Get the index declaration (for `Table(..., indexes=[...])`) """
+        return Index(*self.column_names)._set_table(self.table)
+
+    def declaration(self) -> str:
+        """ Get the python code of the index declaration in the table definition """
+        return 'Index({})'.format(', '.join(map(repr, self.column_names)))
+
+    def ddl(self, dialect:str = 'mysql') -> str:
+        """ Get the DDL to create the index ('mysql' or 'sqlite') """
+        index = self.index()
+        if dialect == 'sqlite':
+            return 'CREATE INDEX "{}_{}" ON "{}" ({})'.format(
+                self.table.name, index.name, self.table.name,
+                ', '.join('"{}"'.format(name) for name in self.column_names))
+        if dialect != 'mysql':
+            raise RuntimeError('Unknown dialect `{}`.'.format(dialect))
+        return 'ALTER TABLE `{}` ADD {}'.format(self.table.name, index.creation_sql().query_text())
+
+    def __repr__(self) -> str:
+        return 'IndexRecommendation({}{}, benefit={:.3f}, queries={})'.format(
+            self.table.name, self.column_names, self.benefit, self.queries)
+
+
+def _existing_indexes(table:Table) -> List[List[str]]:
+    """ Get the column names of the indexes in the table definition """
+    indexes = [[table.key_column.name]]
+    indexes.extend([column.name] for column in table.columns if column.is_unique)
+    indexes.extend(index.column_names() for index in table.indexes)
+    return indexes
+
+
+def _candidates(shape:QueryShape) -> Iterable[Tuple[str, List[str]]]:
+    """ Get the candidate indexes (table name, column names) for the shape
+        (The equality columns first, then a range column or the ORDER BY / GROUP BY columns)
+    """
+    tables = dict.fromkeys(t for t, _ in shape.equality + shape.range + shape.order + shape.group)
+    for table_name in tables:
+        columns = list(dict.fromkeys(c for t, c in shape.equality if t == table_name))
+        ranges = [c for t, c in shape.range if t == table_name]
+        sorts = shape.order or shape.group
+        if ranges:
+            columns.append(ranges[0])
+        elif sorts and all(t == table_name for t, _ in sorts):
+            columns.extend(c for _, c in sorts if c not in columns)
+        if columns:
+            yield table_name, columns
+    for table_name, column_name in dict.fromkeys(shape.joins):
+        yield table_name, [column_name]
+
+
+def advise(db:Database, workload:Workload, *, max_columns:int = 4) -> List[IndexRecommendation]:
+    """ Recommend the indexes missing in the table definitions, ranked by the estimated benefit """
+    benefits:Dict[Tuple[str, Tuple[str, ...]], List[float]] = {}
+    for shape in workload.shapes.values():
+        weight = shape.seconds if shape.seconds > 0 else float(shape.count)
+        for table_name, columns in _candidates(shape):
+            if not db.table_exists(table_name):
+                continue
+            key = (table_name, tuple(columns[:max_columns]))
+            entry = benefits.setdefault(key, [0.0, 0])
+            entry[0] += weight
+            entry[1] += shape.count
+
+    # Drop the candidates covered by the existing indexes, or by the other candidates (the prefixes)
+    recommendations:List[IndexRecommendation] = []
+    for (table_name, columns), (benefit, queries) in benefits.items():
+        table = db.table(table_name)
+        if any(list(columns) == existing[:len(columns)] for existing in _existing_indexes(table)):
+            continue
+        covering = [
+            other for (other_table, other), _ in benefits.items()
+            if other_table == table_name and len(other) > len(columns) and other[:len(columns)] == columns
+        ]
+        if covering:
+            longest = max(covering, key=lambda other: (len(other), benefits[(table_name, other)][0]))
+            benefits[(table_name, longest)][0] += benefit
+            benefits[(table_name, longest)][1] += queries
+            continue
+        recommendations.append(IndexRecommendation(table, list(columns), 0.0, 0))
+
+    for recommendation in recommendations:
+        benefit, queries = benefits[(recommendation.table.name, tuple(recommendation.column_names))]
+        recommendation.benefit, recommendation.queries = benefit, int(queries)
+    recommendations.sort(key=lambda r: -r.benefit)
+    return recommendations
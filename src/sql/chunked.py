@@ -0,0 +1,152 @@
+"""
+    sql.chunked - Bulk UPDATE / DELETE in the chunks of the primary key ranges
+
+    The primary key is walked in the ranges of `chunk_size` rows (the bounds are found by
+    the index of the primary key), and the statement is executed and committed per range,
+    so that the locks and the undo logs are bounded by a chunk. The chunks are throttled by
+    the sleep, the measured latency (the chunk size is adapted to `target_seconds`) and the
+    lag callback (such as the replication lag), and the progress can be resumed from the
+    last key of an interrupted run.
+    The table requires the single-column primary key of a comparable type (the number,
+    string, binary, or date / time types), whose order is walked.
+"""
+from typing import Any, Callable, Dict, Optional, Sequence
+import datetime
+import decimal
+import time
+from sql.datatypes import DataType
+from sql.expression import ExprLike, Query, to_expr
+from sql.objects import Column, Table
+
+# The types of the key values which can be walked in the ranges
+COMPARABLE_KEY_TYPES = (int, float, decimal.Decimal, str, bytes, datetime.date, datetime.time, datetime.timedelta)
+
+
+class ChunkProgress:
+    """ Progress of the chunked statement (passed to the progress callback after each chunk) """
+
+    def __init__(self, table:Table, start_after:Any, end_key:Any) -> None:
+        self.table = table
+        self.start_after = start_after # The key the run started after (None from the first)
+        self.last_key = start_after # The last key of the committed chunks (to resume after)
+        self.end_key = end_key # The last key to process (the maximum key at the start)
+        self.chunks = 0
+        self.rows = 0 # Affected rows
+        self.chunk_size = 0 # Size of the last chunk
+        self.chunk_seconds = 0.0 # Time of the last chunk
+        self.seconds = 0.0 # Total time of the chunks (without the sleeps)
+        self.done = False
+
+    def resume_options(self) -> Dict[str, Any]:
+        """ Get the options to resume the interrupted run (for `run_chunked`) """
+        return {'start_after': self.last_key, 'end_key': self.end_key}
+
+    def __repr__(self) -> str:
+        return 'ChunkProgress({}, chunks={}, rows={}, last_key={}{})'.format(
+            self.table.name, self.chunks, self.rows, repr(self.last_key), ', done' if self.done else '')
+
+
+def _chunk_key(table:Table) -> Column:
+    """ Get the key column to walk (the single-column primary key of a comparable type) """
+    key = getattr(table, 'key_column', None)
+    if key is None:
+        raise RuntimeError('Table `{}` has no single-column primary key to walk in the chunks.'.format(table.name))
+    datatype = key.datatype
+    if isinstance(datatype, DataType) and (
+            datatype.needs_index_prefix() or not issubclass(datatype.pytype.basetype, COMPARABLE_KEY_TYPES)):
+        raise RuntimeError('Primary key `{}` of table `{}` is not of a comparable type to walk in the chunks.'.format(
+            key.name, table.name))
+    return key
+
+
+def _upper_bound(table:Table, key:Column, lower:Any, end_key:Any, chunk_size:int) -> Any:
+    """ Get the key `chunk_size` rows after `lower` (or `end_key` if fewer rows remain)
+        (`key` is the single-column primary key of a comparable type, by `_chunk_key`,
+        so that the rows are ordered and bounded by the index of the key)
+    """
+    rows = table.db.execute(Query(
+        'SELECT', key, 'FROM', table, 'WHERE',
+        Query(key, '> %s AND') if lower is not None else None, key, '<= %s',
+        'ORDER BY', key, 'LIMIT 1 OFFSET %s'
+    ), ([lower] if lower is not None else []) + [end_key, chunk_size - 1])
+    return rows[0][0] if rows else end_key
+
+
+def run_chunked(
+    table:Table,
+    statement:Query,
+    params:Optional[Sequence[Any]],
+    where:Optional[ExprLike],
+    *,
+    chunk_size:int = 1000,
+    start_after:Any = None,
+    end_key:Any = None,
+    sleep:float = 0.0,
+    target_seconds:Optional[float] = None,
+    min_chunk_size:int = 10,
+    max_chunk_size:int = 100000,
+    lag:Optional[Callable[[], float]] = None,
+    max_lag:float = 1.0,
+    lag_interval:float = 1.0,
+    progress:Optional[Callable[[ChunkProgress], Any]] = None,
+) -> ChunkProgress:
+    """ Execute the UPDATE / DELETE statement (without WHERE) with the condition `where`
+        in the chunks of the primary key ranges, committing each chunk
+        Options:
+            chunk_size     - Rows of the key range of a chunk
+            start_after    - Start after this key (to resume the interrupted run)
+            end_key        - The last key to process (the maximum key at the start by default,
+                             not to chase the rows inserted during the run)
+            sleep          - Seconds to sleep between the chunks
+            target_seconds - Adapt the chunk size so that a chunk takes about this time
+                             (within `min_chunk_size` and `max_chunk_size`)
+            lag            - Callback to get the current lag (such as the replication lag in seconds),
+                             the next chunk waits (by `lag_interval`) until it is within `max_lag`
+            progress       - Callback called with the progress after each chunk
+    """
+    db = table.db
+    key = _chunk_key(table)
+    if end_key is None:
+        rows = db.execute(Query('SELECT MAX(', key, ') FROM', table))
+        end_key = rows[0][0] if rows else None
+    result = ChunkProgress(table, start_after, end_key)
+    if end_key is None or (start_after is not None and start_after >= end_key):
+        result.done = True
+        return result
+
+    where_query = Query('AND', to_expr(where)) if where is not None else None
+    while True:
+        if lag is not None:
+            while lag() > max_lag:
+                time.sleep(lag_interval)
+
+        start = time.perf_counter()
+        lower = result.last_key
+        upper = _upper_bound(table, key, lower, end_key, chunk_size)
+        affected = db.execute_affected(Query(
+            statement, 'WHERE',
+            Query(key, '> %s AND') if lower is not None else None, key, '<= %s',
+            where_query,
+        ), list(params or []) + ([lower] if lower is not None else []) + [upper])
+        db.table_modified(table)
+        db.commit()
+        seconds = time.perf_counter() - start
+
+        result.chunks += 1
+        result.rows += max(affected, 0)
+        result.last_key = upper
+        result.chunk_size = chunk_size
+        result.chunk_seconds = seconds
+        result.seconds += seconds
+        result.done = upper >= end_key
+        if progress is not None:
+            progress(result)
+        if result.done:
+            return result
+
+        if target_seconds is not None and seconds > 0:
+            # Adapt gradually (at most twice or half per chunk), not to follow a single outlier
+            factor = min(max(target_seconds / seconds, 0.5), 2.0)
+            chunk_size = min(max(int(chunk_size * factor), min_chunk_size), max_chunk_size)
+        if sleep > 0:
+            time.sleep(sleep)
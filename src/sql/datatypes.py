@@ -1,15 +1,197 @@
 """
     sql.datatypes - The definitions of data types in the database system
 """
-from typing import Collection
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Type, Union
 import datetime
+import decimal
+import functools
 from common.extype import ExType, RangedType, LenLimitedType
 
+# Converter of a value into the query parameter (None means no conversion)
+ParamConverter = Optional[Callable[[Any], Any]]
+
+# Decoder of a raw result value (bytes) into the python value
+ResultDecoder = Callable[[Any], Any]
+
+# Decoder of a text value (such as a CSV field) into the python value
+TextDecoder = Callable[[str], Any]
+
+# Encoder of a python value into the exported value
+ValueEncoder = Callable[[Any], Any]
+
 class DataType:
     """ The type of data in the database system """
-    def __init__(self, dbtype:str, pytype:ExType):
+    def __init__(self, dbtype:str, pytype:ExType, params:Sequence[int] = ()):
         self.dbtype = dbtype
         self.pytype = pytype
+        self.params = tuple(params) # Such as the length of VARCHAR
+
+    def type_sql(self) -> str:
+        """ Get the type in the column definition (such as `VARCHAR(32)` or `INT UNSIGNED`) """
+        dbtype = self.dbtype
+        if dbtype.startswith('UNSIGNED '):
+            dbtype = dbtype[len('UNSIGNED '):] + ' UNSIGNED'
+        if self.params:
+            dbtype += '(' + ', '.join(map(str, self.params)) + ')'
+        return dbtype
+
+    def needs_index_prefix(self) -> bool:
+        """ Check if the index on the column of this type needs the prefix length (TEXT / BLOB) """
+        return self.dbtype.endswith(('TEXT', 'BLOB'))
+
+    def param_converter(self, *, binary:bool = False) -> ParamConverter:
+        """ Get the converter of the values into the query parameters
+            With the binary protocol, the driver packs the date and time values natively,
+            so no conversion is needed (returns None).
+        """
+        if issubclass(self.pytype.basetype, (datetime.date, datetime.time)):
+            return None if binary else _to_isoformat
+        return None
+
+    def result_decoder(self) -> ResultDecoder:
+        """ Get the decoder of the raw result values (bytes) of this type """
+        return _result_decoders[self.pytype.basetype]
+
+    def text_decoder(self) -> TextDecoder:
+        """ Get the decoder of the text values (such as the imported CSV fields) of this type
+            (The inverse of `text_encoder`, so the binary values are decoded from the hex strings)
+        """
+        return _text_decoders[self.pytype.basetype]
+
+    def text_encoder(self, *, raw:bool = False) -> 'ValueEncoder':
+        """ Get the encoder of the values into the text (for the text formats such as CSV)
+            If `raw` is True, the encoder takes the raw result values (bytes),
+            which are already the text representations except the binary types.
+        """
+        if self.pytype.basetype is bytes:
+            return encode_hex
+        if self.pytype.basetype is datetime.time and not raw:
+            return _to_isoformat # (Also for the timedelta values)
+        return _decode_str if raw else str
+
+    def json_encoder(self) -> Optional['ValueEncoder']:
+        """ Get the encoder of the values into the JSON values (None means no conversion) """
+        basetype = self.pytype.basetype
+        if basetype is bytes:
+            return encode_hex
+        if issubclass(basetype, (datetime.date, datetime.time)):
+            return _to_isoformat
+        return None
+
+
+def _to_isoformat(v:Any) -> Any:
+    if isinstance(v, (datetime.date, datetime.time)):
+        return v.isoformat()
+    if isinstance(v, datetime.timedelta):
+        return _format_timedelta(v)
+    return v
+
+def _format_timedelta(v:datetime.timedelta) -> str:
+    """ Format the TIME value outside of a day (such as `-01:00:00` or `838:59:59`) """
+    sign, v = ('-', -v) if v < datetime.timedelta(0) else ('', v)
+    minutes, seconds = divmod(v.days * 86400 + v.seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    text = '{}{:02d}:{:02d}:{:02d}'.format(sign, hours, minutes, seconds)
+    return text + '.{:06d}'.format(v.microseconds) if v.microseconds else text
+
+
+def _decode_str(v:Any) -> str:
+    return v.decode()
+
+def encode_hex(v:Any) -> str:
+    """ Encode the binary value into the hex string """
+    return bytes(v).hex()
+
+def encode_json_value(v:Any) -> Any:
+    """ Encode the value of an unknown type into the JSON value """
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return encode_hex(v)
+    if isinstance(v, (datetime.date, datetime.time)):
+        return v.isoformat()
+    return str(v)
+
+def encode_text_value(v:Any) -> str:
+    """ Encode the value of an unknown type into the text """
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return encode_hex(v)
+    return str(v)
+
+def _is_zero_date(text:str) -> bool:
+    """ Check if the date has the zero parts (such as `0000-00-00`, None as by the driver) """
+    return text[:4] == '0000' or text[5:7] == '00' or text[8:10] == '00'
+
+def _parse_date(text:str) -> Optional[datetime.date]:
+    return None if _is_zero_date(text) else datetime.date.fromisoformat(text)
+
+def _parse_datetime(text:str) -> Optional[datetime.datetime]:
+    return None if _is_zero_date(text) else datetime.datetime.fromisoformat(text)
+
+def _parse_time(text:str) -> Union[datetime.time, datetime.timedelta]:
+    """ Parse the TIME value (the values outside of a day, such as `-01:00:00` or `838:59:59`,
+        are timedelta as by the driver)
+    """
+    negative = text.startswith('-')
+    hours, minutes, seconds = text.lstrip('-').split(':')
+    if not negative and int(hours) < 24:
+        return datetime.time.fromisoformat(text)
+    delta = datetime.timedelta(hours=int(hours), minutes=int(minutes), seconds=float(seconds))
+    return -delta if negative else delta
+
+def _parse_decimal(text:str) -> decimal.Decimal:
+    try:
+        return decimal.Decimal(text)
+    except decimal.InvalidOperation:
+        raise ValueError('Invalid decimal value `{}`.'.format(text))
+
+@functools.lru_cache(maxsize=4096)
+def _decode_cached_date(v:bytes) -> Optional[datetime.date]:
+    return _parse_date(v.decode())
+
+@functools.lru_cache(maxsize=4096)
+def _decode_cached_datetime(v:bytes) -> Optional[datetime.datetime]:
+    return _parse_datetime(v.decode())
+
+@functools.lru_cache(maxsize=4096)
+def _decode_cached_time(v:bytes) -> Union[datetime.time, datetime.timedelta]:
+    return _parse_time(v.decode())
+
+def _decode_decimal(v:Any) -> decimal.Decimal:
+    return decimal.Decimal(v.decode())
+
+def _cached_by_bytes(decode:Callable[[bytes], Any]) -> ResultDecoder:
+    """ Make the cached decoder (The repeated values such as dates are constructed once) """
+    return lambda v: decode(bytes(v))
+
+_result_decoders:Dict[Type, ResultDecoder] = {
+    int: int,
+    float: float,
+    decimal.Decimal: _decode_decimal,
+    str: _decode_str,
+    bytes: memoryview,
+    datetime.date: _cached_by_bytes(_decode_cached_date),
+    datetime.datetime: _cached_by_bytes(_decode_cached_datetime),
+    datetime.time: _cached_by_bytes(_decode_cached_time),
+}
+
+_text_decoders:Dict[Type, TextDecoder] = {
+    int: int,
+    float: float,
+    decimal.Decimal: _parse_decimal,
+    str: str,
+    bytes: bytes.fromhex,
+    datetime.date: functools.lru_cache(maxsize=4096)(_parse_date),
+    datetime.datetime: functools.lru_cache(maxsize=4096)(_parse_datetime),
+    datetime.time: functools.lru_cache(maxsize=4096)(_parse_time),
+}
+
+
+def decode_values(decoder:ResultDecoder, vals:Sequence[Any]) -> List[Any]:
+    """ Decode the raw values of a column in bulk (NULLs are kept as None) """
+    if None in vals:
+        return [None if v is None else decoder(v) for v in vals]
+    return list(map(decoder, vals))
 
 
 def _singed_range(bits:int) -> Collection[int]:
@@ -32,22 +214,28 @@ UnsignedMediumInt = DataType('UNSIGNED MEDIUMINT', RangedType(int, _unsigned_ran
 UnsignedInt       = DataType('UNSIGNED INT'      , RangedType(int, _unsigned_range(32)))
 UnsignedBigInt    = DataType('UNSIGNED BIGINT'   , RangedType(int, _unsigned_range(64)))
 
-Float   = DataType('FLOAT'  , ExType(float))
-Double  = DataType('DOUBLE' , ExType(float))
-Real    = DataType('REAL'   , ExType(float))
-Decimal = DataType('DECIMAL', ExType(float))
+Float   = DataType('FLOAT'  , ExType(float, other_types=[int]))
+Double  = DataType('DOUBLE' , ExType(float, other_types=[int]))
+Real    = DataType('REAL'   , ExType(float, other_types=[int]))
+Decimal = DataType('DECIMAL', ExType(decimal.Decimal, other_types=[int, float]))
+
+def DecimalOf(precision:int, scale:int):
+    """ DECIMAL of the precision and the scale
+        (The bare `Decimal` is `DECIMAL(10, 0)` on the server, which rounds the fractions away)
+    """
+    return DataType('DECIMAL', ExType(decimal.Decimal, other_types=[int, float]), (precision, scale))
 
 def Char(l:int):
-    return DataType('CHAR', LenLimitedType(str, l))
+    return DataType('CHAR', LenLimitedType(str, l), (l,))
 
 def VarChar(l:int):
-    return DataType('VARCHAR', LenLimitedType(str, l))
+    return DataType('VARCHAR', LenLimitedType(str, l), (l,))
 
 def Binary(l:int):
-    return DataType('BINARY', LenLimitedType(bytes, l))
+    return DataType('BINARY', LenLimitedType(bytes, l), (l,))
 
 def VarBinary(l:int):
-    return DataType('VARBINARY', LenLimitedType(bytes, l))
+    return DataType('VARBINARY', LenLimitedType(bytes, l), (l,))
 
 TinyBlob   = DataType('TINYBLOB'  , LenLimitedType(bytes, 2 **  8 - 1))
 Blob       = DataType('BLOB'      , LenLimitedType(bytes, 2 ** 16 - 1))
@@ -67,7 +255,7 @@ LongText   = DataType('LONGTEXT'  , LenLimitedType(str, 2 ** 32 - 1))
 
 
 Date = DataType('DATE', ExType(datetime.date))
-Time = DataType('TIME', ExType(datetime.time))
+Time = DataType('TIME', ExType(datetime.time, other_types=[datetime.timedelta]))
 DateTime = DataType('DATETIME', ExType(datetime.datetime))
 
 # class Timestamp(datetime.datetime):
@@ -0,0 +1,39 @@
+"""
+    sql.decoding - Typed decoding of the raw result values by the column datatypes
+"""
+from typing import Any, Collection, List, Optional, Sequence, Type
+from sql.datatypes import DataType, ResultDecoder, decode_values
+from common.tablelib import RecordBase
+
+
+class RowDecoder:
+    """ Decoder of the raw result rows, with the decoders chosen once per column
+
+        The columns whose datatype is None, or which are in `passthrough`
+        (the column indexes), are not decoded (kept as the raw values).
+    """
+
+    def __init__(self,
+        datatypes:Sequence[Optional[DataType]],
+        passthrough:Collection[int] = (),
+    ) -> None:
+        self.decoders:List[Optional[ResultDecoder]] = [
+            None if i in passthrough or datatype is None else datatype.result_decoder()
+            for i, datatype in enumerate(datatypes)
+        ]
+
+    def decode_columns(self, rows:Sequence[Sequence[Any]]) -> List[List[Any]]:
+        """ Decode the raw rows into the columnar values (decoded column by column) """
+        if not rows:
+            return [[] for _ in self.decoders]
+        return [
+            list(vals) if decoder is None else decode_values(decoder, vals)
+            for decoder, vals in zip(self.decoders, zip(*rows))
+        ]
+
+    def decode_records(self,
+        rows:Sequence[Sequence[Any]],
+        record_class:Type[RecordBase],
+    ) -> List[RecordBase]:
+        """ Decode the raw rows into the records """
+        return list(map(record_class, zip(*self.decode_columns(rows))))
@@ -0,0 +1,64 @@
+"""
+    sql.deploy - Creation of the tables in the order of the links
+
+    The existence of all tables is checked in a query, and the tables not existing
+    are created in the order of the link graph (the linked tables first), with the DDL
+    sent in batches of the multiple statements (not a round trip per table).
+"""
+from typing import Dict, List, Optional, Set
+from common.graphlib import Edges, Graph
+from sql.objects import Database, Table, TableName
+
+
+def _link_edges(db:Database) -> Edges:
+    """ Get the edges from the tables to the tables linked from them (except the self links) """
+    return {
+        table.name: {name for name in table.link_columns_to_table if name != table.name}
+        for table in db.tables
+    }
+
+
+def _is_acyclic(edges:Edges) -> bool:
+    """ Check if the graph has no cycles (`Graph` does not support the cycles) """
+    state:Dict[Optional[TableName], int] = {} # 1: visiting, 2: done
+    for start in edges:
+        if start in state:
+            continue
+        stack = [(start, iter(edges[start]))]
+        state[start] = 1
+        while stack:
+            node, nexts = stack[-1]
+            for next_node in nexts:
+                if state.get(next_node) == 1:
+                    return False
+                if next_node not in state:
+                    state[next_node] = 1
+                    stack.append((next_node, iter(edges.get(next_node, ()))))
+                    break
+            else:
+                state[node] = 2
+                stack.pop()
+    return True
+
+
+def creation_order(db:Database) -> List[Table]:
+    """ Get the tables in the order of the creation (the linked tables first)
+        (The declaration order if the links are circular)
+    """
+    if not db.reference_resolved:
+        db.resolve_references()
+    edges = _link_edges(db)
+    if not _is_acyclic(edges):
+        return list(db.tables)
+    return [db.table(name) for name in Graph(edges).sorted() if name is not None]
+
+
+def create_tables(db:Database, *, batch_size:int = 100) -> List[Table]:
+    """ Create the tables not existing on the database (in a query for the existence
+        and a round trip per `batch_size` tables), and get the created tables
+    """
+    existing:Set[TableName] = db.existing_table_names()
+    tables = [table for table in creation_order(db) if table.name not in existing]
+    for i in range(0, len(tables), batch_size):
+        db.execute_multi([table.creation_sql() for table in tables[i:i + batch_size]])
+    return tables
@@ -2,28 +2,60 @@
     sql.executor - SQL query executor
 """
 from typing import Any, Iterable, Iterator, List, Optional, Union
+import inspect
 import mysql.connector
 from sql.expression import Query
 
 
+# The errors of the transactions to be retried (ER_LOCK_DEADLOCK and ER_LOCK_WAIT_TIMEOUT)
+RETRYABLE_ERRNOS = (1213, 1205)
+
+# The error of the deadlock, which rolls back the whole transaction (ER_LOCK_DEADLOCK)
+# (The lock wait timeout rolls back the statement only, by `innodb_rollback_on_timeout=OFF` in default)
+DEADLOCK_ERRNO = 1213
+
+def is_retryable_error(e:BaseException) -> bool:
+    """ Check if the error is the deadlock or the lock wait timeout (the transaction can be retried) """
+    return isinstance(e, mysql.connector.Error) and e.errno in RETRYABLE_ERRNOS
+
+def is_deadlock_error(e:BaseException) -> bool:
+    """ Check if the error is the deadlock (the whole transaction is already rolled back) """
+    return isinstance(e, mysql.connector.Error) and e.errno == DEADLOCK_ERRNO
+
+# The errors of the lost connections (CR_CONN_HOST_ERROR, CR_SERVER_GONE_ERROR, CR_SERVER_LOST
+# and CR_SERVER_LOST_EXTENDED)
+CONNECTION_ERRNOS = (2003, 2006, 2013, 2055)
+
+def is_connection_error(e:BaseException) -> bool:
+    """ Check if the error is the failure of the connection (not of the query) """
+    return isinstance(e, (mysql.connector.InterfaceError, ConnectionError)) or (
+        isinstance(e, mysql.connector.Error) and e.errno in CONNECTION_ERRNOS)
+
+
 class Connector:
     """ SQL Executor Object (Database Cursor) """
 
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, prepared:bool = False, **kwargs) -> None:
         # TODO: Implementation
         self.con_args = args
         self.con_kwargs = kwargs
+        self.prepared = prepared # Use the prepared statements (binary protocol) or not
+
+    def connect(self) -> 'Connection':
+        """ Open a new connection to the database """
+        return Connection(mysql.connector.connect(*self.con_args, **self.con_kwargs), prepared=self.prepared)
 
     def __enter__(self):
-        return Connection(self.db, mysql.connector.connect(self.con_args, self.con_kwargs))
+        return self.connect()
 
 
 MySQLCon = mysql.connector.abstracts.MySQLConnectionAbstract
 
 class Connection():
 
-    def __init__(self, db, _con):
+    def __init__(self, _con, *, prepared:bool = False):
         self._con = _con
+        self.prepared = prepared
         self.closed = False
 
     @property
@@ -33,7 +65,10 @@ class Connection():
         return self._con
 
     def __getattr__(self, name):
-        return self.con.name
+        return getattr(self.con, name)
+
+    def __enter__(self):
+        return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
@@ -46,8 +81,8 @@ class Connection():
             self._con.close()
             self.closed = True
 
-    def operate(self, db) -> 'Operation':
-        return Operation(db, self.con.cursor())
+    def operate(self, db, *, raw:bool = False) -> 'Operation':
+        return Operation(db, self, raw=raw)
 
 
 MySQLCur = mysql.connector.abstracts.MySQLCursorAbstract
@@ -55,9 +90,10 @@ OperationParamType = Optional[Union[bool, int, float, str]]
 
 class Operation():
 
-    def __init__(self, db, con:Connection):
+    def __init__(self, db, con:Connection, *, raw:bool = False):
         self.db = db
         self.con = con
+        self.raw = raw # Get the raw result values (not decoded by the driver) or not
         self._cur:MySQLCur
         self.closed = False
 
@@ -70,7 +106,10 @@ class Operation():
         return self._cur
 
     def __enter__(self):
-        self._cur = self.con.con.cursor()
+        if self.con.prepared:
+            self._cur = self.con.con.cursor(prepared=True)
+        else:
+            self._cur = self.con.con.cursor(raw=self.raw)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -80,20 +119,57 @@ class Operation():
         self.close()
 
     def close(self):
-        if not self.closed:
+        if not self.closed and hasattr(self, '_cur'):
             self._cur.close()
             self.closed = True
 
     def __getattr__(self, name):
-        return self.cur.name
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.cur, name)
 
     def execute(self,
         q:Query,
         values:Optional[Iterable[OperationParamType]] = None,
         *,
-        many:bool = True
+        many:bool = False
     ) -> List[List[Any]]:
-        print('Exec SQL:', q, 'Values:', list(params) if params else None)
-        self.cur.execute(q.query_text(), params)
-        return self.cur.fetchall()
+        if many:
+            self.cur.executemany(q.query_text(), values)
+        else:
+            self.cur.execute(q.query_text(), values)
+        return self.cur.fetchall() if self.cur.with_rows else []
+
+    def execute_multi(self, q:Query) -> None:
+        """ Execute the statements separated by semicolons in a round trip
+            (The results of the statements are discarded. The driver 9.2+ executes them
+            by `execute` and steps the results by `nextset`, the older ones by `execute(multi=True)`)
+        """
+        if 'multi' in inspect.signature(self.cur.execute).parameters:
+            for result in self.cur.execute(q.query_text(), multi=True):
+                if result.with_rows:
+                    result.fetchall()
+            return
+        self.cur.execute(q.query_text())
+        while True:
+            if self.cur.with_rows:
+                self.cur.fetchall()
+            if not self.cur.nextset():
+                break
+
+    def fetch_batches(self,
+        q:Query,
+        values:Optional[Iterable[OperationParamType]] = None,
+        *,
+        batch_size:int = 1000,
+    ) -> Iterator[List[List[Any]]]:
+        """ Execute the query and yield the result rows in batches
+            (The rows are not buffered on the client except the current batch)
+        """
+        self.cur.execute(q.query_text(), values)
+        while True:
+            rows = self.cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
 
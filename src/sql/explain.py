@@ -0,0 +1,396 @@
+"""
+    sql.explain - EXPLAIN of the selects and the analysis of the plans
+
+    The plan is got by `EXPLAIN FORMAT=JSON` (or `EXPLAIN ANALYZE`, which executes the
+    query and reports the actual rows and times), and the expensive parts (full table
+    scans, filesorts, temporary tables and joins without index) are reported as
+    the issues linked to the schema objects of the select which cause them.
+
+    The slow selects are explained once per fingerprint (the query text without the literals)
+    in `db.slow_query_interval` seconds, and the repeats in between are counted.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import json
+import logging
+import re
+import threading
+import time
+from sql.expression import Expr, Query
+from sql.objects import AliasedTable, Column, ColumnExpr, ColumnInAliasedTable, ColumnInLinkedTable, LinkedTable, Table
+
+logger = logging.getLogger('sql.explain')
+
+# Kinds of the issues
+FULL_SCAN = 'full_scan'
+FULL_INDEX_SCAN = 'full_index_scan'
+FILESORT = 'filesort'
+TEMPORARY = 'temporary'
+UNINDEXED_JOIN = 'unindexed_join'
+
+TableSource = Union[Table, LinkedTable, AliasedTable]
+
+
+class PlanTable:
+    """ An access to a table in the plan """
+
+    def __init__(self,
+        name:str,
+        access_type:Optional[str],
+        *,
+        key:Optional[str] = None,
+        possible_keys:Optional[List[str]] = None,
+        rows:Optional[float] = None,
+        filtered:Optional[float] = None,
+        condition:Optional[str] = None,
+        join_buffer:Optional[str] = None,
+        actual_rows:Optional[float] = None,
+        actual_time:Optional[float] = None,
+        loops:Optional[int] = None,
+    ) -> None:
+        self.name = name # The table name (or the alias) in the query
+        self.access_type = access_type # 'ALL', 'index', 'range', 'ref', 'eq_ref', 'const', ...
+        self.key = key
+        self.possible_keys = possible_keys or []
+        self.rows = rows # Estimated rows examined per scan
+        self.filtered = filtered # Estimated percentage of the rows filtered by the condition
+        self.condition = condition
+        self.join_buffer = join_buffer # Set if joined by the join buffer (no index used)
+        self.actual_rows = actual_rows # (EXPLAIN ANALYZE only)
+        self.actual_time = actual_time # Milliseconds to get all rows (EXPLAIN ANALYZE only)
+        self.loops = loops # (EXPLAIN ANALYZE only)
+
+        self.source:Optional[TableSource] = None # The table object of the select
+        self.join:Optional[Tuple[Column, Column]] = None # The join condition of the select
+
+    def __repr__(self) -> str:
+        return 'PlanTable({}, {}, key={}, rows={})'.format(self.name, self.access_type, self.key, self.rows)
+
+
+class PlanIssue:
+    """ A likely expensive part of the plan """
+
+    def __init__(self,
+        kind:str,
+        message:str,
+        table:Optional[PlanTable] = None,
+        exprs:Optional[List[Expr]] = None,
+    ) -> None:
+        self.kind = kind
+        self.message = message
+        self.table = table
+        self.exprs:List[Expr] = exprs or [] # The expressions of the select which cause the issue
+
+    @property
+    def source(self) -> Optional[TableSource]:
+        """ The table object (Table / LinkedTable / AliasedTable) of the issue """
+        return self.table.source if self.table is not None else None
+
+    def __repr__(self) -> str:
+        return 'PlanIssue({}: {})'.format(self.kind, self.message)
+
+
+class Plan:
+    """ The analyzed plan of a select """
+
+    def __init__(self, query_text:str, raw:Any, tables:List[PlanTable], analyzed:bool) -> None:
+        self.query_text = query_text
+        self.raw = raw # The JSON object (or the text of EXPLAIN ANALYZE)
+        self.tables = tables
+        self.analyzed = analyzed
+        self.filesort = False
+        self.temporary = False
+        self.issues:List[PlanIssue] = []
+
+    def issues_of(self, kind:str) -> List[PlanIssue]:
+        return [issue for issue in self.issues if issue.kind == kind]
+
+    def table(self, name:str) -> PlanTable:
+        for table in self.tables:
+            if table.name == name:
+                return table
+        raise KeyError('Table `{}` not found in the plan.'.format(name))
+
+    def __repr__(self) -> str:
+        return 'Plan(tables={}, issues={})'.format(self.tables, self.issues)
+
+
+## ---- parsing ---- ##
+
+def _walk_json(node:Any) -> Iterator[Tuple[str, Any]]:
+    """ Walk the JSON plan in order, and yield the (key, value) of the dicts """
+    if isinstance(node, dict):
+        for key, val in node.items():
+            yield key, val
+            yield from _walk_json(val)
+    elif isinstance(node, list):
+        for val in node:
+            yield from _walk_json(val)
+
+
+def _float(v:Any) -> Optional[float]:
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_json_plan(text:str, query_text:str = '') -> Plan:
+    """ Parse the result of `EXPLAIN FORMAT=JSON` """
+    raw = json.loads(text)
+    tables:List[PlanTable] = []
+    filesort = temporary = False
+    for key, val in _walk_json(raw):
+        if key == 'table' and isinstance(val, dict) and 'table_name' in val:
+            tables.append(PlanTable(
+                val['table_name'],
+                val.get('access_type'),
+                key=val.get('key'),
+                possible_keys=val.get('possible_keys'),
+                rows=_float(val.get('rows_examined_per_scan')),
+                filtered=_float(val.get('filtered')),
+                condition=val.get('attached_condition'),
+                join_buffer=val.get('using_join_buffer'),
+            ))
+        elif key == 'using_filesort' and val is True:
+            filesort = True
+        elif key == 'using_temporary_table' and val is True:
+            temporary = True
+    plan = Plan(query_text, raw, tables, analyzed=False)
+    plan.filesort, plan.temporary = filesort, temporary
+    return plan
+
+
+_analyze_table_pattern = re.compile(
+    r'(?P<op>Table scan|Index scan|Covering index scan|Index range scan|Index lookup|'
+    r'Single-row index lookup|Covering index lookup|Single-row covering index lookup|Constant row from)'
+    r' on (?P<table>`[^`]+`|\S+)(?: using (?P<key>`[^`]+`|\S+))?'
+)
+_analyze_actual_pattern = re.compile(r'\(actual time=[\d.]+\.\.(?P<time>[\d.]+) rows=(?P<rows>[\d.]+) loops=(?P<loops>\d+)\)')
+_analyze_estimate_pattern = re.compile(r'\(cost=[\d.]+(?:\.\.[\d.]+)? rows=(?P<rows>[\d.]+)\)')
+
+_analyze_access_types = {
+    'Table scan': 'ALL',
+    'Index scan': 'index',
+    'Covering index scan': 'index',
+    'Index range scan': 'range',
+    'Index lookup': 'ref',
+    'Covering index lookup': 'ref',
+    'Single-row index lookup': 'eq_ref',
+    'Single-row covering index lookup': 'eq_ref',
+    'Constant row from': 'const',
+}
+
+
+def parse_analyze_plan(text:str, query_text:str = '') -> Plan:
+    """ Parse the result (the tree text) of `EXPLAIN ANALYZE` """
+    tables:List[PlanTable] = []
+    filesort = temporary = False
+    hash_join_depth:Optional[int] = None
+
+    for line in text.splitlines():
+        depth = len(line) - len(line.lstrip())
+        body = line.strip().lstrip('-> ')
+        if hash_join_depth is not None and depth <= hash_join_depth:
+            hash_join_depth = None
+        if body.startswith('Sort') or 'filesort' in body:
+            filesort = True
+        if body.startswith(('Temporary table', 'Materialize')) or 'temporary' in body:
+            temporary = True
+        if 'hash join' in body:
+            hash_join_depth = depth
+
+        m = _analyze_table_pattern.search(body)
+        if m is None:
+            continue
+        actual = _analyze_actual_pattern.search(body)
+        estimated = _analyze_estimate_pattern.search(body)
+        tables.append(PlanTable(
+            m.group('table').strip('`'),
+            _analyze_access_types[m.group('op')],
+            key=m.group('key').strip('`') if m.group('key') else None,
+            rows=_float(estimated.group('rows')) if estimated else None,
+            join_buffer='hash join' if hash_join_depth is not None and tables else None,
+            actual_rows=_float(actual.group('rows')) if actual else None,
+            actual_time=_float(actual.group('time')) if actual else None,
+            loops=int(actual.group('loops')) if actual else None,
+        ))
+
+    plan = Plan(query_text, text, tables, analyzed=True)
+    plan.filesort, plan.temporary = filesort, temporary
+    return plan
+
+
+## ---- analysis ---- ##
+
+def _column_table_name(expr:ColumnExpr) -> str:
+    if isinstance(expr, ColumnInAliasedTable):
+        return expr.aliased_table.alias_name
+    return expr.entity().table.name
+
+
+def _sources(select) -> Dict[str, TableSource]:
+    """ Get the table objects of the select by the names in the query """
+    sources:Dict[str, TableSource] = {}
+    for expr in select.extract_column_exprs(select.all_exprs()):
+        if isinstance(expr, ColumnInAliasedTable):
+            sources.setdefault(expr.aliased_table.alias_name, expr.aliased_table)
+        elif isinstance(expr, ColumnInLinkedTable):
+            sources.setdefault(expr.linked_table.entity().name, expr.linked_table)
+        else:
+            sources.setdefault(expr.entity().table.name, expr.entity().table)
+    return sources
+
+
+def _column_exprs(select, exprs:Optional[List[Expr]]) -> List[Expr]:
+    return list(select.extract_column_exprs(exprs)) if exprs else []
+
+
+def analyze_plan(select, plan:Plan) -> Plan:
+    """ Find the issues in the plan, and link them to the objects of the select """
+    sources = _sources(select)
+    joins:Dict[str, Tuple[Column, Column]] = {}
+    for column_connections in select.table_joins().values():
+        for column_from, column_to in column_connections:
+            joins[_column_table_name(column_to)] = (column_from, column_to)
+
+    where_columns = _column_exprs(select, [select.where_expr] if select.where_expr is not None else None)
+
+    for i, table in enumerate(plan.tables):
+        table.source = sources.get(table.name)
+        table.join = joins.get(table.name)
+        table_where_columns:List[Expr] = [
+            expr for expr in where_columns if _column_table_name(expr) == table.name
+        ]
+
+        if table.join is not None and i > 0 and (table.access_type in ('ALL', 'index') or table.join_buffer):
+            column_from, column_to = table.join
+            plan.issues.append(PlanIssue(
+                UNINDEXED_JOIN,
+                'Join {} = {} uses no index on `{}` ({})'.format(
+                    repr(column_from), repr(column_to), table.name, table.join_buffer or table.access_type),
+                table, [column_from, column_to],
+            ))
+        elif table.access_type == 'ALL':
+            plan.issues.append(PlanIssue(
+                FULL_SCAN,
+                'Full table scan of `{}`{}'.format(
+                    table.name, ' (about {:.0f} rows)'.format(table.rows) if table.rows is not None else ''),
+                table, table_where_columns,
+            ))
+        elif table.access_type == 'index':
+            plan.issues.append(PlanIssue(
+                FULL_INDEX_SCAN,
+                'Full index scan of `{}` by `{}`'.format(table.name, table.key),
+                table, table_where_columns,
+            ))
+
+    if plan.filesort:
+        order_exprs = [expr for expr, _ in select.order_exprs] if select.order_exprs else select.group_exprs
+        plan.issues.append(PlanIssue(
+            FILESORT, 'Filesort for ORDER BY / GROUP BY', None, _column_exprs(select, order_exprs),
+        ))
+    if plan.temporary:
+        exprs = list(select.group_exprs or []) + [expr for expr, _ in (select.order_exprs or [])]
+        plan.issues.append(PlanIssue(
+            TEMPORARY, 'Temporary table for GROUP BY / ORDER BY / DISTINCT', None, _column_exprs(select, exprs),
+        ))
+    return plan
+
+
+def _text(v:Any) -> str:
+    return v.decode() if isinstance(v, (bytes, bytearray)) else str(v)
+
+
+def explain(select, *, analyze:bool = False) -> Plan:
+    """ Get the analyzed plan of the select (See `Select.explain`) """
+    query = select.sql_query()
+    query_text = query.query_text()
+    if analyze:
+        rows = select.db.execute(Query('EXPLAIN ANALYZE', query))
+        plan = parse_analyze_plan('\n'.join(_text(row[0]) for row in rows), query_text)
+    else:
+        rows = select.db.execute(Query('EXPLAIN FORMAT=JSON', query))
+        plan = parse_json_plan(_text(rows[0][0]), query_text)
+    return analyze_plan(select, plan)
+
+
+## ---- slow selects ---- ##
+
+_literal_pattern = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|\b\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_list_pattern = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def query_fingerprint(query_text:str) -> str:
+    """ Get the fingerprint of the query (the literals replaced by `?`, and the lists by `(?+)`) """
+    return _list_pattern.sub('(?+)', _literal_pattern.sub('?', query_text))
+
+
+class SlowQueryThrottle:
+    """ Throttle of the reports of the slow selects per fingerprint (thread-safe) """
+
+    def __init__(self, interval:float, max_fingerprints:int = 10000) -> None:
+        self.interval = interval
+        self.max_fingerprints = max_fingerprints
+        self._reported_at:Dict[str, float] = {}
+        self._suppressed:Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, fingerprint:str, now:Optional[float] = None) -> Optional[int]:
+        """ Check if the select of the fingerprint is to be reported now
+            Returns the number of the repeats suppressed since the last report, or None if suppressed.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            reported_at = self._reported_at.get(fingerprint)
+            if reported_at is not None and now - reported_at < self.interval:
+                self._suppressed[fingerprint] = self._suppressed.get(fingerprint, 0) + 1
+                return None
+            if reported_at is None and len(self._reported_at) >= self.max_fingerprints:
+                self._expire(now)
+            self._reported_at[fingerprint] = now
+            return self._suppressed.pop(fingerprint, 0)
+
+    def _expire(self, now:float) -> None:
+        for fingerprint, reported_at in list(self._reported_at.items()):
+            if now - reported_at >= self.interval:
+                del self._reported_at[fingerprint]
+                self._suppressed.pop(fingerprint, None)
+        if len(self._reported_at) >= self.max_fingerprints:
+            self._reported_at.clear()
+            self._suppressed.clear()
+
+
+_throttle_lock = threading.Lock()
+
+def _slow_query_throttle(db) -> SlowQueryThrottle:
+    with _throttle_lock:
+        if db.slow_query_throttle is None or db.slow_query_throttle.interval != db.slow_query_interval:
+            db.slow_query_throttle = SlowQueryThrottle(db.slow_query_interval)
+        return db.slow_query_throttle
+
+
+def report_slow_select(select, seconds:float) -> Optional[Plan]:
+    """ Explain the slow select, and pass it to `db.slow_query_handler` (or log it)
+        (None if the select of the same fingerprint is reported recently, or failed to explain)
+    """
+    query_text = select.sql_query().query_text()
+    suppressed = _slow_query_throttle(select.db).acquire(query_fingerprint(query_text))
+    if suppressed is None:
+        return None
+    try:
+        plan = explain(select)
+    except Exception:
+        logger.exception('Failed to explain the slow select (%.3f s): %s', seconds, query_text)
+        return None
+
+    handler = select.db.slow_query_handler
+    if handler is not None:
+        handler(select, seconds, plan)
+    else:
+        logger.warning(
+            'Slow select (%.3f s%s): %s\n%s', seconds,
+            ', {} more since the last report'.format(suppressed) if suppressed else '', plan.query_text,
+            '\n'.join('  ' + issue.message for issue in plan.issues) or '  (no issues found in the plan)',
+        )
+    return plan
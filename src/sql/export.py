@@ -0,0 +1,163 @@
+"""
+    sql.export - Streaming export of the select results into CSV / TSV / NDJSON
+"""
+from typing import Any, BinaryIO, List, Optional, Sequence
+import csv
+import gzip
+import io
+import json
+from sql.datatypes import DataType, ValueEncoder, encode_json_value, encode_text_value
+
+formats = {'csv', 'tsv', 'ndjson'}
+
+
+class ExportResult:
+    """ The result of the export """
+
+    def __init__(self, rows:int, bytes_written:int) -> None:
+        self.rows = rows
+        self.bytes_written = bytes_written # Bytes written into the output (compressed size if compressed)
+
+    def __repr__(self) -> str:
+        return 'ExportResult(rows={}, bytes_written={})'.format(self.rows, self.bytes_written)
+
+
+class _CountingWriter(io.RawIOBase):
+    """ Writer which counts the bytes written into the output """
+
+    def __init__(self, fp:BinaryIO) -> None:
+        self.fp = fp
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.fp.write(b)
+        self.bytes_written += len(b)
+        return len(b)
+
+
+def _escape_tsv(text:str) -> str:
+    """ Escape the text in the TSV field (the same as `SELECT ... INTO OUTFILE`) """
+    if '\\' in text or '\t' in text or '\n' in text or '\r' in text:
+        return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return text
+
+
+def _raw_text_value(v:Any) -> str:
+    """ Encode the raw value of an unknown type into the text """
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode()
+    return str(v)
+
+
+def _encode_column(encoder:Optional[ValueEncoder], vals:Sequence[Any]) -> List[Any]:
+    """ Encode the values of a column (NULLs are kept as None) """
+    if encoder is None:
+        return list(vals)
+    if None in vals:
+        return [None if v is None else encoder(v) for v in vals]
+    return list(map(encoder, vals))
+
+
+class _Formatter:
+    """ Formatter of the batch of rows into the bytes """
+
+    def __init__(self,
+        format:str,
+        column_names:List[str],
+        datatypes:Sequence[Optional[DataType]],
+        raw:bool,
+    ) -> None:
+        self.format = format
+        self.column_names = column_names
+        if format == 'ndjson':
+            self.encoders:List[Optional[ValueEncoder]] = [
+                datatype.json_encoder() if datatype is not None else encode_json_value
+                for datatype in datatypes
+            ]
+        else:
+            self.encoders = [
+                datatype.text_encoder(raw=raw) if datatype is not None else (
+                    _raw_text_value if raw else encode_text_value
+                )
+                for datatype in datatypes
+            ]
+
+    def header(self) -> bytes:
+        if self.format == 'csv':
+            return self._csv([self.column_names])
+        if self.format == 'tsv':
+            return ('\t'.join(map(_escape_tsv, self.column_names)) + '\n').encode()
+        return b''
+
+    def rows(self, rows:Sequence[Sequence[Any]]) -> bytes:
+        columns = [
+            _encode_column(encoder, vals)
+            for encoder, vals in zip(self.encoders, zip(*rows))
+        ]
+        records = zip(*columns)
+
+        if self.format == 'csv':
+            return self._csv(records)
+
+        if self.format == 'tsv':
+            return ''.join(
+                # (A string `\N` is written as `\\N`, not to be read as NULL)
+                '\t'.join('\\N' if v is None else _escape_tsv(v) for v in record) + '\n'
+                for record in records
+            ).encode()
+
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str).encode
+        names = self.column_names
+        return ''.join(dumps(dict(zip(names, record))) + '\n' for record in records).encode()
+
+    @staticmethod
+    def _csv(records) -> bytes:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerows(records)
+        return buf.getvalue().encode()
+
+
+def export(
+    select,
+    fp:BinaryIO,
+    format:str = 'csv',
+    *,
+    header:bool = True,
+    batch_size:int = 1000,
+    compress:bool = False,
+) -> ExportResult:
+    """ Export the result of the select into the binary file object
+
+        The rows are streamed from the unbuffered cursor, and only one batch
+        (`batch_size` rows) is held in memory at once.
+        The export is read from a replica if connected (See `Database.stream_read`).
+        For CSV and TSV, the raw values from the text protocol are written
+        without being decoded into the python values.
+        If `compress` is True, the output is compressed by gzip on the fly.
+    """
+    if format not in formats:
+        raise RuntimeError('Unknown export format `{}`.'.format(format))
+
+    raw = format != 'ndjson' and not select.db.binary_protocol()
+    formatter = _Formatter(format, select.column_names(), select.column_datatypes(), raw)
+
+    counter = _CountingWriter(fp)
+    out:Any = gzip.GzipFile(fileobj=counter, mode='wb') if compress else io.BufferedWriter(counter, 1 << 16)
+
+    n_rows = 0
+    try:
+        if header:
+            out.write(formatter.header())
+        for rows in select.db.stream_read(select.sql_query(), batch_size=batch_size, raw=raw):
+            out.write(formatter.rows(rows))
+            n_rows += len(rows)
+    finally:
+        if compress:
+            out.close()
+        else:
+            out.flush()
+
+    return ExportResult(n_rows, counter.bytes_written)
@@ -50,7 +50,7 @@ class Expr(metaclass=ABCMeta):
             are determined by this representation.
         """
 
-    def extract_exprs(self) -> Iterator[Expr]:
+    def extract_exprs(self) -> Iterator['Expr']:
         """ Extract expression(s) in this expression
             In default, return this expression object
         """
@@ -272,7 +272,7 @@ class Query(Expr):
             return '`' + raw.replace('`', '``') + '`'
 
         if quoted:
-            return '"' + raw.replace('\\', '\\\\').replace('"', '\\"')
+            return '"' + raw.replace('\\', '\\\\').replace('"', '\\"') + '"'
 
         return raw
 
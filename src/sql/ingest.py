@@ -0,0 +1,355 @@
+"""
+    sql.ingest - Parallel bulk import of CSV / TSV files into a table
+
+    The import is a pipeline of 3 overlapped stages:
+      1. reading the file in large chunks (cut at the record boundaries),
+      2. parsing and validating the chunks in a process pool,
+      3. writing the batches into the table (in a writer thread),
+    and the stages are connected by the bounded queues, so that the reader
+    waits (backpressure) when the parsers or the database are behind.
+"""
+from typing import Any, BinaryIO, Callable, Deque, Iterator, List, Optional, Sequence, Tuple, Union
+import collections
+import concurrent.futures
+import csv
+import io
+import itertools
+import os
+import queue
+import threading
+from sql.datatypes import DataType
+from sql.objects import Column, ColumnName, Table
+from sql.validation import ColumnValidator, ValidationError, Violation
+
+formats = {'csv', 'tsv'}
+
+# The NULL fields by default (the same as the export)
+default_nulls = {'csv': '', 'tsv': '\\N'}
+
+# Writer of a batch of the parsed rows (such as the bulk insertion into the table)
+BatchWriter = Callable[[List[List[Any]]], Any]
+
+# Spec of a column passed to the parser processes: (datatype, allow_null)
+_ColumnSpec = Tuple[Optional[DataType], bool]
+
+# Violation found in the parser processes: (row index in the chunk, column index, value, message)
+_RawViolation = Tuple[int, Optional[int], Any, str]
+
+
+class ImportResult:
+    """ The result of the import """
+
+    def __init__(self, rows:int, batches:int, violations:List[Violation]) -> None:
+        self.rows = rows # Number of the written rows
+        self.batches = batches
+        self.violations = violations # Skipped invalid values (with on_error='skip')
+
+    def __repr__(self) -> str:
+        return 'ImportResult(rows={}, batches={}, violations={})'.format(
+            self.rows, self.batches, len(self.violations)
+        )
+
+
+def _record_boundary(data:bytes, format:str) -> int:
+    """ Get the end position of the last complete record in the data (-1 if not found)
+        For CSV, the newlines in the quoted fields (the odd number of quotes before) are skipped.
+    """
+    pos = data.rfind(b'\n')
+    if format == 'csv' and pos >= 0:
+        # The quotes are counted once, and subtracted for each newline skipped backward
+        quotes = data.count(b'"', 0, pos)
+        while pos >= 0 and quotes % 2 != 0:
+            prev = data.rfind(b'\n', 0, pos)
+            quotes -= data.count(b'"', prev + 1, pos)
+            pos = prev
+    return pos + 1 if pos >= 0 else -1
+
+
+def _first_record_end(data:bytes, format:str) -> int:
+    """ Get the end position of the first record in the data """
+    pos = data.find(b'\n')
+    if format == 'csv' and pos >= 0:
+        quotes = data.count(b'"', 0, pos)
+        while pos >= 0 and quotes % 2 != 0:
+            next_pos = data.find(b'\n', pos + 1)
+            quotes += data.count(b'"', pos, next_pos if next_pos >= 0 else len(data))
+            pos = next_pos
+    return pos + 1 if pos >= 0 else len(data)
+
+
+def read_chunks(fp:BinaryIO, format:str = 'csv', chunk_size:int = 1 << 22) -> Iterator[bytes]:
+    """ Read the binary file object in the chunks of about `chunk_size` bytes,
+        each of which ends at the record boundary
+    """
+    rest = b''
+    while True:
+        data = fp.read(chunk_size)
+        if not data:
+            break
+        data = rest + data
+        end = _record_boundary(data, format)
+        if end <= 0:
+            rest = data
+            continue
+        rest = data[end:]
+        yield data[:end]
+    if rest.strip():
+        yield rest
+
+
+def _unescape_tsv(text:str) -> str:
+    """ Unescape the TSV field (the same as `LOAD DATA INFILE`) """
+    if '\\' not in text:
+        return text
+    escapes = {'t': '\t', 'n': '\n', 'r': '\r', '0': '\0', '\\': '\\'}
+    chars = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i + 1 < len(text):
+            i += 1
+            c = escapes.get(text[i], text[i])
+        chars.append(c)
+        i += 1
+    return ''.join(chars)
+
+
+def _split_records(text:str, format:str) -> List[List[str]]:
+    if format == 'csv':
+        return [record for record in csv.reader(io.StringIO(text)) if record]
+    return [line.split('\t') for line in text.split('\n') if line]
+
+
+def _decode_column(
+    spec:_ColumnSpec,
+    column_index:int,
+    vals:Sequence[Optional[str]],
+    violations:List[_RawViolation],
+) -> List[Any]:
+    """ Decode and validate the text values of a column (in bulk, one by one only on the failure)
+        (NULLs are given as None)
+    """
+    datatype, allow_null = spec
+
+    indexes:Sequence[int] = range(len(vals))
+    if None in vals:
+        indexes = [i for i, val in enumerate(vals) if val is not None]
+        if not allow_null:
+            violations.extend(
+                (i, column_index, None, 'NULL is not allowed')
+                for i, val in enumerate(vals) if val is None
+            )
+    decoded:List[Any] = [None] * len(vals)
+    if datatype is None:
+        for i in indexes:
+            decoded[i] = vals[i]
+        return decoded
+
+    decode = datatype.text_decoder()
+    texts = [vals[i] for i in indexes]
+    try:
+        parsed = list(map(decode, texts))
+    except ValueError:
+        parsed = []
+        for i, text in zip(indexes, texts):
+            try:
+                parsed.append(decode(text))
+            except ValueError:
+                parsed.append(text)
+                violations.append((i, column_index, text, 'Cannot parse as {}'.format(datatype.dbtype)))
+
+    violations.extend(
+        (indexes[i], column_index, parsed[i], 'Invalid value for {}'.format(datatype.dbtype))
+        for i in datatype.pytype.invalid_indexes(parsed)
+        if isinstance(parsed[i], datatype.pytype.types)
+    )
+    for i, val in zip(indexes, parsed):
+        decoded[i] = val
+    return decoded
+
+
+def parse_chunk(
+    chunk:bytes,
+    specs:Sequence[_ColumnSpec],
+    format:str = 'csv',
+    encoding:str = 'utf-8',
+    null:Optional[str] = None,
+) -> Tuple[List[List[Any]], List[_RawViolation]]:
+    """ Parse and validate the chunk into the rows (run in the parser processes)
+        Returns the rows and the violations (with the row indexes in the chunk).
+        The fields equal to `null` (before unescaped) are NULL (See `import_file`).
+    """
+    text = chunk.decode(encoding)
+    if null is None:
+        null = default_nulls[format]
+    if format == 'csv':
+        records = [
+            [None if field == null else field for field in record]
+            for record in _split_records(text, format)
+        ]
+    else:
+        records = [
+            [None if field == null else _unescape_tsv(field) for field in record]
+            for record in _split_records(text.replace('\r\n', '\n'), format)
+        ]
+
+    violations:List[_RawViolation] = []
+    positions = [i for i, record in enumerate(records) if len(record) == len(specs)]
+    if len(positions) != len(records):
+        violations.extend(
+            (i, None, record, 'The number of values is not {}'.format(len(specs)))
+            for i, record in enumerate(records) if len(record) != len(specs)
+        )
+    if not positions:
+        return records, violations
+
+    column_violations:List[_RawViolation] = []
+    columns = [
+        _decode_column(spec, column_index, vals, column_violations)
+        for column_index, (spec, vals) in enumerate(zip(specs, zip(*(records[i] for i in positions))))
+    ]
+    violations.extend((positions[i], c, v, m) for i, c, v, m in column_violations)
+
+    rows:List[List[Any]] = list(records)
+    for i, row in zip(positions, zip(*columns)):
+        rows[i] = list(row)
+    return rows, violations
+
+
+class _Writer(threading.Thread):
+    """ Writer thread of the parsed batches (taken from the bounded queue) """
+
+    def __init__(self, write:BatchWriter, batches:'queue.Queue[Optional[List[List[Any]]]]') -> None:
+        super().__init__(daemon=True)
+        self.write = write
+        self.batches = batches
+        self.rows = 0
+        self.n_batches = 0
+        self.error:Optional[BaseException] = None
+
+    def run(self) -> None:
+        while True:
+            rows = self.batches.get()
+            if rows is None:
+                return
+            if self.error is not None:
+                continue # Drain the queue not to block the reader
+            try:
+                self.write(rows)
+                self.rows += len(rows)
+                self.n_batches += 1
+            except BaseException as e:
+                self.error = e
+
+
+def import_file(
+    table:Table,
+    fp:BinaryIO,
+    format:str = 'csv',
+    *,
+    columns:Optional[Sequence[Union[ColumnName, Column]]] = None,
+    header:bool = True,
+    encoding:str = 'utf-8',
+    chunk_size:int = 1 << 22,
+    processes:Optional[int] = None,
+    queue_size:int = 4,
+    on_error:str = 'raise',
+    write:Optional[BatchWriter] = None,
+    null:Optional[str] = None,
+) -> ImportResult:
+    """ Import the CSV / TSV file (the binary file object) into the table
+
+        The rows are parsed and validated by the column datatypes in `processes`
+        parser processes (the number of the CPUs by default, and no processes if 0),
+        and written by `write` (the bulk insertion by `Table.insert` by default)
+        in a writer thread, batch by batch (a batch for a chunk of `chunk_size` bytes).
+        At most `queue_size` batches are waited for each of the parsing and the writing.
+
+        `columns` are the columns of the file in order (the header names if `header`
+        is True, otherwise all columns of the table by default). NULL is the field equal
+        to `null`, the empty field for CSV and `\\N` for TSV by default (so the empty
+        strings are imported as NULL from CSV, unless another `null` such as `\\N` is given).
+        If any invalid values are found, ValidationError is raised if `on_error` is 'raise'
+        (the batches before are already written), or the invalid rows are skipped if 'skip'.
+    """
+    if format not in formats:
+        raise RuntimeError('Unknown import format `{}`.'.format(format))
+    if on_error not in ('raise', 'skip'):
+        raise RuntimeError('Unknown on_error `{}`.'.format(on_error))
+
+    chunks = read_chunks(fp, format, chunk_size)
+    if header:
+        first = next(chunks, b'')
+        end = _first_record_end(first, format)
+        header_records = _split_records(first[:end].decode(encoding), format)
+        if columns is None and header_records:
+            columns = header_records[0]
+        if first[end:]:
+            chunks = itertools.chain([first[end:]], chunks)
+
+    target_columns = [table.to_self_column(c) for c in (columns if columns is not None else table.columns)]
+    specs:List[_ColumnSpec] = []
+    for column in target_columns:
+        validator = ColumnValidator(column)
+        specs.append((validator.datatype, validator.allow_null))
+
+    if write is None:
+        def write(rows:List[List[Any]]) -> Any:
+            return table.insert(target_columns, rows)
+
+    batches:'queue.Queue[Optional[List[List[Any]]]]' = queue.Queue(maxsize=queue_size)
+    writer = _Writer(write, batches)
+    writer.start()
+
+    skipped:List[Violation] = []
+    row_offset = 0
+
+    def handle(result:Tuple[List[List[Any]], List[_RawViolation]]) -> None:
+        nonlocal row_offset
+        rows, raw_violations = result
+        if raw_violations:
+            raw_violations = sorted(raw_violations, key=lambda v: v[0])
+            violations = [
+                Violation(
+                    row_offset + i,
+                    target_columns[column_index] if column_index is not None else None,
+                    value, message,
+                )
+                for i, column_index, value, message in raw_violations
+            ]
+            if on_error == 'raise':
+                raise ValidationError(violations)
+            skipped.extend(violations)
+            invalid_rows = {i for i, _, _, _ in raw_violations}
+            rows = [row for i, row in enumerate(rows) if i not in invalid_rows]
+        row_offset += len(result[0])
+        if rows:
+            if writer.error is not None:
+                raise writer.error
+            batches.put(rows)
+
+    try:
+        if processes == 0:
+            for chunk in chunks:
+                handle(parse_chunk(chunk, specs, format, encoding, null))
+        else:
+            workers = processes or os.cpu_count() or 1
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                pending:Deque[concurrent.futures.Future] = collections.deque()
+                try:
+                    for chunk in chunks:
+                        pending.append(executor.submit(parse_chunk, chunk, specs, format, encoding, null))
+                        if len(pending) >= workers + queue_size:
+                            handle(pending.popleft().result())
+                    while pending:
+                        handle(pending.popleft().result())
+                finally:
+                    for future in pending:
+                        future.cancel()
+    finally:
+        batches.put(None)
+        writer.join()
+
+    if writer.error is not None:
+        raise writer.error
+    return ImportResult(writer.rows, writer.n_batches, skipped)
@@ -0,0 +1,298 @@
+"""
+    sql.inmemory - In-memory execution of the Select objects over cached tables
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sql.expression import Expr, FuncExpr, Query
+from sql.objects import Column, ColumnExpr, Table, TableName
+from sql.select import Select
+from sql import vectorize
+from common import tablelib
+
+# The key of a joined table: the column connections from the base table
+PathKey = Tuple[Tuple[str, str], ...]
+
+
+class InMemoryEngine:
+    """ Execute the Select objects against the in-memory snapshots of the tables
+
+        The snapshots are `common.tablelib.Table` objects whose column names are
+        the names of the columns in the table schema.
+        The joins are done by the hash indexes of the snapshots, and the expressions
+        are evaluated column by column over the joined rows.
+    """
+
+    def __init__(self, tables:Optional[Dict[TableName, tablelib.Table]] = None) -> None:
+        self.tables:Dict[TableName, tablelib.Table] = dict(tables) if tables is not None else {}
+
+
+    ## ---- snapshot methods ---- ##
+
+    def load(self, table:Table, rows:Iterable[Sequence]) -> tablelib.Table:
+        """ Load the rows (in order of `table.columns`) as the snapshot of the table """
+        snapshot = tablelib.Table([column.name for column in table.columns], rows)
+        self.tables[table.name] = snapshot
+        return snapshot
+
+    def snapshot(self, table:Table) -> tablelib.Table:
+        """ Fetch all rows of the table from the database and keep them as the snapshot """
+        return self.load(table, table.db.execute(Query('SELECT', table.columns, 'FROM', table)))
+
+    def discard(self, table:Table) -> None:
+        """ Discard the snapshot of the table """
+        self.tables.pop(table.name, None)
+
+    def table(self, table:Table) -> tablelib.Table:
+        """ Get the snapshot of the table """
+        if table.name not in self.tables:
+            raise RuntimeError('Table {} is not loaded on the in-memory engine.'.format(repr(table)))
+        return self.tables[table.name]
+
+    def covers(self, select:Select) -> bool:
+        """ Check if all tables used in the select are loaded """
+        return all(
+            table_name in self.tables
+            for table_name in _used_table_names(select)
+        )
+
+
+    ## ---- execution methods ---- ##
+
+    def execute(self, select:Select) -> tablelib.Table:
+        """ Execute the select and get the result table """
+
+        frame = self._joined_frame(select)
+
+        if select.where_expr is not None:
+            frame = frame.filtered(_truth_values(_Evaluator(frame).evaluate(select.where_expr)))
+
+        if select.group_exprs is not None or any(map(_has_aggregate, select.column_exprs)):
+            frame = _GroupedFrame.group_by(frame, select.group_exprs or [])
+            if select.having_expr is not None:
+                frame = frame.filtered(_truth_values(_Evaluator(frame).evaluate(select.having_expr)))
+        elif select.having_expr is not None:
+            raise RuntimeError('HAVING without grouping is not supported.')
+
+        evaluator = _Evaluator(frame)
+        order = list(range(len(frame)))
+        if select.order_exprs is not None:
+            for expr, is_asc in reversed(select.order_exprs):
+                vals = evaluator.evaluate(expr)
+                # NULLs come first in ascending order (as MySQL does)
+                order.sort(key=lambda i: (vals[i] is not None, vals[i]), reverse=not is_asc)
+
+        begin = select.offset or 0
+        end = begin + select.count if select.count is not None else None
+        order = order[begin:end]
+
+        columns = [evaluator.evaluate(expr) for expr in select.column_exprs]
+        return tablelib.Table(select.column_names(), (
+            tuple(column[i] for column in columns) for i in order
+        ))
+
+    def _joined_frame(self, select:Select) -> '_Frame':
+        """ Make the frame of the base table joined with the linked tables in the select """
+
+        connections:Dict[PathKey, Tuple[Column, Column]] = {}
+        base_tables:Dict[TableName, Table] = {}
+
+        for column_expr in _column_exprs(select):
+            column_cons = list(column_expr.column_connections())
+            base_table = column_cons[0][0].table if column_cons else column_expr.entity().table
+            base_tables[base_table.name] = base_table
+            for i, con in enumerate(column_cons):
+                connections[_path_key(column_cons[:i + 1])] = con
+
+        if len(base_tables) != 1:
+            raise RuntimeError('The in-memory engine supports the select from just one base table.')
+
+        base_table, = base_tables.values()
+        base = self.table(base_table)
+        frame = _Frame({(): base}, {(): list(range(len(base)))}, len(base))
+
+        # Join the parent tables first (the shorter path first)
+        for key in sorted(connections, key=len):
+            column_from, column_to = connections[key]
+            frame = frame.joined(key, column_from, self.table(column_to.table), column_to)
+
+        return frame
+
+
+def _path_key(column_cons:Sequence[Tuple[Column, Column]]) -> PathKey:
+    return tuple((repr(column_from), repr(column_to)) for column_from, column_to in column_cons)
+
+
+def _column_exprs(select:Select) -> Iterator[ColumnExpr]:
+    return Select.extract_column_exprs(select.all_exprs())
+
+
+def _used_table_names(select:Select) -> Iterator[TableName]:
+    for column_expr in _column_exprs(select):
+        yield column_expr.entity().table.name
+        for _, column_to in column_expr.column_connections():
+            yield column_to.table.name
+
+
+def _truth_values(vals:Sequence[Any]) -> List[bool]:
+    """ Get the truth values (NULL is regarded as false) """
+    return [val is not None and bool(val) for val in vals]
+
+
+class _Frame:
+    """ Joined rows as the row positions in each joined table """
+
+    def __init__(self,
+        tables:Dict[PathKey, tablelib.Table],
+        positions:Dict[PathKey, List[int]],
+        length:int,
+    ) -> None:
+        self.tables = tables
+        self.positions = positions
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def column(self, column_expr:ColumnExpr) -> List[Any]:
+        """ Get the values of the column """
+        key = _path_key(list(column_expr.column_connections()))
+        table = self.tables[key]
+        ci, = table.column_indexes(column_expr.entity().name)
+        rows = table.rows
+        return [rows[p][ci] for p in self.positions[key]]
+
+    def filtered(self, flags:Sequence[bool]) -> '_Frame':
+        """ Get the frame of the rows whose flag is true """
+        return _Frame(
+            self.tables,
+            {key: [p for p, flag in zip(ps, flags) if flag] for key, ps in self.positions.items()},
+            sum(flags),
+        )
+
+    def joined(self,
+        key:PathKey,
+        column_from:Column,
+        table_to:tablelib.Table,
+        column_to:Column,
+    ) -> '_Frame':
+        """ Get the frame inner-joined with the table (hash join) """
+        parent_table = self.tables[key[:-1]]
+        ci, = parent_table.column_indexes(column_from.name)
+        rows = parent_table.rows
+        index = table_to.hash_index(column_to.name)
+
+        matched_rows:List[int] = []
+        matched_positions:List[int] = []
+        for i, p in enumerate(self.positions[key[:-1]]):
+            val = rows[p][ci]
+            if val is None:
+                continue
+            for matched_position in index.positions(val):
+                matched_rows.append(i)
+                matched_positions.append(matched_position)
+
+        positions = {_key: [ps[i] for i in matched_rows] for _key, ps in self.positions.items()}
+        positions[key] = matched_positions
+        return _Frame({**self.tables, key: table_to}, positions, len(matched_rows))
+
+
+class _GroupedFrame:
+    """ Grouped rows of the frame (as the row indexes in the frame) """
+
+    def __init__(self, frame:_Frame, groups:List[List[int]]) -> None:
+        self.frame = frame
+        self.groups = groups
+
+    @classmethod
+    def group_by(cls, frame:_Frame, group_exprs:Sequence[Expr]) -> '_GroupedFrame':
+        """ Group the rows of the frame by the values of the expressions
+            (All rows are in one group if no expressions are given)
+        """
+        if not group_exprs:
+            return cls(frame, [list(range(len(frame)))])
+        evaluator = _Evaluator(frame)
+        groups:Dict[tuple, List[int]] = {}
+        for i, key in enumerate(zip(*(evaluator.evaluate(expr) for expr in group_exprs))):
+            if key in groups:
+                groups[key].append(i)
+            else:
+                groups[key] = [i]
+        return cls(frame, list(groups.values()))
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def column(self, column_expr:ColumnExpr) -> List[Any]:
+        """ Get the values of the column (the value of the first row in each group) """
+        vals = self.frame.column(column_expr)
+        return [vals[group[0]] if group else None for group in self.groups]
+
+    def filtered(self, flags:Sequence[bool]) -> '_GroupedFrame':
+        """ Get the frame of the groups whose flag is true """
+        return _GroupedFrame(self.frame, [group for group, flag in zip(self.groups, flags) if flag])
+
+
+def _count(vals:List[Any]) -> int:
+    return sum(1 for val in vals if val is not None)
+
+def _non_null(reduce:Callable[[List[Any]], Any]) -> Callable[[List[Any]], Any]:
+    """ Make the aggregate function which ignores NULLs (and returns NULL for no values) """
+    def _reduce(vals:List[Any]) -> Any:
+        vals = [val for val in vals if val is not None]
+        return reduce(vals) if vals else None
+    return _reduce
+
+_aggregate_functions:Dict[str, Callable[[List[Any]], Any]] = {
+    'COUNT': _count,
+    'SUM'  : _non_null(sum),
+    'AVG'  : _non_null(lambda vals: sum(vals) / len(vals)),
+    'MIN'  : _non_null(min),
+    'MAX'  : _non_null(max),
+}
+
+
+def _is_aggregate(expr:Expr) -> bool:
+    return isinstance(expr, FuncExpr) and expr.name.upper() in _aggregate_functions
+
+def _has_aggregate(expr:Expr) -> bool:
+    return any(map(_is_aggregate, expr.extract_exprs()))
+
+
+class _Evaluator:
+    """ Column-wise expression evaluator over the (grouped) frame """
+
+    def __init__(self, frame) -> None:
+        self.frame = frame
+
+    def evaluate(self, expr:Expr) -> List[Any]:
+        """ Evaluate the expression for each row and get the list of values """
+        grouped = isinstance(self.frame, _GroupedFrame)
+        compiled = vectorize.compile_expr(
+            expr,
+            column_key=repr,
+            as_column=_is_aggregate if grouped else None,
+        )
+        return vectorize.to_list(compiled(_FrameColumns(self.frame, compiled.columns), len(self.frame)))
+
+
+class _FrameColumns:
+    """ The input columns of the compiled expression over the (grouped) frame """
+
+    def __init__(self, frame, columns:Dict[str, Expr]) -> None:
+        self.frame = frame
+        self.columns = columns
+
+    def __getitem__(self, key:str) -> List[Any]:
+        expr = self.columns[key]
+        if isinstance(expr, ColumnExpr):
+            return self.frame.column(expr)
+        return self._aggregate(expr)
+
+    def _aggregate(self, expr:FuncExpr) -> List[Any]:
+        name = expr.name.upper()
+        reduce = _aggregate_functions[name]
+        if not expr.args: # COUNT()
+            return [len(group) for group in self.frame.groups]
+        if len(expr.args) != 1:
+            raise RuntimeError('Aggregate function `{}` takes just one argument.'.format(expr.name))
+        vals = _Evaluator(self.frame.frame).evaluate(expr.args[0])
+        return [reduce([vals[i] for i in group]) for group in self.frame.groups]
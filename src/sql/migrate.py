@@ -0,0 +1,284 @@
+"""
+    sql.migrate - Schema diff of the declared tables against the live schema, and the migration plan
+
+    The changes of a table are merged into a single ALTER TABLE (a table is rebuilt at most
+    once), with the algorithm allowed by all of its changes (on MySQL 8.0):
+        INSTANT - metadata only (such as adding a column at the end, or changing a default)
+        INPLACE - online without blocking the writes (LOCK=NONE), possibly rebuilding the table
+                  (such as adding an index, or changing the nullability)
+        COPY    - the table is copied blocking the writes (such as changing the column type)
+    Except that the instant changes are split into their own ALTER TABLE when the others do
+    not rebuild the table (with ALGORITHM=INPLACE, adding a column rebuilds the table).
+    The changes not allowing the concurrent writes (such as adding an AUTO_INCREMENT column)
+    are run with LOCK=SHARED instead of LOCK=NONE.
+    The cost of a migration is estimated by the rows of the table to be copied or sorted
+    (by the table statistics).
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sql.datatypes import DataType
+from sql.expression import Expr, Query, Value
+from sql.objects import Column, Database, Index, Table
+from sql.reflect import Schema, parse_column_type, read_schema
+from sql.stats import DatabaseStats
+
+INSTANT = 'INSTANT'
+INPLACE = 'INPLACE'
+COPY = 'COPY'
+
+_algorithm_levels = {INSTANT: 0, INPLACE: 1, COPY: 2}
+
+
+def _algorithm(changes:List['Change']) -> str:
+    """ Get the algorithm allowed by all changes """
+    return max((change.algorithm for change in changes), key=_algorithm_levels.__getitem__, default=INSTANT)
+
+
+class Change:
+    """ A change of a table (a clause of ALTER TABLE) """
+
+    def __init__(self,
+        clause:Query,
+        algorithm:str,
+        *,
+        rebuild:bool = False,
+        sorts:int = 0,
+        concurrent:bool = True,
+    ) -> None:
+        self.clause = clause
+        self.algorithm = algorithm
+        self.rebuild = rebuild # The table is rebuilt (the rows are copied)
+        self.sorts = sorts # Number of the indexes built (the rows are sorted)
+        self.concurrent = concurrent # The writes are allowed during the change (LOCK=NONE)
+
+    def __repr__(self) -> str:
+        return 'Change({}, {})'.format(self.clause.query_text(), self.algorithm)
+
+
+class TableMigration:
+    """ The migration of a table (CREATE TABLE, or ALTER TABLE with the merged changes) """
+
+    def __init__(self, table:Table, changes:List[Change], *, create:bool = False, rows:int = 0) -> None:
+        self.table = table
+        self.changes = changes
+        self.create = create
+        self.rows = rows # Rows of the table (by the statistics)
+
+    @property
+    def algorithm(self) -> str:
+        """ The algorithm allowed by all changes """
+        if self.create:
+            return INSTANT
+        return _algorithm(self.changes)
+
+    @property
+    def rebuild(self) -> bool:
+        return self.algorithm == COPY or any(change.rebuild for change in self.changes)
+
+    @property
+    def cost(self) -> int:
+        """ Estimated rows to be copied or sorted """
+        if self.create or self.algorithm == INSTANT:
+            return 0
+        sorts = sum(change.sorts for change in self.changes)
+        return self.rows * (1 + sorts if self.rebuild else sorts)
+
+    def statement_changes(self) -> List[List[Change]]:
+        """ Get the changes per ALTER TABLE
+            The instant changes are split from the others not rebuilding the table
+            (merged into an INPLACE statement, adding a column would rebuild the table).
+        """
+        instant_changes = [change for change in self.changes if change.algorithm == INSTANT]
+        other_changes = [change for change in self.changes if change.algorithm != INSTANT]
+        if not instant_changes or not other_changes or self.rebuild:
+            return [self.changes]
+        return [instant_changes, other_changes]
+
+    def queries(self) -> List[Query]:
+        """ Get the queries of the migration """
+        if self.create:
+            return [self.table.creation_sql()]
+        return [self._alter_sql(changes) for changes in self.statement_changes()]
+
+    def _alter_sql(self, changes:List[Change]) -> Query:
+        algorithm = _algorithm(changes)
+        lock = 'NONE' if all(change.concurrent for change in changes) else 'SHARED'
+        return Query(
+            'ALTER TABLE', Query.as_obj(self.table.name), [change.clause for change in changes] + [
+                Query('ALGORITHM=INSTANT') if algorithm == INSTANT else
+                Query('ALGORITHM=INPLACE, LOCK=' + lock) if algorithm == INPLACE else
+                Query('ALGORITHM=COPY')
+            ]
+        )
+
+    def __repr__(self) -> str:
+        return 'TableMigration({}, {}, cost={})'.format(
+            self.table.name, 'CREATE' if self.create else self.algorithm, self.cost)
+
+
+class MigrationPlan:
+    """ The migrations of the tables (in the order of the declarations) """
+
+    def __init__(self, migrations:List[TableMigration], undeclared_tables:List[str]) -> None:
+        self.migrations = migrations
+        self.undeclared_tables = undeclared_tables # Tables in the live schema only (not dropped)
+
+    def __iter__(self) -> Iterator[TableMigration]:
+        return iter(self.migrations)
+
+    def __len__(self) -> int:
+        return len(self.migrations)
+
+    def statements(self) -> List[str]:
+        """ Get the SQL statements of the migrations """
+        return [q.query_text() for migration in self.migrations for q in migration.queries()]
+
+    def apply(self, db:Database) -> None:
+        """ Execute the migrations (one or two statements per table) """
+        for migration in self.migrations:
+            for q in migration.queries():
+                db.execute(q)
+            db.tables_committed(migration.table) # (committed implicitly)
+
+
+def _type_text(datatype:Any) -> str:
+    text = datatype.type_sql() if isinstance(datatype, DataType) else str(datatype)
+    return text.replace(' ', '').upper()
+
+
+def _default_text(expr:Optional[Expr]) -> Optional[str]:
+    if expr is None:
+        return None
+    if isinstance(expr, Value):
+        return None if expr.v is None else str(expr.v)
+    return Query(expr).query_text()
+
+
+def _column_definition(column:Column) -> Query:
+    """ Get the column definition without the keys (for ADD / MODIFY COLUMN) """
+    return Query(
+        Query.as_obj(column.name),
+        column.datatype.type_sql() if isinstance(column.datatype, DataType) else column.datatype,
+        'NOT NULL' if not column.nullable else None,
+        Query('DEFAULT', column.default_expr) if column.default_expr is not None else None,
+        'AUTO_INCREMENT' if column.auto_increment else None,
+    )
+
+
+def _varchar_extension(old:DataType, new:Any) -> bool:
+    """ Check if the change is the extension of VARCHAR without changing the size of the length bytes
+        (assuming 4 bytes per character at most)
+    """
+    if not isinstance(new, DataType) or old.dbtype != 'VARCHAR' or new.dbtype != 'VARCHAR':
+        return False
+    old_len, new_len = old.params[0], new.params[0]
+    return old_len <= new_len and (old_len * 4 < 256) == (new_len * 4 < 256)
+
+
+def _column_changes(column:Column, live:Dict[str, Any]) -> List[Change]:
+    live_type = parse_column_type(live['type'])
+    type_changed = _type_text(live_type) != _type_text(column.datatype)
+    nullable_changed = live['nullable'] != column.nullable
+    auto_increment_changed = live['auto_increment'] != bool(column.auto_increment)
+    default = _default_text(column.default_expr)
+    default_changed = live['default'] != default
+
+    if type_changed or auto_increment_changed:
+        if type_changed and not auto_increment_changed and not nullable_changed and _varchar_extension(live_type, column.datatype):
+            return [Change(Query('MODIFY COLUMN', _column_definition(column)), INPLACE)]
+        return [Change(Query('MODIFY COLUMN', _column_definition(column)), COPY, rebuild=True)]
+    if nullable_changed:
+        return [Change(Query('MODIFY COLUMN', _column_definition(column)), INPLACE, rebuild=True)]
+    if default_changed:
+        return [Change(Query(
+            'ALTER COLUMN', Query.as_obj(column.name),
+            Query('SET DEFAULT', column.default_expr) if column.default_expr is not None else 'DROP DEFAULT',
+        ), INSTANT)]
+    return []
+
+
+def _live_index_key(index_spec:Dict[str, Any]) -> Tuple:
+    return (index_spec['unique'], tuple(tuple(part) if part is not None else None for part in index_spec['columns']))
+
+
+def _index_key(index:Index) -> Tuple:
+    return (index.unique, tuple(zip(index.column_names(), index.prefixes)))
+
+
+def table_changes(table:Table, live:Dict[str, Any]) -> List[Change]:
+    """ Get the changes of the live table into the declared table """
+    changes:List[Change] = []
+    live_columns = {spec['name']: spec for spec in live['columns']}
+    declared_names = [column.name for column in table.columns]
+
+    for i, column in enumerate(table.columns):
+        if column.name not in live_columns:
+            # Adding a column is instant only at the end of the table (and without a key)
+            at_end = all(name not in live_columns for name in declared_names[i:])
+            instant = at_end and not (column.is_unique or column.is_primary or column.auto_increment)
+            changes.append(Change(
+                Query('ADD COLUMN', _column_definition(column),
+                    Query('AFTER', Query.as_obj(declared_names[i - 1])) if i and not at_end else None),
+                INSTANT if instant else INPLACE, rebuild=not instant,
+                concurrent=not column.auto_increment,
+            ))
+        else:
+            changes.extend(_column_changes(column, live_columns[column.name]))
+
+    for name in live_columns:
+        if name not in table.column_dict:
+            changes.append(Change(Query('DROP COLUMN', Query.as_obj(name)), INPLACE, rebuild=True))
+
+    if live['primary'] != [table.key_column.name]:
+        changes.append(Change(Query(
+            'DROP PRIMARY KEY,' if live['primary'] else None,
+            'ADD PRIMARY KEY (', Query.as_obj(table.key_column.name), ')'
+        ), COPY, rebuild=True))
+
+    # The unique columns are compared by the columns (the names of their indexes are implicit)
+    live_indexes = {spec['name']: spec for spec in live['indexes']}
+    unique_columns = {column.name for column in table.columns if column.is_unique and not column.is_primary}
+    for name, spec in list(live_indexes.items()):
+        if spec['unique'] and len(spec['columns']) == 1 and spec['columns'][0] is not None:
+            column_name, prefix = spec['columns'][0]
+            if column_name in unique_columns and prefix is None:
+                unique_columns.discard(column_name)
+                del live_indexes[name]
+    for column_name in unique_columns:
+        changes.append(Change(Query('ADD UNIQUE INDEX (', Query.as_obj(column_name), ')'), INPLACE, sorts=1))
+
+    declared_indexes = {index.name: index for index in table.indexes}
+    for name, spec in live_indexes.items():
+        if name not in declared_indexes or _index_key(declared_indexes[name]) != _live_index_key(spec):
+            changes.append(Change(Query('DROP INDEX', Query.as_obj(name)), INPLACE))
+    for name, index in declared_indexes.items():
+        if name not in live_indexes or _index_key(index) != _live_index_key(live_indexes[name]):
+            changes.append(Change(Query('ADD', index.creation_sql()), INPLACE, sorts=1))
+
+    return changes
+
+
+def plan_migration(
+    db:Database,
+    *,
+    schema:Optional[Schema] = None,
+    stats:Optional[DatabaseStats] = None,
+) -> MigrationPlan:
+    """ Plan the migration of the live schema (read if not given) into the declared tables
+        The costs are estimated by the statistics (`db.collect_stats()` if not given).
+    """
+    if schema is None:
+        schema = read_schema(db)
+    if stats is None:
+        stats = db.collect_stats()
+
+    migrations:List[TableMigration] = []
+    for table in db.tables:
+        if table.name not in schema:
+            migrations.append(TableMigration(table, [], create=True))
+            continue
+        changes = table_changes(table, schema[table.name])
+        if changes:
+            migrations.append(TableMigration(table, changes, rows=stats.table(table.name).rows))
+
+    undeclared_tables = [name for name in schema if not db.table_exists(name)]
+    return MigrationPlan(migrations, undeclared_tables)
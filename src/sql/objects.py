@@ -1,11 +1,14 @@
 """
     sql.schema - SQL schema abstract classes
 """
-from typing import Any, Dict, final, Iterable, Iterator, List, NewType, Optional, overload, Sequence, Tuple, Union
+from __future__ import annotations
+from typing import Any, BinaryIO, Callable, Dict, final, Iterable, Iterator, List, NewType, Optional, overload, Sequence, Set, Tuple, Union
 from abc import abstractmethod
+import datetime
+import os
 from sql.expression import Expr, ExprLike, to_expr, Query
-from sql.datatypes import DataType
-from sql.connector import Connector, Connection
+from sql.datatypes import DataType, ParamConverter
+from sql.executor import Connector, Connection
 
 class SchemaExpr(Expr):
 
@@ -129,6 +132,8 @@ class SchemaExprs(SchemaExpr):
 TableName = NewType('TableName', str)
 ColumnName = NewType('ColumnName', str)
 
+QueryExecValTypes = Optional[Union[bool, int, float, str, bytes, datetime.date, datetime.datetime, datetime.time]]
+
 class ColumnExpr(SingleSchemaExpr):
     """
         ColumnExpr Expression (Abstract class)
@@ -138,6 +143,10 @@ class ColumnExpr(SingleSchemaExpr):
     def entity(self) -> 'Column': 
         """ Return the pure column object (not referenced, linked, or aliased column) """
 
+    @abstractmethod
+    def path_name(self) -> str:
+        """ Return the dotted name of the link path until this column (ex. `Item.group.name`) """
+
     @final
     def link_to(self, val):
         """ 
@@ -206,7 +215,7 @@ class TableExpr(SingleSchemaExpr):
             return self.column(val)
 
         if isinstance(val, Table):
-            return LinkedTable(val, self.entity().connection_to(val))
+            return LinkedTable(val, self.column(self.entity().connection_to(val)))
 
         if isinstance(val, Column):
             if self.entity().column_exists(val):
@@ -312,6 +321,9 @@ class ColumnRef(ColumnExpr):
     def __repr__(self) -> str:
         return repr(self.table) + '.`' + self.name + '`'
 
+    def path_name(self) -> str:
+        return self.entity().path_name()
+
     def __sql__(self):
         return self.entity().__sql__()
 
@@ -348,6 +360,7 @@ class Column(ColumnExpr):
         is_primary    : bool = False, # primary key or not
         auto_increment: Optional[bool] = None, # auto increment or not
         links         : Sequence[Union['Column', ColumnRef]] = [], # linked columns
+        index         : Optional[Union[bool, int]] = None, # secondary index (int for the prefix length)
         **_options
     ) -> None:
 
@@ -376,6 +389,9 @@ class Column(ColumnExpr):
         self.is_primary = is_primary
         self.auto_increment = auto_increment
         self.links = list(links)
+        # True / the prefix length: indexed, False: not indexed,
+        # None: indexed only if linked (the index for the joins through the column)
+        self.index = index
         self.column_links_table:Dict[TableName, Column]
         self._reference_resolved = False
 
@@ -424,12 +440,16 @@ class Column(ColumnExpr):
 
     def __sql__(self) -> Query:
         """ Generate the sql query representation """
-        return Query(self.table, '.' + Query.as_obj(self.name))
+        return Query(self.table, '.', Query.as_obj(self.name))
 
     def __repr__(self) -> str:
         """ Get the string representation for debug """
         return repr(self.table) + '.' + self.name
 
+    def path_name(self) -> str:
+        """ Get the dotted name of this column (`table.column`) """
+        return self.table.name + '.' + self.name
+
     def column_connections(self) -> Iterator[Tuple['Column', 'Column']]:
         """ Get column connections (yield nothing) """
         while False:
@@ -452,14 +472,85 @@ class Column(ColumnExpr):
     def creation_sql(self) -> Query:
         """ Get the sql query to create this column """
         return Query(
-            self.name,
-            self.datatype,
-            'NOT NULL' if self.nullable else None,
-            Query('DEFAULT', self.default_expr) if self.default_expr else None,
+            Query.as_obj(self.name),
+            self.datatype.type_sql() if isinstance(self.datatype, DataType) else self.datatype,
+            'NOT NULL' if not self.nullable else None,
+            Query('DEFAULT', self.default_expr) if self.default_expr is not None else None,
             'UNIQUE KEY' if self.is_unique else None,
             'PRIMARY KEY' if self.is_primary else None,
             'AUTO_INCREMENT' if self.auto_increment else None,
         )
+
+    def index_declaration(self) -> Optional['Index']:
+        """ Get the secondary index declared by the `index` option
+            (or the automatic index of the link column)
+        """
+        if self.index is False or self.is_primary or self.is_unique:
+            return None
+        if self.index is None and not self.links:
+            return None
+        prefix = None if isinstance(self.index, bool) else self.index
+        return Index((self.name, prefix) if prefix is not None else self.name)
+
+
+IndexColumnSpec = Union[ColumnName, Column, Tuple[Union[ColumnName, Column], Optional[int]]]
+
+class Index:
+    """ Secondary (or composite) index declaration of a table
+
+        The columns are given by the names or the column objects, or the tuples
+        of them and the prefix lengths (The prefix length is required for TEXT / BLOB
+        columns, and DEFAULT_TEXT_PREFIX is used if not given, except for the unique index).
+    """
+
+    DEFAULT_TEXT_PREFIX = 255
+
+    def __init__(self, *columns:IndexColumnSpec, name:Optional[str] = None, unique:bool = False) -> None:
+        if not columns:
+            raise RuntimeError('No columns of the index are specified.')
+        self.column_specs = columns
+        self.name = name
+        self.unique = unique
+        self.table:Optional['Table'] = None
+        self.columns:List[Column] = []
+        self.prefixes:List[Optional[int]] = []
+
+    def _set_table(self, table:'Table') -> 'Index':
+        """ Resolve the columns in the table (called by `Table` class) """
+        self.table = table
+        self.columns = []
+        self.prefixes = []
+        for spec in self.column_specs:
+            column_or_name, prefix = spec if isinstance(spec, tuple) else (spec, None)
+            column = table.to_self_column(column_or_name)
+            if prefix is None and isinstance(column.datatype, DataType) and column.datatype.needs_index_prefix():
+                if self.unique:
+                    # The uniqueness of the prefix only is not what is declared
+                    raise RuntimeError('The prefix length of TEXT / BLOB column `{}` in the unique index is required.'.format(column.name))
+                prefix = self.DEFAULT_TEXT_PREFIX
+            self.columns.append(column)
+            self.prefixes.append(prefix)
+        if self.name is None:
+            self.name = ('uq_' if self.unique else 'idx_') + '_'.join(self.column_names())
+            self.name = self.name[:64]
+        return self
+
+    def column_names(self) -> List[ColumnName]:
+        return [column.name for column in self.columns]
+
+    def __repr__(self) -> str:
+        return 'Index({}{}{})'.format(
+            repr(self.table) + ':' if self.table is not None else '',
+            self.name, ', unique' if self.unique else '')
+
+    def creation_sql(self) -> Query:
+        """ Get the sql query of the index in the table definition """
+        return Query(
+            'UNIQUE INDEX' if self.unique else 'INDEX', Query.as_obj(self.name), '(', [
+                Query(Query.as_obj(column.name), Query('(', prefix, ')') if prefix is not None else None)
+                for column, prefix in zip(self.columns, self.prefixes)
+            ], ')'
+        )
         
 
 # class ColumnsInTable(Expr):
@@ -480,16 +571,24 @@ class Column(ColumnExpr):
 
 class Table(TableExpr):
 
+    # `update_many` uses CASE up to this rows per statement (and the join of VALUES over it)
+    UPDATE_MANY_CASE_MAX_ROWS = 100
+    # `select_key_with_insertion` looks up the records in the queries of this records
+    SELECT_KEYS_CHUNK_SIZE = 500
+
     def __init__(self,
         db:'Database',
         name:TableName,
         columns:Iterable[Column],
+        *,
+        indexes:Sequence[Index] = (),
         **options
     ) -> None:
         self.db = db
         self.name = name
         self.columns = list(column._set_table(self) for column in columns)
         self.column_dict = {column.name: column for column in self.columns}
+        self.indexes = self._resolve_indexes(indexes)
         # self.column_links_table = [c for c in self.columns if c.links]
         # self.linked_tables = set(column.link.table for column in self.column_links_table)
         # self.linkpaths:Optional[Dict[TableName, List[Table]]] = None
@@ -497,6 +596,8 @@ class Table(TableExpr):
         # self.linked_tables = set()
         self.created_on_db = None
         self._reference_resolved = False
+        self._validators:Dict[Tuple[ColumnName, ...], 'TableValidator'] = {}
+        self._param_converters:Dict[Tuple[Tuple[ColumnName, ...], bool], List[ParamConverter]] = {}
 
         self.db.append_table(self)
 
@@ -511,6 +612,29 @@ class Table(TableExpr):
         #     fkey_col.link_col.table.linked_fk_cols.add(fkey_col)
         #     fkey_col.link_col.table.linked_tables.add(fkey_col.table)
 
+    def _resolve_indexes(self, indexes:Sequence[Index]) -> List[Index]:
+        """ Get the secondary indexes of the table declaration and the column options
+            (The automatic index of a link column is omitted if another index leads with the column)
+        """
+        for column in self.columns:
+            if (column.is_unique or column.is_primary) \
+                    and isinstance(column.datatype, DataType) and column.datatype.needs_index_prefix():
+                raise RuntimeError('TEXT / BLOB column `{}` cannot be the unique key without the prefix length.'.format(column.name))
+
+        resolved = [index._set_table(self) for index in indexes]
+        for column in self.columns:
+            index = column.index_declaration()
+            if index is None:
+                continue
+            if column.index is None and any(i.columns[0] is column for i in resolved):
+                continue
+            resolved.append(index._set_table(self))
+
+        names = [index.name for index in resolved]
+        if len(set(names)) != len(names):
+            raise RuntimeError('There are indexes of the same name in table `{}`.'.format(self.name))
+        return resolved
+
     def resolve_references(self) -> None:
         """ Resolve references of the columns in this table """
 
@@ -571,9 +695,9 @@ class Table(TableExpr):
     def creation_sql(self) -> Query:
         """ Get the sql query to create table """
         return Query(
-            'CREATE TABLE ',
+            'CREATE TABLE',
             Query.as_obj(self.name),
-            '(', [c.creation_sql() for c in self.columns], ')'
+            '(', [c.creation_sql() for c in self.columns] + [i.creation_sql() for i in self.indexes], ')'
         )
 
     def create(self):
@@ -587,11 +711,15 @@ class Table(TableExpr):
 
     def truncate(self):
         """ SQL Truncate table """
-        return self.db.execute(Query('TRUNCATE TABLE', self))
+        result = self.db.execute(Query('TRUNCATE TABLE', self))
+        self.db.tables_committed(self) # (committed implicitly)
+        return result
 
     def drop(self):
         """ SQL Drop table """
-        return self.db.execute(Query('DROP TABLE', self))
+        result = self.db.execute(Query('DROP TABLE', self))
+        self.db.tables_committed(self) # (committed implicitly)
+        return result
 
         
     ### ---- Database actions for table records ---- ###
@@ -601,6 +729,7 @@ class Table(TableExpr):
         *args,
         **kwargs
     ) -> 'Select':
+        from sql.select import Select
         return Select(
             self.db,
             [
@@ -615,83 +744,296 @@ class Table(TableExpr):
         columns: Optional[Sequence[Union[ColumnName, Expr]]] = None,
         *args,
         **kwargs
-    ) -> ExecutionQuery:
+    ) -> 'Select':
         """ SQL SELECT query """
-        return self.prepare_select(columns, *args, **kwargs).execution_query()
+        return self.prepare_select(columns, *args, **kwargs).exec()
 
     def insert(self,
         columns_or_names: Sequence[Union[ColumnName, Column]],
         vals_itr:Iterable[Iterable[ExprLike]],
-    ) -> ExecutionQuery:
-        """ SQL INSERT query """
-        return ExecutionQuery(
-            Query(
-                'INSERT INTO', self, '(',[
-                    Query.as_obj(c.name) for c in map(self.to_self_column, columns_or_names)
-                ], ')', 'VALUES', '(', [
-                    Query('%s') for _ in range(len(columns_or_names))
-                ], ')'
-            ),
-            ((self.to_query_exec_val(val) for val in vals) for vals in vals_itr),
+        *,
+        validate:bool = False,
+    ) -> List[Any]:
+        """ SQL INSERT query (bulk insertion of the records)
+            If `validate` is True, all records are validated before the insertion
+            (raises `sql.validation.ValidationError` with all invalid values).
+        """
+        columns = [self.to_self_column(c) for c in columns_or_names]
+        records = [list(vals) for vals in vals_itr]
+        if validate:
+            self.validator(columns).expect_valid(records)
+        result = self.db.execute(
+            self.insertion_sql(columns),
+            self.to_query_exec_vals(columns, records),
+            many=True,
+        )
+        self.db.table_modified(self)
+        return result
+
+    def insert_buffer(self, columns_or_names:Sequence[Union[ColumnName, Column]], **options) -> 'InsertBuffer':
+        """ Get the write-behind buffer of the insertions into this table
+            (See `sql.writebuffer.InsertBuffer` for the options)
+        """
+        from sql.writebuffer import InsertBuffer
+        return InsertBuffer(self, columns_or_names, **options)
+
+    def insertion_sql(self, columns:Sequence[Column]) -> Query:
+        """ Get the sql query of INSERT with the parameters of the columns (for `executemany`) """
+        return Query(
+            'INSERT INTO', self, '(',[
+                Query.as_obj(c.name) for c in columns
+            ], ')', 'VALUES', '(', [
+                Query('%s') for _ in range(len(columns))
+            ], ')'
         )
         
-    def update(self,
+    def import_file(self, fp:BinaryIO, format:str = 'csv', **options) -> 'ImportResult':
+        """ Import the CSV / TSV file into this table in parallel
+            (See `sql.ingest.import_file` for the options)
+        """
+        from sql.ingest import import_file
+        return import_file(self, fp, format, **options)
+
+    def shard(self,
+        column_or_name:Union[ColumnName, Column],
+        function:'ShardFunction',
+        connectors:Sequence[Connector],
+        **options
+    ) -> 'ShardedTable':
+        """ Get this table sharded by the column across the databases of the connectors (a connector per shard)
+            (See `sql.sharding.ShardedTable` for the options)
+        """
+        from sql.sharding import ShardedTable
+        return ShardedTable(self, column_or_name, function, connectors, **options)
+
+    def set_clause(self,
         _raw_column_exprs: Union[Dict[ColumnName, ExprLike], Iterable[Tuple[Union[ColumnName, Column], ExprLike]]],
-        where: Optional[ExprLike],
-        count: Optional[int] = None,
-    ):
-        """ SQL UPDATE query """
+    ) -> Tuple[Query, Optional[Tuple[QueryExecValTypes, ...]]]:
+        """ Get the SET clause of UPDATE and its parameters
+            The raw values (not expressions) are passed as the query parameters.
+            (The assigned columns are not qualified by the table, which SQLite does not allow)
+        """
         if isinstance(_raw_column_exprs, dict):
             raw_column_exprs = _raw_column_exprs.items()
         else:
             raw_column_exprs = _raw_column_exprs
-        return self.db.execute(Query(
+
+        set_queries:List[Query] = []
+        param_columns:List[Column] = []
+        param_vals:List[Any] = []
+        for column_or_name, expr in raw_column_exprs:
+            column = self.to_self_column(column_or_name)
+            if isinstance(expr, Expr):
+                set_queries.append(Query(Query.as_obj(column.name), '=', expr))
+            else:
+                set_queries.append(Query(Query.as_obj(column.name), '=', '%s'))
+                param_columns.append(column)
+                param_vals.append(expr)
+
+        return (
+            Query('SET', set_queries),
+            self.to_query_exec_vals(param_columns, [param_vals])[0] if param_vals else None,
+        )
+
+    def update(self,
+        _raw_column_exprs: Union[Dict[ColumnName, ExprLike], Iterable[Tuple[Union[ColumnName, Column], ExprLike]]],
+        where: Optional[ExprLike],
+        count: Optional[int] = None,
+    ):
+        """ SQL UPDATE query
+            The raw values (not expressions) are passed as the query parameters.
+        """
+        set_query, params = self.set_clause(_raw_column_exprs)
+        result = self.db.execute(Query(
             'UPDATE', self,
-            'SET', [
-                Query(self.to_self_column(column_or_name), '=', to_expr(expr))
-                for column_or_name, expr in raw_column_exprs
-            ],
-            Query('WHERE', to_expr(where)) if where else None,
+            set_query,
+            Query('WHERE', to_expr(where)) if where is not None else None,
             Query('LIMIT', count) if count else None,
-        ))
+        ), params)
+        self.db.table_modified(self)
+        return result
+
+    def update_many(self,
+        columns_or_names: Sequence[Union[ColumnName, Column]],
+        key_to_values: Union[Dict[Any, Sequence[Any]], Iterable[Sequence[Any]]],
+        *,
+        chunk_size: int = 1000,
+        strategy: Optional[str] = None,
+        commit: bool = False,
+    ) -> List[int]:
+        """ SQL UPDATE query setting the different values per row (by the primary key)
+            `key_to_values` is the dict of the keys to the values of the columns,
+            or the records of the key and the values.
+            The rows are updated in the statements of `chunk_size` rows, with the strategy:
+                'case' - `SET column = CASE key WHEN ... THEN ... END WHERE key IN (...)`
+                'join' - `UPDATE ... JOIN (VALUES ROW(...), ...)` (MySQL 8.0.19 or later)
+            chosen by the chunk size if not given (CASE is evaluated by comparing the keys one by one,
+            so it is used only for the small chunks up to `UPDATE_MANY_CASE_MAX_ROWS`).
+            The chunks are committed one by one if `commit` is True.
+            Returns the numbers of the affected (changed) rows of the chunks.
+        """
+        columns = [self.to_self_column(c) for c in columns_or_names]
+        if isinstance(key_to_values, dict):
+            records = [(key, *vals) for key, vals in key_to_values.items()]
+        else:
+            records = [tuple(record) for record in key_to_values]
+        if strategy is None:
+            strategy = 'case' if min(chunk_size, len(records)) <= self.UPDATE_MANY_CASE_MAX_ROWS else 'join'
+        if strategy not in ('case', 'join'):
+            raise RuntimeError('Unknown strategy `{}`.'.format(strategy))
+
+        counts:List[int] = []
+        for i in range(0, len(records), chunk_size):
+            rows = self.to_query_exec_vals([self.key_column, *columns], records[i:i + chunk_size])
+            if strategy == 'case':
+                query, params = self._update_case_query(columns, rows)
+            else:
+                query, params = self._update_join_query(columns, rows)
+            counts.append(self.db.execute_affected(query, params))
+            self.db.table_modified(self)
+            if commit:
+                self.db.commit()
+        return counts
+
+    def _update_case_query(self,
+        columns:List[Column],
+        rows:List[Tuple[QueryExecValTypes, ...]],
+    ) -> Tuple[Query, List[QueryExecValTypes]]:
+        params:List[QueryExecValTypes] = []
+        set_queries:List[Query] = []
+        for i, column in enumerate(columns, 1):
+            set_queries.append(Query(
+                column, '= CASE', self.key_column, *('WHEN %s THEN %s' for _ in rows), 'ELSE', column, 'END'
+            ))
+            for row in rows:
+                params.extend((row[0], row[i]))
+        params.extend(row[0] for row in rows)
+        return Query(
+            'UPDATE', self, 'SET', set_queries,
+            'WHERE', self.key_column, 'IN (', [Query('%s') for _ in rows], ')'
+        ), params
+
+    def _update_join_query(self,
+        columns:List[Column],
+        rows:List[Tuple[QueryExecValTypes, ...]],
+    ) -> Tuple[Query, List[QueryExecValTypes]]:
+        row_query = Query('ROW(', [Query('%s') for _ in range(len(columns) + 1)], ')')
+        names = ['_key'] + ['_v{}'.format(i) for i in range(len(columns))]
+        return Query(
+            'UPDATE', self, 'JOIN (VALUES', [row_query for _ in rows], ') AS', Query.as_obj('_values'),
+            '(', [Query.as_obj(name) for name in names], ')',
+            'ON', self.key_column, '=', Query(Query.as_obj('_values'), '.', Query.as_obj('_key')),
+            'SET', [
+                Query(column, '=', Query(Query.as_obj('_values'), '.', Query.as_obj(name)))
+                for column, name in zip(columns, names[1:])
+            ]
+        ), [v for row in rows for v in row]
+
+    def update_chunked(self,
+        _raw_column_exprs: Union[Dict[ColumnName, ExprLike], Iterable[Tuple[Union[ColumnName, Column], ExprLike]]],
+        where: Optional[ExprLike],
+        **options
+    ) -> 'ChunkProgress':
+        """ SQL UPDATE query in the chunks of the primary key ranges, committed one by one
+            (See `sql.chunked.run_chunked` for the options)
+        """
+        from sql.chunked import run_chunked
+        set_query, params = self.set_clause(_raw_column_exprs)
+        return run_chunked(self, Query('UPDATE', self, set_query), params, where, **options)
 
     def delete(self,
         where: Optional[ExprLike],
         count: Optional[int] = None,
     ):
         """ SQL DELETE query """
-        return self.db.execute(Query(
+        result = self.db.execute(Query(
             'DELETE FROM', self,
-            Query('WHERE', to_expr(where)) if where else None,
+            Query('WHERE', to_expr(where)) if where is not None else None,
             Query('LIMIT', count) if count else None,
         ))
+        self.db.table_modified(self)
+        return result
+
+    def delete_chunked(self, where:Optional[ExprLike], **options) -> 'ChunkProgress':
+        """ SQL DELETE query in the chunks of the primary key ranges, committed one by one
+            (See `sql.chunked.run_chunked` for the options)
+        """
+        from sql.chunked import run_chunked
+        return run_chunked(self, Query('DELETE FROM', self), None, where, **options)
 
     def select_key_with_insertion(self,
         columns: List[Column],
-        records_itr: Iterable[Iterable[ExprLike]],
-    ) -> Dict[tuple, int]:
-        """ SQL selections and insertion query """
-
-        if self.key_column is None: raise RuntimeError('No primary key found in this table.')
-
-        records = list(records_itr)
-
-        # Get existing records
-        vals_to_key = {vals:key for key, *vals in self.select(
-            [self.key_column, *columns],
-            where=(columns in to_expr(records)))}
-        
-        # Insert new records and get their keys
-        new_records = filter(lambda rec: rec not in vals_to_key, records_itr)
-        self.insert(columns, new_records)
-
-        return {
-            **vals_to_key,
-            **{vals:key for key, *vals in self.select(
-                [self.key_column, *columns],
-                where=(columns in to_expr(new_records))
-            )}
-        }
+        records_itr: Iterable[Iterable[Any]],
+        *,
+        key_column: Optional[Column] = None,
+    ) -> Dict[tuple, Any]:
+        """ Get the keys of the records (the values of `key_column`, the primary key by default),
+            inserting the records not existing
+            The records are looked up in the queries of `SELECT_KEYS_CHUNK_SIZE` records (before and
+            after the insertion of the new ones) and inserted in a bulk insertion, so the round trips
+            do not depend on the number of records but the chunks.
+        """
+        if key_column is None:
+            key_column = self.key_column
+        if key_column is None: raise RuntimeError('No primary key found in this table.')
+        return self._select_keys_with_insertion(key_column, [self.to_self_column(c) for c in columns], records_itr)[0]
+
+    def _select_keys_with_insertion(self,
+        key_column:Column,
+        columns:List[Column],
+        records_itr:Iterable[Iterable[Any]],
+    ) -> Tuple[Dict[tuple, Any], int]:
+        """ Get the keys of the records inserting the new ones, and the number of the inserted records """
+        records = list(dict.fromkeys(tuple(vals) for vals in records_itr))
+        vals_to_key = self._select_keys(key_column, columns, records)
+        new_records = [vals for vals in records if vals not in vals_to_key]
+        if new_records:
+            self.insert(columns, new_records)
+            vals_to_key.update(self._select_keys(key_column, columns, new_records))
+        return vals_to_key, len(new_records)
+
+    def _select_keys(self,
+        key_column:Column,
+        columns:List[Column],
+        records:List[tuple],
+    ) -> Dict[tuple, Any]:
+        """ Get the keys of the existing records (by the given records, not the values in the database)
+            The records of a chunk of `SELECT_KEYS_CHUNK_SIZE` records are given with their positions
+            as the derived table (`VALUES ROW(...)`) joined by `<=>` in a query, so that the values
+            are compared by the database (such as by the collations, or the decimals given as
+            the strings), and the rows are mapped back to the records by the positions.
+        """
+        names = ['_pos'] + ['_v{}'.format(i) for i in range(len(columns))]
+        records_table = Query.as_obj('_records')
+        vals_to_key:Dict[tuple, Any] = {}
+        for start in range(0, len(records), self.SELECT_KEYS_CHUNK_SIZE):
+            chunk = records[start:start + self.SELECT_KEYS_CHUNK_SIZE]
+            params = self.to_query_exec_vals(columns, chunk)
+            row_query = Query('ROW(', [Query('%s') for _ in names], ')')
+            rows = self.db.execute(Query(
+                'SELECT', [Query(records_table, '.', Query.as_obj('_pos')), key_column],
+                'FROM (VALUES', [row_query for _ in chunk], ') AS', records_table,
+                '(', [Query.as_obj(name) for name in names], ')',
+                'JOIN', self, 'ON', *(
+                    Query('AND' if i else None, column, '<=>', Query(records_table, '.', Query.as_obj(name)))
+                    for i, (column, name) in enumerate(zip(columns, names[1:]))
+                )
+            ), [v for i, vals in enumerate(params) for v in (i, *vals)])
+            for i, key in rows:
+                vals_to_key.setdefault(chunk[i], key)
+        return vals_to_key
+
+    def validator(self,
+        columns_or_names: Optional[Sequence[Union[ColumnName, Column]]] = None,
+    ) -> 'TableValidator':
+        """ Get the validator of the records for the given columns (compiled once) """
+        from sql.validation import TableValidator
+        columns = [self.to_self_column(c) for c in columns_or_names] \
+            if columns_or_names is not None else self.columns
+        key = tuple(column.name for column in columns)
+        if key not in self._validators:
+            self._validators[key] = TableValidator(self, columns)
+        return self._validators[key]
 
 
     ## ---- column utility methods ---- ##
@@ -726,8 +1068,8 @@ class Table(TableExpr):
         if not self.reference_resolved():
             raise RuntimeError('References are not resolved in {}.'.format(repr(self)))
         return (
-            not dest_table.name in self.link_columns_to_table
-            or len(self.link_columns_to_table[dest_table.name]) != 1
+            dest_table.name in self.link_columns_to_table
+            and len(self.link_columns_to_table[dest_table.name]) == 1
         )
 
     def connection_to(self, dest_table:'Table') -> Column:
@@ -738,6 +1080,43 @@ class Table(TableExpr):
 
     ## ---- database utility class --- ##
 
+    def param_converters(self,
+        columns_or_names: Sequence[Union[ColumnName, Column]],
+        *,
+        binary:Optional[bool] = None,
+    ) -> List[ParamConverter]:
+        """ Get the converters of the values into the query parameters for each column
+            (chosen once per column by its datatype; None means no conversion)
+            In default, `binary` is whether the database uses the binary protocol.
+        """
+        if binary is None:
+            binary = self.db.binary_protocol()
+        columns = [self.to_self_column(c) for c in columns_or_names]
+        key = (tuple(column.name for column in columns), binary)
+        if key not in self._param_converters:
+            self._param_converters[key] = [
+                column.datatype.param_converter(binary=binary)
+                if isinstance(column.datatype, DataType) else self.to_query_exec_val
+                for column in columns
+            ]
+        return self._param_converters[key]
+
+    def to_query_exec_vals(self,
+        columns_or_names: Sequence[Union[ColumnName, Column]],
+        records: Iterable[Iterable[Any]],
+        *,
+        binary:Optional[bool] = None,
+    ) -> List[Tuple[QueryExecValTypes, ...]]:
+        """ Convert the records into the query parameters column by column """
+        rows = [tuple(vals) for vals in records]
+        converters = self.param_converters(columns_or_names, binary=binary)
+        if not rows or all(converter is None for converter in converters):
+            return rows
+        return list(zip(*(
+            vals if converter is None else map(converter, vals)
+            for converter, vals in zip(converters, zip(*rows))
+        )))
+
     @staticmethod
     def to_query_exec_val(v:Any) -> QueryExecValTypes:
         if v is None:
@@ -775,6 +1154,9 @@ class ColumnInLinkedTable(ColumnExpr):
     def __repr__(self) -> str:
         return repr(self.column) + '<-' + repr(self.linked_table.linking_column)
 
+    def path_name(self) -> str:
+        return self.linked_table.linking_column.path_name() + '.' + self.column.name
+
     def __sql__(self) -> Query:
         return self.column.__sql__()
 
@@ -847,12 +1229,16 @@ class ColumnInAliasedTable(ColumnExpr):
 
     def __sql__(self) -> Query:
         """ SQL-query convertion """
-        return Query(self.aliased_table, '.' + Query.as_obj(self.column.entity().name))
+        return Query(self.aliased_table, '.', Query.as_obj(self.column.entity().name))
 
     def __repr__(self) -> str:
         """ Get the string representation for debug """
         return repr(self.aliased_table) + '.' + self.column.entity().name
 
+    def path_name(self) -> str:
+        """ Get the dotted name with the alias name (`alias.column`) """
+        return self.aliased_table.alias_name + '.' + self.column.entity().name
+
 
 class AliasedTable(TableExpr):
     """ Table with alias name """
@@ -918,6 +1304,36 @@ class Database(SchemaExpr):
         self.connector :Optional[Connector ] = None
         self.connection:Optional[Connection] = None
 
+        # The in-memory engine to answer the selects over the cached tables
+        self.memory_engine:Optional['InMemoryEngine'] = None
+
+        # The persistent result cache shared by the processes (used by `Select.exec(cache=True)`)
+        self.result_cache:Optional['ResultCache'] = None
+
+        # The table statistics (collected by `collect_stats`, and kept for `stats_ttl` seconds)
+        self.stats:Optional['DatabaseStats'] = None
+        self.stats_ttl = 300.0
+
+        # The selects taking longer than this (seconds) are explained automatically,
+        # and the plans are passed to the handler (or logged if no handler)
+        self.slow_query_seconds:Optional[float] = None
+        self.slow_query_handler:Optional[Callable[['Select', float, 'Plan'], Any]] = None
+        # The selects of the same fingerprint are explained once in this interval (seconds)
+        self.slow_query_interval = 60.0
+        self.slow_query_throttle:Optional['SlowQueryThrottle'] = None
+
+        # The tables written in the current transaction (notified to the result cache on commit)
+        self.uncommitted_tables:Set[TableName] = set()
+
+        # The workload of the executed selects recorded for the index advisor (`sql.advisor`)
+        self.workload:Optional['Workload'] = None
+
+        # The depth of the nested transactions (`transaction`), 0 if not in a transaction
+        self.transaction_depth = 0
+
+        # The router of the reads to the replicas (`connect_replicas`), the primary only if None
+        self.replica_router:Optional['ReplicaRouter'] = None
+
 
     ## ---- override methods ---- ##
 
@@ -979,11 +1395,189 @@ class Database(SchemaExpr):
     def connect(self, connector:Optional[Connector] = None):
         if connector:
             self.connector = connector
-        self.connection = connector.connect()
+        if self.connector is None:
+            raise RuntimeError('Connector is not specified.')
+        self.connection = self.connector.connect()
 
-    
-    def execute(self, query:Query, values):
-        return 
+    def connect_replicas(self, connectors:Iterable[Connector], **options) -> None:
+        """ Route the reads (the selects) to the replicas (connected on demand)
+            (See `sql.routing.ReplicaRouter` for the options)
+        """
+        from sql.routing import ReplicaRouter
+        if self.replica_router is not None:
+            self.replica_router.close()
+        self.replica_router = ReplicaRouter(connectors, **options)
+
+    def binary_protocol(self) -> bool:
+        """ Check if the connection uses the binary protocol (prepared statements) """
+        return self.connection is not None and self.connection.prepared
+
+    def execute(self,
+        query:Query,
+        values:Optional[Iterable] = None,
+        *,
+        many:bool = False,
+        raw:bool = False,
+    ) -> List[Any]:
+        """ Execute the query on the connected database and get the result rows
+            If `raw` is True, the result values are not decoded by the driver
+            (ignored for the binary protocol, whose values are already typed).
+            The writes of the query are not tracked: notify them by `table_modified`
+            for the result cache (`sql.resultcache`) and the replica routing.
+        """
+        if self.connection is None:
+            raise RuntimeError('Database is not connected.')
+        with self.connection.operate(self, raw=raw) as op:
+            return op.execute(query, values, many=many)
+
+    def execute_read(self,
+        query:Query,
+        values:Optional[Iterable] = None,
+        *,
+        raw:bool = False,
+    ) -> List[Any]:
+        """ Execute the read query on a replica (See `connect_replicas`), or on the primary
+            in a transaction or after a write by the current thread
+        """
+        router = self.replica_router
+        if router is None or self.transaction_depth or router.sticky():
+            return self.execute(query, values, raw=raw)
+        return router.execute(self, query, values, raw=raw)
+
+    def execute_affected(self,
+        query:Query,
+        values:Optional[Iterable] = None,
+        *,
+        many:bool = False,
+    ) -> int:
+        """ Execute the query (such as UPDATE) on the connected database and get the number of the affected rows """
+        if self.connection is None:
+            raise RuntimeError('Database is not connected.')
+        with self.connection.operate(self) as op:
+            op.execute(query, values, many=many)
+            return op.rowcount
+
+    def commit(self) -> None:
+        """ Commit the current transaction """
+        if self.connection is None:
+            raise RuntimeError('Database is not connected.')
+        self.connection.commit()
+        if self.uncommitted_tables:
+            tables, self.uncommitted_tables = self.uncommitted_tables, set()
+            self.tables_committed(*tables)
+
+    def rollback(self) -> None:
+        """ Roll back the current transaction """
+        if self.connection is None:
+            raise RuntimeError('Database is not connected.')
+        self.connection.rollback()
+        self.uncommitted_tables.clear()
+
+    def transaction(self, *, isolation:Optional[str] = None) -> 'Transaction':
+        """ Start a transaction (or a savepoint in the transaction) in the `with` block
+            (See `sql.transaction.Transaction`)
+        """
+        from sql.transaction import Transaction
+        return Transaction(self, isolation=isolation)
+
+    def run_transaction(self, func:Callable[..., Any], *args, **kwargs) -> Any:
+        """ Run the function in a transaction, retried on the deadlocks
+            (See `sql.transaction.run_transaction` for the options)
+        """
+        from sql.transaction import run_transaction
+        return run_transaction(self, func, *args, **kwargs)
+
+    def group_commit(self, **options) -> 'GroupCommit':
+        """ Get the group commit of the logical transactions
+            (See `sql.transaction.GroupCommit` for the options)
+        """
+        from sql.transaction import GroupCommit
+        return GroupCommit(self, **options)
+
+    def execute_multi(self, queries:Sequence[Query]) -> None:
+        """ Execute the queries (such as DDL) in a round trip, discarding the results
+            (one by one with the binary protocol, which does not support the multiple statements)
+        """
+        if self.connection is None:
+            raise RuntimeError('Database is not connected.')
+        if not queries:
+            return
+        with self.connection.operate(self) as op:
+            if self.connection.prepared:
+                for query in queries:
+                    op.execute(query)
+                return
+            parts:List[Any] = []
+            for query in queries:
+                parts.extend((query, ';'))
+            op.execute_multi(Query(*parts[:-1]))
+
+    def existing_table_names(self) -> Set[TableName]:
+        """ Get the names of the tables existing on the database (in a query) """
+        return {TableName(name) for name, in self.execute(Query(
+            'SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = %s'
+        ), [self.name])}
+
+    def collect_stats(self, *, ttl:Optional[float] = None, scan:bool = False, refresh:bool = False) -> 'DatabaseStats':
+        """ Get the table statistics (collected again if older than `ttl` seconds,
+            `stats_ttl` by default, or if `refresh` is True)
+            (See `sql.stats.collect_stats` for `scan`)
+        """
+        if ttl is None:
+            ttl = self.stats_ttl
+        if refresh or self.stats is None or self.stats.age() > ttl:
+            from sql.stats import collect_stats
+            self.stats = collect_stats(self, scan=scan)
+        return self.stats
+
+    def table_modified(self, *tables:Union[TableName, TableExpr]) -> None:
+        """ Notify the writes into the tables by the connection
+            (The cached results of the tables are invalidated when the writes are committed
+            by `commit`, or at once in the autocommit mode, and the reads of the current
+            thread stick to the primary for a while)
+        """
+        if self.replica_router is not None:
+            self.replica_router.written()
+        names = [self.table(table).name for table in tables]
+        if self.connection is not None and getattr(self.connection, 'autocommit', False) is True:
+            self.tables_committed(*names)
+        else:
+            self.uncommitted_tables.update(names)
+
+    def tables_committed(self, *tables:Union[TableName, TableExpr]) -> None:
+        """ Notify the committed writes into the tables (the cached results of the tables are invalidated)
+            (Called after the commits of the other connections, such as the writers or the shards)
+        """
+        if self.result_cache is not None:
+            self.result_cache.bump(self.table(table).name for table in tables)
+
+    def stream(self,
+        query:Query,
+        values:Optional[Iterable] = None,
+        *,
+        batch_size:int = 1000,
+        raw:bool = False,
+    ) -> Iterator[List[Any]]:
+        """ Execute the query and yield the result rows in batches (with the unbuffered cursor) """
+        if self.connection is None:
+            raise RuntimeError('Database is not connected.')
+        with self.connection.operate(self, raw=raw) as op:
+            yield from op.fetch_batches(query, values, batch_size=batch_size)
+
+    def stream_read(self,
+        query:Query,
+        values:Optional[Iterable] = None,
+        *,
+        batch_size:int = 1000,
+        raw:bool = False,
+    ) -> Iterator[List[Any]]:
+        """ Execute the read query and yield the result rows in batches, on a replica
+            (See `connect_replicas`) or on the primary as `execute_read`
+        """
+        router = self.replica_router
+        if router is None or self.transaction_depth or router.sticky():
+            return self.stream(query, values, batch_size=batch_size, raw=raw)
+        return router.stream(self, query, values, batch_size=batch_size, raw=raw)
 
 
     ## ---- table creation methods ---- ##
@@ -1008,6 +1602,27 @@ class Database(SchemaExpr):
         self.table_dict[table.name] = table
 
 
+    def reflect(self,
+        *,
+        snapshot:Optional[Union[str, os.PathLike]] = None,
+        verify:bool = True,
+        table_names:Optional[Iterable[str]] = None,
+    ) -> List[Table]:
+        """ Prepare the tables read from the live schema (or the snapshot file)
+            (See `sql.reflect.reflect`)
+        """
+        from sql.reflect import reflect
+        return reflect(self, snapshot=snapshot, verify=verify, table_names=table_names)
+
+
+    def plan_migration(self, **options) -> 'MigrationPlan':
+        """ Plan the migration of the live schema into the declared tables
+            (See `sql.migrate.plan_migration`)
+        """
+        from sql.migrate import plan_migration
+        return plan_migration(self, **options)
+
+
     ### ---- table resolution methods ---- ####
 
     def resolve_references(self) -> None:
@@ -1018,25 +1633,93 @@ class Database(SchemaExpr):
         self.reference_resolved = True
         
 
-    def finalize_tables(self) -> None:
+    def finalize_tables(self, *, create:bool = False) -> None:
+        """ Resolve references in tables (and create the tables not existing on the database) """
         self.resolve_references()
-        # self.refresh_tables_priority()
-        # for table in self.sort_tables_by_priority(self.tables):
-        #     table.create_if_not_exists()
+        if create:
+            self.create_tables()
+
+    def create_tables(self, *, batch_size:int = 100) -> List[Table]:
+        """ Create the tables not existing on the database in the order of the links
+            (See `sql.deploy.create_tables`)
+        """
+        from sql.deploy import create_tables
+        return create_tables(self, batch_size=batch_size)
         
 
     ### ---- Database methods ---- ####
 
     def prepare_select(self, *args, **kwargs) -> 'Select':
+        from sql.select import Select
         return Select(self, *args, **kwargs)
 
     def select(self, *args, **kwargs) -> SQLExecResult:
         return self.prepare_select(*args, **kwargs).exec()
 
     def insert(self,
-        columns: List[Column],
-        vals_itr:Iterable[Iterable[ExprLike]],
-    ) -> Tuple[str, Iterable[Iterable[QueryExecValTypes]]]:
-        """ Insert records across tables """
-        # TODO: Implementation
-        pass
+        columns: Sequence[ColumnExpr],
+        vals_itr:Iterable[Iterable[Any]],
+    ) -> Dict[TableName, int]:
+        """ Insert records across tables
+            The columns are the columns of a table and the columns of the tables linked from it
+            (such as `Item.name`, `(Item >> Group)['name']` and `(Item >> Group >> Category)['name']`).
+            The values of each linked table are looked up (or inserted if not existing) from the
+            deepest linked tables, and their keys are set to the linking columns, and then the records
+            are inserted into the table, with the queries of a constant number per table.
+            A linked table is not linked (NULL) for the records whose values of it are all NULL.
+            Returns the numbers of the records inserted into the tables.
+        """
+        # The link paths (the names of the linking columns from the table) of the columns
+        # (The column objects are not hashable as the expressions)
+        paths:List[Tuple[Tuple[TableName, ColumnName], ...]] = []
+        linking_columns:Dict[Tuple[TableName, ColumnName], Tuple[Column, Column]] = {}
+        root:Optional[Table] = None
+        for column in columns:
+            connections = list(column.column_connections())
+            path = tuple((column_from.table.name, column_from.name) for column_from, _ in connections)
+            linking_columns.update(zip(path, connections))
+            table = connections[0][0].table if connections else column.entity().table
+            if root is None:
+                root = table
+            elif not root.is_same(table):
+                raise RuntimeError('Columns linked from the different tables are specified.')
+            paths.append(path)
+        if root is None:
+            raise RuntimeError('No columns are specified.')
+
+        records = [list(vals) for vals in vals_itr]
+        # The columns and the values of the (linked) tables of the paths
+        node_columns:Dict[Tuple[Tuple[TableName, ColumnName], ...], List[Column]] = {}
+        node_vals:Dict[Tuple[Tuple[TableName, ColumnName], ...], List[List[Any]]] = {}
+        for i, (column, path) in enumerate(zip(columns, paths)):
+            for n in range(len(path) + 1):
+                if path[:n] not in node_columns:
+                    node_columns[path[:n]] = []
+                    node_vals[path[:n]] = [[] for _ in records]
+            node_columns[path].append(column.entity())
+            for vals, record in zip(node_vals[path], records):
+                vals.append(record[i])
+
+        inserted:Dict[TableName, int] = {}
+        # The deepest linked tables first (the linked keys are needed for the linking tables)
+        for path in sorted(node_columns, key=len, reverse=True):
+            if not path:
+                continue
+            linking_column, key_column = linking_columns[path[-1]]
+            table = key_column.table
+            vals_to_key, n_inserted = table._select_keys_with_insertion(
+                key_column, node_columns[path],
+                (vals for vals in node_vals[path] if any(v is not None for v in vals)),
+            )
+            inserted[table.name] = inserted.get(table.name, 0) + n_inserted
+
+            parent_path = path[:-1]
+            if any(column is linking_column for column in node_columns[parent_path]):
+                raise RuntimeError('Column {} is specified with its linked columns.'.format(repr(linking_column)))
+            node_columns[parent_path].append(linking_column)
+            for vals, parent_vals in zip(node_vals[path], node_vals[parent_path]):
+                parent_vals.append(vals_to_key[tuple(vals)] if any(v is not None for v in vals) else None)
+
+        root.insert(node_columns[()], node_vals[()])
+        inserted[root.name] = inserted.get(root.name, 0) + len(records)
+        return inserted
@@ -0,0 +1,257 @@
+"""
+    sql.reflect - Table definitions read from the live database schema
+
+    The tables, the columns, the keys, the indexes and the foreign key links are read
+    from INFORMATION_SCHEMA in a few bulk queries (not a query per table), and can be saved
+    into a snapshot file (JSON). On the next startup, the snapshot is used if its checksum
+    matches the checksum of the live schema, which is calculated by the server in one query.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import datetime
+import json
+import logging
+import os
+import re
+from sql.datatypes import (
+    DataType, Char, VarChar, Binary, VarBinary,
+    TinyInt, SmallInt, MediumInt, Int, BigInt,
+    UnsignedTinyInt, UnsignedSmallInt, UnsignedMediumInt, UnsignedInt, UnsignedBigInt,
+    Float, Double, Real, DecimalOf,
+    TinyBlob, Blob, MediumBlob, LongBlob, TinyText, Text, MediumText, LongText,
+    Date, Time, DateTime,
+)
+from sql.expression import Expr, Query, Value
+from sql.objects import Column, Database, Index, Table, TableName
+from common.extype import ExType
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# The schema read from the database:
+#     {table name: {'columns': [...], 'primary': [...], 'indexes': [...], 'links': [...]}}
+Schema = Dict[str, Dict[str, Any]]
+
+_int_types:Dict[str, Tuple[DataType, DataType]] = {
+    'TINYINT'  : (TinyInt  , UnsignedTinyInt  ),
+    'SMALLINT' : (SmallInt , UnsignedSmallInt ),
+    'MEDIUMINT': (MediumInt, UnsignedMediumInt),
+    'INT'      : (Int      , UnsignedInt      ),
+    'INTEGER'  : (Int      , UnsignedInt      ),
+    'BIGINT'   : (BigInt   , UnsignedBigInt   ),
+}
+
+_length_types = {'CHAR': Char, 'VARCHAR': VarChar, 'BINARY': Binary, 'VARBINARY': VarBinary}
+
+_fixed_types:Dict[str, DataType] = {
+    datatype.dbtype: datatype for datatype in (
+        Float, Double, Real, DecimalOf(10, 0),
+        TinyBlob, Blob, MediumBlob, LongBlob, TinyText, Text, MediumText, LongText,
+        Date, Time, DateTime,
+    )
+}
+_fixed_types['TIMESTAMP'] = DataType('TIMESTAMP', ExType(datetime.datetime))
+_fixed_types['YEAR'] = DataType('YEAR', ExType(int))
+_fixed_types['NUMERIC'] = _fixed_types['DECIMAL']
+
+_column_type_re = re.compile(r'^(\w+)(?:\(([^)]*)\))?(.*)$')
+
+
+def parse_column_type(column_type:str) -> DataType:
+    """ Get the datatype of the column type of INFORMATION_SCHEMA (such as `int unsigned`)
+        The types not defined in `sql.datatypes` (such as ENUM and JSON) are kept
+        verbatim as the string types.
+    """
+    m = _column_type_re.match(column_type.strip())
+    if m is None:
+        return DataType(column_type, ExType(str))
+    name, params, rest = m.group(1).upper(), m.group(2), m.group(3).lower()
+
+    if name in _int_types:
+        # The display width (such as `int(11)`) is omitted
+        return _int_types[name][1 if 'unsigned' in rest else 0]
+    if name in _length_types and params is not None:
+        return _length_types[name](int(params))
+    if name in _fixed_types and (params is None or re.fullmatch(r'[\d, ]+', params)):
+        datatype = _fixed_types[name]
+        if params is None:
+            return datatype
+        return DataType(datatype.dbtype, datatype.pytype, [int(p) for p in params.split(',')])
+    return DataType(column_type, ExType(str))
+
+
+def schema_checksum(db:Database) -> str:
+    """ Get the checksum of the live schema (calculated by the server in a query) """
+    def part(table:str, fields:str, condition:str = '') -> Query:
+        return Query(
+            '(SELECT CONCAT(COUNT(*), \':\', COALESCE(SUM(CRC32(CONCAT_WS(\'|\',', fields, '))), 0))',
+            'FROM INFORMATION_SCHEMA.' + table, 'WHERE TABLE_SCHEMA = %s', condition, ')'
+        )
+    rows = db.execute(Query('SELECT', [
+        part('COLUMNS', 'TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA'),
+        part('STATISTICS', 'TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE, SUB_PART'),
+        part('KEY_COLUMN_USAGE', 'TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME',
+            'AND REFERENCED_TABLE_NAME IS NOT NULL'),
+    ]), [db.name] * 3)
+    return '/'.join(map(str, rows[0]))
+
+
+def read_schema(db:Database) -> Schema:
+    """ Read the schema of the base tables from INFORMATION_SCHEMA (in 3 queries) """
+    schema:Schema = {}
+    for table_name, column_name, column_type, is_nullable, default, extra in db.execute(Query(
+        'SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA',
+        'FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN (',
+        'SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES',
+        'WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = \'BASE TABLE\'',
+        ') ORDER BY TABLE_NAME, ORDINAL_POSITION'
+    ), [db.name, db.name]):
+        table = schema.setdefault(table_name, {'columns': [], 'primary': [], 'indexes': [], 'links': []})
+        extra = (extra or '').lower()
+        table['columns'].append({
+            'name': column_name,
+            'type': column_type,
+            'nullable': is_nullable == 'YES',
+            'default': default,
+            # The expression default (such as CURRENT_TIMESTAMP), not a literal
+            'default_generated': 'default_generated' in extra or (
+                default is not None and default.upper().startswith('CURRENT_TIMESTAMP')),
+            'auto_increment': 'auto_increment' in extra,
+        })
+
+    for table_name, index_name, column_name, non_unique, sub_part in db.execute(Query(
+        'SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, NON_UNIQUE, SUB_PART',
+        'FROM INFORMATION_SCHEMA.STATISTICS WHERE TABLE_SCHEMA = %s',
+        'ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX'
+    ), [db.name]):
+        if table_name not in schema:
+            continue
+        table = schema[table_name]
+        if index_name == 'PRIMARY':
+            table['primary'].append(column_name)
+            continue
+        if not table['indexes'] or table['indexes'][-1]['name'] != index_name:
+            table['indexes'].append({'name': index_name, 'unique': not int(non_unique), 'columns': []})
+        # The functional index parts (without the column name) are kept as None
+        table['indexes'][-1]['columns'].append(
+            [column_name, int(sub_part) if sub_part is not None else None]
+            if column_name is not None else None)
+
+    for table_name, column_name, ref_table_name, ref_column_name in db.execute(Query(
+        'SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME',
+        'FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE',
+        'WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_SCHEMA = %s',
+        'ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION'
+    ), [db.name, db.name]):
+        if table_name in schema:
+            schema[table_name]['links'].append([column_name, ref_table_name, ref_column_name])
+
+    return schema
+
+
+def save_snapshot(path:Union[str, os.PathLike], db:Database, schema:Schema, checksum:str) -> None:
+    """ Save the schema into the snapshot file (replaced atomically) """
+    tmp_path = os.fspath(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'version': SNAPSHOT_VERSION, 'database': db.name, 'checksum': checksum, 'tables': schema,
+        }, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path:Union[str, os.PathLike], db:Database) -> Optional[Tuple[Schema, str]]:
+    """ Load the schema and the checksum from the snapshot file
+        (None if not found, or saved by another version or for another database)
+    """
+    try:
+        with open(path, 'r') as f:
+            obj = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if obj.get('version') != SNAPSHOT_VERSION or obj.get('database') != db.name:
+        return None
+    return obj['tables'], obj['checksum']
+
+
+def _column(spec:Dict[str, Any], is_primary:bool, is_unique:bool) -> Column:
+    default:Optional[Expr] = None
+    if spec['default'] is not None:
+        default = Query(spec['default']) if spec['default_generated'] else Value(spec['default'])
+    return Column(
+        spec['name'], parse_column_type(spec['type']),
+        nullable=spec['nullable'],
+        default=default,
+        is_unique=is_unique,
+        is_primary=is_primary,
+        auto_increment=spec['auto_increment'] or None,
+        index=False, # All indexes are declared by `Index` as they are
+    )
+
+
+def build_tables(db:Database, schema:Schema, table_names:Optional[Iterable[str]] = None) -> List[Table]:
+    """ Prepare the tables of the schema in the database (all tables by default)
+        The tables already declared in the database are kept, and the tables without
+        a single-column primary key are skipped (not supported by `Table`).
+    """
+    names = list(schema) if table_names is None else [name for name in table_names if name in schema]
+    tables:List[Table] = []
+    for name in names:
+        if db.table_exists(name):
+            continue
+        spec = schema[name]
+        if len(spec['primary']) != 1:
+            logger.warning('Table `%s` is skipped: not a single-column primary key.', name)
+            continue
+
+        unique_columns = set()
+        indexes:List[Index] = []
+        for index_spec in spec['indexes']:
+            if None in index_spec['columns']:
+                logger.warning('Index `%s` of table `%s` is skipped: functional key part.', index_spec['name'], name)
+                continue
+            parts = [tuple(part) for part in index_spec['columns']]
+            if index_spec['unique'] and len(parts) == 1 and parts[0][1] is None:
+                unique_columns.add(parts[0][0])
+                continue
+            indexes.append(Index(*parts, name=index_spec['name'], unique=index_spec['unique']))
+
+        columns = [
+            _column(column_spec, column_spec['name'] == spec['primary'][0], column_spec['name'] in unique_columns)
+            for column_spec in spec['columns']
+        ]
+        tables.append(Table(db, TableName(name), columns, indexes=indexes))
+
+    # The links are set after all tables are prepared (the links between them in any order)
+    for table in tables:
+        for column_name, ref_table_name, ref_column_name in schema[table.name]['links']:
+            if db.table_exists(ref_table_name):
+                ref_table = db.table(ref_table_name)
+                if ref_table.column_exists(ref_column_name):
+                    table.column_by_name(column_name).links.append(ref_table.column_by_name(ref_column_name))
+    return tables
+
+
+def reflect(
+    db:Database,
+    *,
+    snapshot:Optional[Union[str, os.PathLike]] = None,
+    verify:bool = True,
+    table_names:Optional[Iterable[str]] = None,
+) -> List[Table]:
+    """ Prepare the tables read from the live schema (or the snapshot file)
+        If `snapshot` is given, the schema is loaded from it if its checksum matches the live
+        schema (or without the check if `verify` is False), and otherwise it is read from
+        INFORMATION_SCHEMA and saved into the file.
+    """
+    loaded = load_snapshot(snapshot, db) if snapshot is not None else None
+    if loaded is not None and not verify:
+        return build_tables(db, loaded[0], table_names)
+
+    checksum = schema_checksum(db) # Before reading, not to save a newer schema with an older checksum
+    if loaded is not None and loaded[1] == checksum:
+        schema = loaded[0]
+    else:
+        schema = read_schema(db)
+        if snapshot is not None:
+            save_snapshot(snapshot, db, schema, checksum)
+    return build_tables(db, schema, table_names)
@@ -0,0 +1,310 @@
+"""
+    sql.resultcache - Persistent result cache shared by the processes on the host
+
+    The results are stored in the columnar format (`common.tablefile`) with the
+    versions of the tables which they are read from. A version of a table is a random
+    token replaced on every committed write into the table (`Database.tables_committed`,
+    called by `Database.commit` for the writes notified by `Database.table_modified`), and the
+    results are valid only while the versions are unchanged, so that all processes
+    sharing the cache see the writes of each other.
+    Only the writes by the table objects (`insert`, `update`, `delete`...) are notified:
+    the writes by the raw queries of `Database.execute` are not detected, and must be
+    notified by `Database.table_modified` (else the cached results of the tables stay
+    valid until they are evicted).
+    The cache is bounded by `max_bytes`, and the least recently used results are evicted.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union
+from abc import abstractmethod
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from common import tablefile
+from common.tablelib import Table
+
+# Versions of the tables (the table name to the version token)
+TableVersions = Dict[str, str]
+
+_entry_header = struct.Struct('<I')
+
+
+def fingerprint(query_text:str, params:Optional[Sequence[Any]] = None) -> str:
+    """ Get the key of the result of the query and the parameters """
+    h = hashlib.sha256(query_text.encode())
+    if params is not None:
+        h.update(b'\0')
+        h.update(json.dumps(list(params), default=repr, separators=(',', ':')).encode())
+    return h.hexdigest()
+
+
+def _encode_entry(table:Table, versions:TableVersions, types:Optional[Sequence[Optional[Type]]]) -> bytes:
+    meta = json.dumps(versions, separators=(',', ':')).encode()
+    return _entry_header.pack(len(meta)) + meta + tablefile.dumps(table, types=types)
+
+
+def _decode_entry(data:bytes) -> Tuple[TableVersions, memoryview]:
+    (meta_len,) = _entry_header.unpack_from(data)
+    meta_end = _entry_header.size + meta_len
+    return json.loads(bytes(data[_entry_header.size:meta_end])), memoryview(data)[meta_end:]
+
+
+class ResultCache:
+    """ Base class of the persistent result caches """
+
+    def __init__(self, max_bytes:int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def versions(self, table_names:Iterable[str]) -> TableVersions:
+        """ Get the current versions of the tables """
+
+    @abstractmethod
+    def bump(self, table_names:Iterable[str]) -> None:
+        """ Renew the versions of the tables (invalidates the results read from them) """
+
+    @abstractmethod
+    def _read(self, key:str) -> Optional[bytes]:
+        """ Read the entry (and mark it as recently used) """
+
+    @abstractmethod
+    def _write(self, key:str, data:bytes) -> None:
+        """ Write the entry atomically, and evict the old entries if over the size """
+
+    @abstractmethod
+    def _remove(self, key:str) -> None:
+        """ Remove the entry """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """ Remove all entries """
+
+    def get(self, key:str, column_names:Optional[Sequence[str]] = None) -> Optional[Table]:
+        """ Get the cached result if the versions of its tables are unchanged """
+        data = self._read(key)
+        if data is not None:
+            try:
+                versions, body = _decode_entry(data)
+                if versions == self.versions(versions):
+                    self.hits += 1
+                    return tablefile.loads(body, column_names)
+            except (RuntimeError, ValueError, struct.error):
+                pass # Broken entry
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def put(self,
+        key:str,
+        table:Table,
+        versions:TableVersions,
+        *,
+        types:Optional[Sequence[Optional[Type]]] = None,
+    ) -> None:
+        """ Store the result with the versions of its tables
+            (The versions must be taken before reading the result, not to store a stale result
+            as the latest one when the tables are written in the meantime)
+        """
+        self._write(key, _encode_entry(table, versions, types))
+
+
+class DirectoryCache(ResultCache):
+    """ Result cache in a directory (an entry per file, written by the atomic rename) """
+
+    def __init__(self, path:Union[str, os.PathLike], max_bytes:int = 1 << 30, *, evict_interval:int = 64) -> None:
+        super().__init__(max_bytes)
+        self.path = os.fspath(path)
+        self.evict_interval = evict_interval
+        self._writes = 0
+        os.makedirs(os.path.join(self.path, 'versions'), exist_ok=True)
+        os.makedirs(os.path.join(self.path, 'entries'), exist_ok=True)
+
+    def _entry_path(self, key:str) -> str:
+        return os.path.join(self.path, 'entries', key[:2], key)
+
+    def _version_path(self, table_name:str) -> str:
+        return os.path.join(self.path, 'versions', table_name.encode().hex())
+
+    @staticmethod
+    def _atomic_write(path:str, data:bytes) -> None:
+        """ Write the file by renaming the fully written temporary file (never seen partially) """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def versions(self, table_names:Iterable[str]) -> TableVersions:
+        versions:TableVersions = {}
+        for name in table_names:
+            try:
+                with open(self._version_path(name), 'r') as f:
+                    versions[name] = f.read()
+            except FileNotFoundError:
+                versions[name] = ''
+        return versions
+
+    def bump(self, table_names:Iterable[str]) -> None:
+        for name in table_names:
+            self._atomic_write(self._version_path(name), uuid.uuid4().hex.encode())
+
+    def _read(self, key:str) -> Optional[bytes]:
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path) # The modification time is used as the last used time
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key:str, data:bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        self._atomic_write(self._entry_path(key), data)
+        self._writes += 1
+        if self._writes >= self.evict_interval:
+            self._writes = 0
+            self.evict()
+
+    def _remove(self, key:str) -> None:
+        try:
+            os.unlink(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self) -> List[os.DirEntry]:
+        entries = []
+        root = os.path.join(self.path, 'entries')
+        for sub in os.scandir(root):
+            if sub.is_dir():
+                entries.extend(e for e in os.scandir(sub.path) if not e.name.startswith('.tmp-'))
+        return entries
+
+    def evict(self) -> None:
+        """ Remove the least recently used entries until the total size is within `max_bytes` """
+        stats = []
+        for entry in self._entries():
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            stats.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in stats)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(stats):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+class SQLiteCache(ResultCache):
+    """ Result cache in a SQLite file (the entries are written in the transactions) """
+
+    def __init__(self, path:Union[str, os.PathLike], max_bytes:int = 1 << 30, *, timeout:float = 10.0) -> None:
+        super().__init__(max_bytes)
+        self.path = os.fspath(path)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._con:Optional[sqlite3.Connection] = None
+        self._pid:Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Get the connection (reconnected in the forked worker processes) """
+        if self._con is None or self._pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, data BLOB, size INTEGER, used REAL)')
+            con.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+            con.execute('CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version TEXT)')
+            self._con, self._pid = con, os.getpid()
+        return self._con
+
+    def versions(self, table_names:Iterable[str]) -> TableVersions:
+        names = list(table_names)
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT name, version FROM versions WHERE name IN ({})'.format(','.join('?' * len(names))),
+                names,
+            ).fetchall() if names else []
+        found = dict(rows)
+        return {name: found.get(name, '') for name in names}
+
+    def bump(self, table_names:Iterable[str]) -> None:
+        with self._lock:
+            self._connection().executemany(
+                'INSERT OR REPLACE INTO versions (name, version) VALUES (?, ?)',
+                [(name, uuid.uuid4().hex) for name in table_names],
+            )
+
+    def _read(self, key:str) -> Optional[bytes]:
+        with self._lock:
+            con = self._connection()
+            row = con.execute('SELECT data FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            con.execute('UPDATE entries SET used = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def _write(self, key:str, data:bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            con = self._connection()
+            con.execute('BEGIN IMMEDIATE')
+            try:
+                con.execute(
+                    'INSERT OR REPLACE INTO entries (key, data, size, used) VALUES (?, ?, ?, ?)',
+                    (key, data, len(data), time.time()),
+                )
+                (total,) = con.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()
+                if total > self.max_bytes:
+                    self._evict(con, total - self.max_bytes)
+                con.execute('COMMIT')
+            except BaseException:
+                con.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _evict(con:sqlite3.Connection, excess:int) -> None:
+        """ Remove the least recently used entries of the total size over `excess` """
+        keys = []
+        for key, size in con.execute('SELECT key, size FROM entries ORDER BY used'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        con.executemany('DELETE FROM entries WHERE key = ?', keys)
+
+    def _remove(self, key:str) -> None:
+        with self._lock:
+            self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute('DELETE FROM entries')
@@ -0,0 +1,258 @@
+"""
+    sql.routing - Read/write splitting to the replicas
+
+    The selects are executed on the replicas (`Database.execute_read`, and the streamed reads
+    such as the exports by `Database.stream_read`) and the other queries
+    on the primary (`Database.execute`). A replica is chosen by the least outstanding queries
+    among the replicas whose replication lag (measured every `lag_check_interval` seconds)
+    is within `max_lag`, and the primary is used if no replica is available.
+    After a write, the reads of the same thread go to the primary for `sticky_seconds`
+    (read-your-writes), and the reads in a transaction always go to the primary.
+    The idle connections are pinged on the checkout (if idle for `ping_idle_seconds`) and
+    reconnected if lost, and a replica failing to connect or losing the connection in a
+    read is not used for `down_seconds` (the read is retried on the others or the primary).
+"""
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+import logging
+import math
+import random
+import threading
+import time
+from sql.executor import Connection, Connector, is_connection_error
+from sql.expression import Query
+from sql.objects import Database
+
+logger = logging.getLogger(__name__)
+
+# Measurer of the replication lag (seconds) of the connection, None if not replicating
+LagMeasurer = Callable[[Database, Connection], Optional[float]]
+
+# Checker of the connection alive (raises the error if lost)
+Pinger = Callable[[Connection], Any]
+
+
+def ping_connection(connection:Connection) -> None:
+    """ Ping the server without reconnecting (raises the error if the connection is lost) """
+    connection.ping(reconnect=False)
+
+
+def replica_status_lag(db:Database, connection:Connection) -> Optional[float]:
+    """ Measure the lag by `SHOW REPLICA STATUS` (MySQL 8.0.22 or later)
+        (0 if the server is not a replica, and None if the replication is stopped)
+    """
+    with connection.operate(db) as op:
+        rows = op.execute(Query('SHOW REPLICA STATUS'))
+        column_names = list(op.column_names)
+    if not rows:
+        return 0.0
+    seconds = rows[0][column_names.index('Seconds_Behind_Source')]
+    return float(seconds) if seconds is not None else None
+
+
+class Replica:
+    """ A replica with its idle connections """
+
+    def __init__(self, connector:Connector, name:str) -> None:
+        self.connector = connector
+        self.name = name
+        self.outstanding = 0 # Queries in execution
+        self.lag:float = 0.0 # The last measured lag (inf if not replicating)
+        self.lag_checked_at = -math.inf
+        self.down_until = -math.inf # Not used until then after failing to connect
+        self._idle:List[Tuple[Connection, float]] = [] # With the time released
+
+    def __repr__(self) -> str:
+        return 'Replica({}, outstanding={}, lag={})'.format(self.name, self.outstanding, self.lag)
+
+
+class ReplicaRouter:
+    """ Router of the reads to the replicas (thread-safe) """
+
+    def __init__(self,
+        connectors:Iterable[Connector],
+        *,
+        max_lag:float = 1.0,
+        lag_check_interval:float = 5.0,
+        sticky_seconds:float = 5.0,
+        down_seconds:float = 30.0,
+        measure_lag:LagMeasurer = replica_status_lag,
+        ping:Pinger = ping_connection,
+        ping_idle_seconds:float = 1.0,
+    ) -> None:
+        self.replicas = [Replica(connector, 'replica{}'.format(i)) for i, connector in enumerate(connectors)]
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.sticky_seconds = sticky_seconds
+        self.down_seconds = down_seconds
+        self.measure_lag = measure_lag
+        self.ping = ping
+        self.ping_idle_seconds = ping_idle_seconds
+        self.reads = 0 # Reads routed to the replicas
+        self.primary_reads = 0 # Reads routed to the primary
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def written(self) -> None:
+        """ Notify a write by the current thread (the reads stick to the primary for a while) """
+        self._local.written_at = time.monotonic()
+
+    def sticky(self) -> bool:
+        """ Check if the reads of the current thread should go to the primary (after a write) """
+        written_at = getattr(self._local, 'written_at', None)
+        return written_at is not None and time.monotonic() - written_at < self.sticky_seconds
+
+    def _candidates(self, now:float) -> List[Replica]:
+        return [
+            replica for replica in self.replicas
+            if replica.down_until <= now and (
+                replica.lag <= self.max_lag or now - replica.lag_checked_at >= self.lag_check_interval)
+        ]
+
+    def _acquire(self, db:Database) -> Optional[Tuple[Replica, Connection]]:
+        """ Choose the replica of the least outstanding queries (with a connection of it)
+            (A replica is tried once, not to measure the lag of the lagging one repeatedly)
+        """
+        tried:List[Replica] = []
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                candidates = [replica for replica in self._candidates(now) if replica not in tried]
+                if not candidates:
+                    return None
+                least = min(replica.outstanding for replica in candidates)
+                replica = random.choice([replica for replica in candidates if replica.outstanding == least])
+                replica.outstanding += 1
+                idle = replica._idle.pop() if replica._idle else None
+            tried.append(replica)
+
+            connection:Optional[Connection] = None
+            try:
+                if idle is not None:
+                    connection = self._checked(*idle, now)
+                if connection is None:
+                    connection = replica.connector.connect()
+                if now - replica.lag_checked_at >= self.lag_check_interval:
+                    lag = self.measure_lag(db, connection)
+                    replica.lag = lag if lag is not None else math.inf
+                    replica.lag_checked_at = now
+            except Exception as e:
+                if connection is not None:
+                    self._discard(connection)
+                self._down(replica, e)
+                continue
+
+            if replica.lag > self.max_lag:
+                self._release(replica, connection)
+                continue
+            return replica, connection
+
+    def _checked(self, connection:Connection, released_at:float, now:float) -> Optional[Connection]:
+        """ Check the idle connection alive (None if lost, to reconnect) """
+        if now - released_at < self.ping_idle_seconds:
+            return connection
+        try:
+            self.ping(connection)
+            return connection
+        except Exception as e:
+            logger.info('Idle connection is lost: %s', e)
+            self._discard(connection)
+            return None
+
+    @staticmethod
+    def _discard(connection:Connection) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass # (Already lost)
+
+    def _down(self, replica:Replica, e:BaseException) -> None:
+        """ Stop using the replica for `down_seconds` (after its query is finished) """
+        logger.warning('Replica %s is not available: %s', replica.name, e)
+        with self._lock:
+            replica.outstanding -= 1
+            replica.down_until = time.monotonic() + self.down_seconds
+
+    def _release(self, replica:Replica, connection:Connection) -> None:
+        with self._lock:
+            replica.outstanding -= 1
+            replica._idle.append((connection, time.monotonic()))
+
+    def execute(self,
+        db:Database,
+        query:Query,
+        values:Optional[Iterable] = None,
+        *,
+        raw:bool = False,
+    ) -> List[Any]:
+        """ Execute the read query on a replica (or on the primary if no replica is available)
+            If the connection to the replica is lost, the query is retried on the others.
+        """
+        while True:
+            acquired = self._acquire(db)
+            if acquired is None:
+                self.primary_reads += 1
+                return db.execute(query, values, raw=raw)
+            replica, connection = acquired
+            try:
+                with connection.operate(db, raw=raw) as op:
+                    rows = op.execute(query, values)
+            except BaseException as e:
+                self._discard(connection)
+                if is_connection_error(e):
+                    self._down(replica, e)
+                    continue
+                with self._lock:
+                    replica.outstanding -= 1
+                raise
+            self._release(replica, connection)
+            self.reads += 1
+            return rows
+
+    def stream(self,
+        db:Database,
+        query:Query,
+        values:Optional[Iterable] = None,
+        *,
+        batch_size:int = 1000,
+        raw:bool = False,
+    ) -> Iterator[List[Any]]:
+        """ Execute the read query on a replica (or on the primary if no replica is available)
+            and yield the result rows in batches
+            If the connection to the replica is lost before the first batch, the query is retried
+            on the others (not after, as the rows are already yielded).
+        """
+        while True:
+            acquired = self._acquire(db)
+            if acquired is None:
+                self.primary_reads += 1
+                yield from db.stream(query, values, batch_size=batch_size, raw=raw)
+                return
+            replica, connection = acquired
+            started = False
+            try:
+                with connection.operate(db, raw=raw) as op:
+                    for rows in op.fetch_batches(query, values, batch_size=batch_size):
+                        started = True
+                        yield rows
+            except BaseException as e:
+                # (Also when the stream is not read to the end, with the unread rows on the connection)
+                self._discard(connection)
+                if is_connection_error(e):
+                    self._down(replica, e)
+                    if not started:
+                        continue
+                else:
+                    with self._lock:
+                        replica.outstanding -= 1
+                raise
+            self._release(replica, connection)
+            self.reads += 1
+            return
+
+    def close(self) -> None:
+        """ Close the idle connections of the replicas """
+        with self._lock:
+            for replica in self.replicas:
+                for connection, _ in replica._idle:
+                    connection.close()
+                replica._idle.clear()
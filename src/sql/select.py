@@ -1,6 +1,10 @@
-from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
-from sql.expression import Expr, ExprLike, Query, to_expr
+from typing import Any, BinaryIO, Collection, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+import time
+from sql.expression import AliasedExpr, Expr, ExprLike, Query, is_same, to_expr
 from sql.objects import ColumnExpr, Column, ColumnInAliasedTable, Database, TableName
+from sql.datatypes import DataType
+from sql.decoding import RowDecoder
+from common.tablelib import RecordBase, Table, record_class
 
 class Select:
     """ The data object for the sql SELECT query """
@@ -29,6 +33,9 @@ class Select:
         self.count : Optional[int] = count
         self.offset: Optional[int] = offset
 
+        self._record_class: Optional[Type[RecordBase]] = None
+        self._row_decoders: Dict[Tuple[str, ...], RowDecoder] = {}
+
     def sql_query(self) -> Query:
         """ Generate the sql SELECT query """
         return Query(
@@ -45,11 +52,167 @@ class Select:
             self._optional_query('OFFSET', self.offset),
         )
 
-    def exec(self):
-        self.result = self.db.exec(self.sql_query())
+    def column_names(self) -> List[str]:
+        """ Get the names of the result columns
+            (The dotted link-path name for columns, such as `Item.group.name`)
+        """
+        return [self.column_name(expr) for expr in self.column_exprs]
+
+    @staticmethod
+    def column_name(expr:Expr) -> str:
+        """ Get the name of the result column of the given expression """
+        if isinstance(expr, ColumnExpr):
+            return expr.path_name()
+        if isinstance(expr, AliasedExpr):
+            return expr.alias_name
+        return expr.__sql__().query_text()
+
+    def record_class(self) -> Type[RecordBase]:
+        """ Get the record class for the result rows of this select (generated once) """
+        if self._record_class is None:
+            self._record_class = record_class(self.column_names())
+        return self._record_class
+
+    def column_datatypes(self) -> List[Optional[DataType]]:
+        """ Get the datatypes of the result columns (None for the non-column expressions) """
+        return [
+            expr.entity().datatype
+            if isinstance(expr, ColumnExpr) and isinstance(expr.entity().datatype, DataType) else None
+            for expr in self.column_exprs
+        ]
+
+    def row_decoder(self, passthrough:Collection[str] = ()) -> Optional[RowDecoder]:
+        """ Get the decoder of the raw result rows (generated once per passthrough columns)
+            Returns None if the datatype of any result column is unknown.
+        """
+        key = tuple(sorted(passthrough))
+        if key not in self._row_decoders:
+            datatypes = self.column_datatypes()
+            if any(datatype is None for datatype in datatypes):
+                return None
+            column_names = self.column_names()
+            for name in key:
+                if name not in column_names:
+                    raise RuntimeError('Column `{}` not found in the select.'.format(name))
+            self._row_decoders[key] = RowDecoder(datatypes, {column_names.index(name) for name in key})
+        return self._row_decoders[key]
+
+    def _raw_decoder(self, decode:bool, passthrough:Collection[str]) -> Optional[RowDecoder]:
+        """ Get the decoder if the raw values should be fetched and decoded by pytorm """
+        if not decode or self.db.binary_protocol():
+            return None
+        return self.row_decoder(passthrough)
+
+    def table_names(self) -> List[str]:
+        """ Get the names of the tables read by this select """
+        names:Dict[str, None] = {}
+        for column_expr in self.extract_column_exprs(self.all_exprs()):
+            names[column_expr.entity().table.name] = None
+            for column_from, column_to in column_expr.column_connections():
+                names[column_from.table.name] = None
+                names[column_to.table.name] = None
+        return list(names)
+
+    def exec(self, *, decode:bool = False, passthrough:Collection[str] = (), cache:bool = False) -> 'Select':
+        """ Execute the select and keep the result records
+            If `decode` is True, the raw values are fetched and decoded by the decoders
+            of the column datatypes, except the `passthrough` columns (kept as the raw values).
+            If `cache` is True, the result is got from / stored into `db.result_cache`
+            (except while the tables have the uncommitted writes of this database).
+            The result to be cached is read from the primary, not from a replica
+            (the rows of a lagging replica would be cached as the current versions).
+        """
+        engine = self.db.memory_engine
+        if engine is not None and engine.covers(self):
+            self.result = list(engine.execute(self))
+            return self
+
+        result_cache = self.db.result_cache if cache else None
+        if result_cache is not None and self.db.uncommitted_tables.intersection(self.table_names()):
+            result_cache = None # (The uncommitted writes are not visible to the others)
+        if result_cache is not None:
+            from sql.resultcache import fingerprint
+            key = fingerprint(self.sql_query().query_text(), [self.db.name, decode, sorted(passthrough)])
+            cached = result_cache.get(key)
+            if cached is not None:
+                self.result = list(map(self.record_class(), cached.rows))
+                return self
+            versions = result_cache.versions(self.table_names())
+
+        primary = result_cache is not None
+        decoder = self._raw_decoder(decode, passthrough)
+        if decoder is not None:
+            rows = self._execute(raw=True, primary=primary)
+            self.result = decoder.decode_records(rows, self.record_class())
+        else:
+            self.result = list(map(self.record_class(), self._execute(primary=primary)))
+
+        if result_cache is not None:
+            result_cache.put(key, Table(self.column_names(), self.result), versions, types=[
+                datatype.pytype.basetype if datatype is not None else None
+                for datatype in self.column_datatypes()
+            ])
+        return self
 
-    def __iter__(self):
-        return self.result
+    def _execute(self, *, raw:bool = False, primary:bool = False) -> List[Any]:
+        """ Execute the query (and explain it if slower than `db.slow_query_seconds`,
+            and record it into `db.workload`)
+            The query is executed on the primary if `primary` is True, else by `db.execute_read`.
+        """
+        execute = self.db.execute if primary else self.db.execute_read
+        if self.db.slow_query_seconds is None and self.db.workload is None:
+            return execute(self.sql_query(), raw=raw)
+        start = time.perf_counter()
+        rows = execute(self.sql_query(), raw=raw)
+        seconds = time.perf_counter() - start
+        if self.db.workload is not None:
+            self.db.workload.record(self, seconds)
+        if self.db.slow_query_seconds is not None and seconds >= self.db.slow_query_seconds:
+            from sql.explain import report_slow_select
+            report_slow_select(self, seconds)
+        return rows
+
+    def fetch_columns(self, *, decode:bool = False, passthrough:Collection[str] = ()) -> Dict[str, List[Any]]:
+        """ Execute the select and get the columnar result (the column name to the values)
+            (See `exec` for the options)
+        """
+        engine = self.db.memory_engine
+        if engine is not None and engine.covers(self):
+            return engine.execute(self).to_columns()
+
+        decoder = self._raw_decoder(decode, passthrough)
+        if decoder is not None:
+            columns = decoder.decode_columns(self._execute(raw=True))
+        else:
+            rows = self._execute()
+            columns = [list(vals) for vals in zip(*rows)] if rows else [[] for _ in self.column_exprs]
+        return dict(zip(self.column_names(), columns))
+
+    def export(self, fp:BinaryIO, format:str = 'csv', **options) -> 'ExportResult':
+        """ Stream the result into the binary file object in CSV, TSV or NDJSON
+            (See `sql.export.export` for the options)
+        """
+        from sql.export import export
+        return export(self, fp, format, **options)
+
+    def explain(self, *, analyze:bool = False) -> 'Plan':
+        """ Get the plan of this select by `EXPLAIN FORMAT=JSON` (or `EXPLAIN ANALYZE`,
+            which executes the query), with the issues (full scans, filesorts, temporary
+            tables and joins without index) linked to the columns and tables of this select
+        """
+        from sql.explain import explain
+        return explain(self, analyze=analyze)
+
+    def estimate(self, *, ttl:Optional[float] = None) -> 'Estimate':
+        """ Estimate the result cardinality by the table statistics (without executing)
+            and flag the likely full scans and join explosions
+            (The statistics are collected by `db.collect_stats(ttl=ttl)`)
+        """
+        from sql.stats import estimate
+        return estimate(self, self.db.collect_stats(ttl=ttl))
+
+    def __iter__(self) -> Iterator[RecordBase]:
+        return iter(self.result)
 
     def next_block(self):
         self.offset += self.count
@@ -82,7 +245,9 @@ class Select:
     ) -> Iterator[ColumnExpr]:
         """ Extract column schema expressions in the given expressions """
         for expr in exprs:
-            yield from expr.extract_exprs()
+            for _expr in expr.extract_exprs():
+                if isinstance(_expr, ColumnExpr):
+                    yield _expr
 
 
     def all_exprs(self) -> Iterator[Expr]:
@@ -98,8 +263,8 @@ class Select:
             yield from (order_expr[0] for order_expr in self.order_exprs)
 
 
-    def tables_query(self) -> Query:
-        """ Generate the table-part of the sql query """
+    def table_joins(self) -> Dict[TableName, List[Tuple[Column, Column]]]:
+        """ Get the root tables of the select and their joins (the connected column pairs) """
 
         all_exprs = list(self.all_exprs())
         all_column_exprs = list(self.extract_column_exprs(all_exprs))
@@ -113,6 +278,7 @@ class Select:
             # print('column_cons:', column_cons)
 
             if not column_cons:
+                tables_column_connections.setdefault(column_expr.entity().table.name, [])
                 continue
             
             c_table = column_cons[0][0].table 
@@ -122,19 +288,24 @@ class Select:
             
             c_cons = tables_column_connections[c_table.name]
             for new_con in column_cons:
-                if all(
+                if not any(
                         (is_same(new_con[0], _con[0]) and is_same(new_con[1], _con[1]))
                         for _con in c_cons
                     ):
                     # print('add', column_con)
                     c_cons.append(new_con)
 
+        return tables_column_connections
+
+
+    def tables_query(self) -> Query:
+        """ Generate the table-part of the sql query """
 
         tables_joins:List[Query] = []
 
-        for table_name, column_connections in tables_column_connections.items():
+        for table_name, column_connections in self.table_joins().items():
 
-            c_query = Query(self.db.table(table_name))
+            c_queries:List[Query] = [Query(self.db.table(table_name))]
 
             for column_from, column_to in column_connections:
 
@@ -143,11 +314,11 @@ class Select:
                 else:
                     c_table_query = Query(column_to.table)
 
-                c_query += Query(
+                c_queries.append(Query(
                     'INNER JOIN', c_table_query,
                     'ON', column_from, '=', column_to
-                )
+                ))
                 
-            tables_joins.append(c_query)
+            tables_joins.append(Query(*c_queries))
 
         return Query(tables_joins)
@@ -0,0 +1,447 @@
+"""
+    sql.sharding - Horizontal sharding of a table by a column across the databases
+
+    The rows of a sharded table are distributed to the shards (a connector per shard) by
+    the shard function of the shard column (`HashSharding` or `RangeSharding`).
+    The statements whose conditions fix the shard column (`=`, `IN`, and the ranges for
+    `RangeSharding`) go to the shards of the values only, and the others are scattered
+    to all shards in parallel and gathered: the ordered results are merged by the order
+    of the select, and the limits are applied after the merge.
+    The bulk insertions are partitioned per shard (the shard column must be given).
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, TypeVar, Union
+from abc import abstractmethod
+import bisect
+import re
+import concurrent.futures
+import copy
+import functools
+import heapq
+import itertools
+import threading
+import zlib
+from sql.datatypes import DataType
+from sql.executor import Connection, Connector, Operation
+from sql.expression import Expr, ExprLike, OpExpr, Query, Value, Values, is_same, to_expr
+from sql.objects import Column, ColumnExpr, ColumnName, Table
+from sql.select import Select
+
+T = TypeVar('T')
+
+_and_ops = {'&', '&&', 'AND'}
+_or_ops = {'|', '||', 'OR'}
+# The range operators with the column on the left, and their reversed ones
+_range_ops = {'<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+# The aggregations and DISTINCT in the result columns (not merged across the shards)
+_aggregation_pattern = re.compile(
+    r'\bDISTINCT(ROW)?\b|\b(COUNT|SUM|AVG|MIN|MAX|GROUP_CONCAT|BIT_AND|BIT_OR|BIT_XOR|STD|STDDEV'
+    r'|STDDEV_POP|STDDEV_SAMP|VARIANCE|VAR_POP|VAR_SAMP|JSON_ARRAYAGG|JSON_OBJECTAGG)\s*\(',
+    re.IGNORECASE)
+
+
+class ShardFunction:
+    """ Function of the shard column values to the shards (0 to `shards - 1`) """
+
+    def __init__(self, shards:int) -> None:
+        if shards < 1:
+            raise RuntimeError('No shards are specified.')
+        self.shards = shards
+
+    @abstractmethod
+    def shard_of(self, value:Any) -> int:
+        """ Get the shard of the value """
+
+    def shards_in_range(self, lower:Any, upper:Any) -> Set[int]:
+        """ Get the shards of the values between `lower` and `upper` (inclusive, None for unbounded) """
+        return set(range(self.shards))
+
+
+class HashSharding(ShardFunction):
+    """ Sharding by the hash of the values (CRC32 of the text, stable across the processes) """
+
+    def shard_of(self, value:Any) -> int:
+        if isinstance(value, bytes):
+            data = value
+        else:
+            data = str(int(value) if isinstance(value, bool) else value).encode('utf-8')
+        return zlib.crc32(data) % self.shards
+
+
+class RangeSharding(ShardFunction):
+    """ Sharding by the ranges of the values
+        Shard `i` has the values from `bounds[i - 1]` (inclusive) to `bounds[i]` (exclusive),
+        so there are `len(bounds) + 1` shards.
+    """
+
+    def __init__(self, bounds:Sequence[Any]) -> None:
+        if any(a >= b for a, b in zip(bounds, bounds[1:])):
+            raise RuntimeError('The bounds of the ranges are not increasing.')
+        super().__init__(len(bounds) + 1)
+        self.bounds = list(bounds)
+
+    def shard_of(self, value:Any) -> int:
+        return bisect.bisect_right(self.bounds, value)
+
+    def shards_in_range(self, lower:Any, upper:Any) -> Set[int]:
+        first = self.shard_of(lower) if lower is not None else 0
+        last = self.shard_of(upper) if upper is not None else self.shards - 1
+        return set(range(first, last + 1))
+
+
+def _constant(expr:Optional[Expr]) -> Tuple[bool, Any]:
+    """ Get the raw value of the constant expression (False if not a constant) """
+    if isinstance(expr, Value):
+        return True, expr.v
+    return False, None
+
+
+class Shard:
+    """ A shard with its connection (used by a thread at a time) """
+
+    def __init__(self, index:int, connector:Connector) -> None:
+        self.index = index
+        self.connector = connector
+        self.connection:Optional[Connection] = None
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return 'Shard({})'.format(self.index)
+
+
+class _OrderKey:
+    """ Sort key of a result row by the order of the select (NULL first in ASC as MySQL) """
+
+    __slots__ = ('vals', 'ascs')
+
+    def __init__(self, vals:Sequence[Any], ascs:Sequence[bool]) -> None:
+        self.vals = vals
+        self.ascs = ascs
+
+    def __lt__(self, other:'_OrderKey') -> bool:
+        for a, b, asc in zip(self.vals, other.vals, self.ascs):
+            if a == b:
+                continue
+            if a is None:
+                return asc
+            if b is None:
+                return not asc
+            return a < b if asc else b < a
+        return False
+
+
+class ShardedTable:
+    """ A table sharded by a column across the databases (thread-safe)
+        The table is declared in the database as usual (for building the queries), and the
+        same table exists in each shard. The tables joined in the selects (such as the linked
+        tables) must exist in each shard as well (such as the replicated reference tables).
+    """
+
+    def __init__(self,
+        table:Table,
+        column_or_name:Union[ColumnName, Column],
+        function:ShardFunction,
+        connectors:Sequence[Connector],
+        *,
+        max_workers:Optional[int] = None,
+    ) -> None:
+        if len(connectors) != function.shards:
+            raise RuntimeError('{} connectors are given for {} shards.'.format(len(connectors), function.shards))
+        self.table = table
+        self.column = table.to_self_column(column_or_name)
+        self.function = function
+        self.shards = [Shard(i, connector) for i, connector in enumerate(connectors)]
+        self.max_workers = max_workers
+        self._executor:Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return 'ShardedTable({}, {}, shards={})'.format(self.table.name, self.column.name, len(self.shards))
+
+    ### ---- Execution on the shards ---- ###
+
+    def shard_of(self, value:Any) -> int:
+        """ Get the shard of the value of the shard column """
+        return self.function.shard_of(value)
+
+    def run(self, shard:int, func:Callable[[Operation], T], *, raw:bool = False, commit:bool = False) -> T:
+        """ Run the function with an operation of the shard (connected on demand) """
+        target = self.shards[shard]
+        with target.lock:
+            if target.connection is None:
+                target.connection = target.connector.connect()
+            try:
+                with target.connection.operate(self.table.db, raw=raw) as op:
+                    result = func(op)
+            except BaseException:
+                if commit:
+                    target.connection.rollback()
+                raise
+            if commit:
+                target.connection.commit()
+            return result
+
+    def scatter(self,
+        func:Callable[[int, Operation], T],
+        shards:Optional[Iterable[int]] = None,
+        *,
+        commit:bool = False,
+    ) -> Dict[int, T]:
+        """ Run the function (of the shard and its operation) on the shards (all shards by default)
+            in parallel
+            Returns the results of the shards (in the order of the shards).
+        """
+        targets = sorted(set(shards)) if shards is not None else list(range(len(self.shards)))
+        if len(targets) <= 1:
+            return {shard: self.run(shard, functools.partial(func, shard), commit=commit) for shard in targets}
+        futures = {
+            shard: self._pool().submit(self.run, shard, functools.partial(func, shard), commit=commit)
+            for shard in targets
+        }
+        return {shard: future.result() for shard, future in futures.items()}
+
+    def execute(self,
+        query:Query,
+        values:Optional[Iterable] = None,
+        shards:Optional[Iterable[int]] = None,
+        *,
+        commit:bool = False,
+    ) -> Dict[int, List[Any]]:
+        """ Execute the query on the shards (all shards by default) in parallel and get the result rows """
+        params = list(values) if values is not None else None
+        return self.scatter(lambda shard, op: op.execute(query, params), shards, commit=commit)
+
+    def _pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.max_workers or len(self.shards))
+            return self._executor
+
+    def close(self) -> None:
+        """ Close the connections of the shards and the worker threads """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        for shard in self.shards:
+            with shard.lock:
+                if shard.connection is not None:
+                    shard.connection.close()
+                    shard.connection = None
+
+    def __enter__(self) -> 'ShardedTable':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    ### ---- Routing by the conditions ---- ###
+
+    def _shard_column_and_value(self, expr:OpExpr) -> Tuple[bool, Optional[Expr], bool]:
+        """ Check if an operand is the shard column, and get the other side
+            and whether the column is on the left
+        """
+        for column, other, left in ((expr.larg, expr.rarg, True), (expr.rarg, expr.larg, False)):
+            if isinstance(column, ColumnExpr) and column.entity() is self.column \
+                    and not any(True for _ in column.column_connections()):
+                return True, other, left
+        return False, None, True
+
+    def target_shards(self, where:Optional[ExprLike]) -> Set[int]:
+        """ Get the shards of the rows matching the condition (all shards if not restricted) """
+        all_shards = set(range(len(self.shards)))
+        if where is None:
+            return all_shards
+        expr = to_expr(where)
+        if not isinstance(expr, OpExpr):
+            return all_shards
+        op = expr.op.upper()
+        if op in _and_ops:
+            return self.target_shards(expr.larg) & self.target_shards(expr.rarg)
+        if op in _or_ops:
+            return self.target_shards(expr.larg) | self.target_shards(expr.rarg)
+
+        found, other, left = self._shard_column_and_value(expr)
+        if not found:
+            return all_shards
+        if op in ('=', '<=>'):
+            constant, value = _constant(other)
+            if constant and value is not None:
+                return {self.shard_of(value)}
+            return set() if constant and op == '=' else all_shards
+        if op == 'IN' and left and isinstance(other, Values):
+            shards:Set[int] = set()
+            for value_expr in other.values:
+                constant, value = _constant(value_expr)
+                if not constant:
+                    return all_shards
+                if value is not None:
+                    shards.add(self.shard_of(value))
+            return shards
+        if op in _range_ops:
+            constant, value = _constant(other)
+            if not constant or value is None:
+                return all_shards
+            if not left:
+                op = _range_ops[op]
+            if op in ('<', '<='):
+                return self.function.shards_in_range(None, value)
+            return self.function.shards_in_range(value, None)
+        return all_shards
+
+    ### ---- Database actions for the records ---- ###
+
+    def create(self) -> None:
+        """ Create the table on all shards """
+        self.execute(self.table.creation_sql(), commit=True)
+
+    def insert(self,
+        columns_or_names: Sequence[Union[ColumnName, Column]],
+        vals_itr:Iterable[Iterable[ExprLike]],
+        *,
+        validate:bool = False,
+    ) -> Dict[int, int]:
+        """ SQL INSERT query partitioned per shard (a bulk insertion per shard in parallel,
+            committed per shard), the shard column must be in the columns
+            Returns the numbers of the inserted records of the shards.
+        """
+        columns = [self.table.to_self_column(c) for c in columns_or_names]
+        position = next((i for i, column in enumerate(columns) if column is self.column), None)
+        if position is None:
+            raise RuntimeError('Shard column `{}` is not specified.'.format(self.column.name))
+        records = [list(vals) for vals in vals_itr]
+        if validate:
+            self.table.validator(columns).expect_valid(records)
+
+        partitions:Dict[int, List[List[Any]]] = {}
+        for vals in records:
+            partitions.setdefault(self.shard_of(vals[position]), []).append(vals)
+        query = self.table.insertion_sql(columns)
+        params = {
+            shard: self.table.to_query_exec_vals(
+                columns, shard_records, binary=self.shards[shard].connector.prepared)
+            for shard, shard_records in partitions.items()
+        }
+        self.scatter(lambda shard, op: op.execute(query, params[shard], many=True), partitions, commit=True)
+        self.table.db.tables_committed(self.table)
+        return {shard: len(shard_records) for shard, shard_records in sorted(partitions.items())}
+
+    def update(self,
+        _raw_column_exprs: Union[Dict[ColumnName, ExprLike], Iterable[Tuple[Union[ColumnName, Column], ExprLike]]],
+        where: Optional[ExprLike],
+        count: Optional[int] = None,
+    ) -> int:
+        """ SQL UPDATE query on the shards of the condition (committed per shard)
+            Returns the number of the affected rows.
+        """
+        set_query, params = self.table.set_clause(_raw_column_exprs)
+        return self._write(Query('UPDATE', self.table, set_query), params, where, count)
+
+    def delete(self,
+        where: Optional[ExprLike],
+        count: Optional[int] = None,
+    ) -> int:
+        """ SQL DELETE query on the shards of the condition (committed per shard)
+            Returns the number of the affected rows.
+        """
+        return self._write(Query('DELETE FROM', self.table), None, where, count)
+
+    def _write(self,
+        statement:Query,
+        params:Optional[Sequence[Any]],
+        where:Optional[ExprLike],
+        count:Optional[int],
+    ) -> int:
+        shards = self.target_shards(where)
+        if count and len(shards) > 1:
+            raise RuntimeError('The count cannot be limited across the shards.')
+        query = Query(
+            statement,
+            Query('WHERE', to_expr(where)) if where is not None else None,
+            Query('LIMIT', count) if count else None,
+        )
+        values = list(params) if params is not None else None
+
+        def execute(shard:int, op:Operation) -> int:
+            op.execute(query, values)
+            return op.rowcount
+
+        results = self.scatter(execute, shards, commit=True)
+        self.table.db.tables_committed(self.table)
+        return sum(max(rowcount, 0) for rowcount in results.values())
+
+    def prepare_select(self,
+        columns: Optional[Sequence[Union[ColumnName, Expr]]] = None,
+        *args,
+        **kwargs
+    ) -> Select:
+        return self.table.prepare_select(columns, *args, **kwargs)
+
+    def select(self,
+        columns: Optional[Sequence[Union[ColumnName, Expr]]] = None,
+        *args,
+        **kwargs
+    ) -> Select:
+        """ SQL SELECT query on the shards of the condition (See `exec_select`) """
+        return self.exec_select(self.prepare_select(columns, *args, **kwargs))
+
+    def exec_select(self, select:Select) -> Select:
+        """ Execute the select on the shards of its condition and keep the result records
+            The select on a shard is executed as it is. The select on the multiple shards gets
+            `count + offset` rows from each shard, and the rows are merged by the order
+            (or concatenated in the order of the shards if not ordered), and then limited.
+            The grouped selects, the aggregations and DISTINCT are not merged, so they are
+            executed only on a shard (raises if the condition does not fix a shard).
+            The rows are merged by the values in Python, which differs from the collations of
+            the strings on the servers (such as the case-insensitive ones), so the strings
+            cannot be the order keys (raises for the string columns and values).
+        """
+        shards = self.target_shards(select.where_expr)
+        if len(shards) == 1:
+            shard, = shards
+            query = select.sql_query()
+            rows = self.run(shard, lambda op: op.execute(query))
+            select.result = list(map(select.record_class(), rows))
+            return select
+        if select.group_exprs is not None or select.having_expr is not None:
+            raise RuntimeError('The grouped select cannot be gathered from the shards.')
+        if _aggregation_pattern.search(Query(select.column_exprs).query_text()):
+            raise RuntimeError('The aggregation or DISTINCT cannot be gathered from the shards.')
+        for expr, _ in select.order_exprs or []:
+            if isinstance(expr, ColumnExpr) and isinstance(expr.entity().datatype, DataType) \
+                    and expr.entity().datatype.pytype.basetype is str:
+                raise RuntimeError('The shards cannot be merged by the string column {}.'.format(repr(expr)))
+
+        # The order expressions not in the result columns are added for the merge
+        columns = list(select.column_exprs)
+        order_positions:List[int] = []
+        for expr, _ in select.order_exprs or []:
+            position = next((i for i, column in enumerate(columns) if is_same(column, expr)), None)
+            if position is None:
+                position = len(columns)
+                columns.append(expr)
+            order_positions.append(position)
+
+        shard_select = copy.copy(select)
+        shard_select.column_exprs = columns
+        shard_select.count = select.count + (select.offset or 0) if select.count is not None else None
+        shard_select.offset = None
+        query = shard_select.sql_query()
+        results = self.scatter(lambda shard, op: op.execute(query), shards)
+
+        if select.order_exprs:
+            for rows in results.values():
+                if any(isinstance(row[position], str) for row in rows for position in order_positions):
+                    raise RuntimeError('The shards cannot be merged by the string values.')
+            ascs = [asc for _, asc in select.order_exprs]
+            rows:Iterable[Any] = heapq.merge(*results.values(), key=lambda row: _OrderKey(
+                [row[position] for position in order_positions], ascs))
+        else:
+            rows = itertools.chain.from_iterable(results.values())
+        offset = select.offset or 0
+        rows = itertools.islice(rows, offset, offset + select.count if select.count is not None else None)
+
+        n_columns = len(select.column_exprs)
+        record_class = select.record_class()
+        select.result = [record_class(row[:n_columns]) for row in rows]
+        return select
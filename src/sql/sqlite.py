@@ -0,0 +1,130 @@
+"""
+    sql.sqlite - SQLite connection with the interface of `sql.executor.Connection`
+
+    For the local setups and the tests without a MySQL server (such as the shards of
+    `sql.sharding` in the SQLite files). The `%s` parameters of the queries are executed
+    as the `?` parameters of SQLite.
+"""
+from typing import Any, Iterable, Iterator, List, Optional, Union
+import os
+import sqlite3
+from sql.expression import Query
+
+
+def _sqlite_text(q:Query) -> str:
+    return q.query_text().replace('%s', '?')
+
+
+class SQLiteConnector:
+    """ Connector to a SQLite file (the connections can be used from any thread) """
+
+    def __init__(self, path:Union[str, os.PathLike], **kwargs) -> None:
+        self.path = path
+        self.kwargs = kwargs
+        self.prepared = False
+
+    def connect(self) -> 'SQLiteConnection':
+        """ Open a new connection to the SQLite file """
+        return SQLiteConnection(sqlite3.connect(os.fspath(self.path), check_same_thread=False, **self.kwargs))
+
+    def __enter__(self):
+        return self.connect()
+
+
+class SQLiteConnection:
+
+    def __init__(self, _con:sqlite3.Connection) -> None:
+        self._con = _con
+        self.prepared = False
+        self.closed = False
+
+    @property
+    def con(self) -> sqlite3.Connection:
+        if self.closed:
+            raise RuntimeError('This connection is already closed.')
+        return self._con
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._con.close()
+            self.closed = True
+
+    def commit(self) -> None:
+        self.con.commit()
+
+    def rollback(self) -> None:
+        self.con.rollback()
+
+    def operate(self, db, *, raw:bool = False) -> 'SQLiteOperation':
+        return SQLiteOperation(db, self, raw=raw)
+
+
+class SQLiteOperation:
+
+    def __init__(self, db, con:SQLiteConnection, *, raw:bool = False) -> None:
+        self.db = db
+        self.con = con
+        self.raw = raw # (The values of SQLite are always typed)
+        self._cur:sqlite3.Cursor
+        self.closed = False
+
+    @property
+    def cur(self) -> sqlite3.Cursor:
+        if not hasattr(self, '_cur'):
+            raise RuntimeError('Cursor is not created yet.')
+        if self.closed:
+            raise RuntimeError('This cursor is already closed.')
+        return self._cur
+
+    def __enter__(self):
+        self._cur = self.con.con.cursor()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        if not self.closed and hasattr(self, '_cur'):
+            self._cur.close()
+            self.closed = True
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.cur, name)
+
+    def execute(self,
+        q:Query,
+        values:Optional[Iterable[Any]] = None,
+        *,
+        many:bool = False
+    ) -> List[Any]:
+        if many:
+            self.cur.executemany(_sqlite_text(q), values or [])
+        else:
+            self.cur.execute(_sqlite_text(q), tuple(values) if values is not None else ())
+        return self.cur.fetchall() if self.cur.description is not None else []
+
+    def execute_multi(self, q:Query) -> None:
+        """ Execute the statements separated by semicolons (without the parameters) """
+        self.cur.executescript(q.query_text())
+
+    def fetch_batches(self,
+        q:Query,
+        values:Optional[Iterable[Any]] = None,
+        *,
+        batch_size:int = 1000,
+    ) -> Iterator[List[Any]]:
+        """ Execute the query and yield the result rows in batches """
+        self.cur.execute(_sqlite_text(q), tuple(values) if values is not None else ())
+        while True:
+            rows = self.cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
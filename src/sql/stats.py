@@ -0,0 +1,348 @@
+"""
+    sql.stats - Table statistics and the cardinality estimation of the selects
+
+    The statistics are gathered from INFORMATION_SCHEMA (the row counts, the indexes
+    and their cardinalities) and by the MIN/MAX queries on the indexed columns
+    (answered from the indexes), or by scanning the tables if `scan` is True.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import time
+from sql.expression import Expr, OpExpr, Query, Value, Values
+from sql.objects import Column, ColumnExpr, Database, Table
+
+# Selectivities used when the statistics cannot tell
+DEFAULT_EQ_SELECTIVITY = 0.1
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+DEFAULT_NULL_SELECTIVITY = 0.1
+DEFAULT_LIKE_SELECTIVITY = 0.1
+DEFAULT_SELECTIVITY = 1 / 3
+
+# Joins multiplying the rows more than this are flagged
+JOIN_EXPLOSION_FANOUT = 10.0
+
+AND_OPS = {'&', '&&', 'AND'}
+OR_OPS = {'|', '||', 'OR'}
+RANGE_OPS = {'<', '<=', '>', '>='}
+
+
+class IndexStats:
+    """ Statistics of an index """
+
+    def __init__(self, name:str, columns:List[str], unique:bool, cardinality:Optional[int]) -> None:
+        self.name = name
+        self.columns = columns # Column names in order of the index
+        self.unique = unique
+        self.cardinality = cardinality # Estimated distinct count of the leading column
+
+    def __repr__(self) -> str:
+        return 'IndexStats({}, {}{})'.format(self.name, self.columns, ', unique' if self.unique else '')
+
+
+class ColumnStats:
+    """ Statistics of a column (None for unknown) """
+
+    def __init__(self, name:str, distinct:Optional[float] = None, min:Any = None, max:Any = None) -> None:
+        self.name = name
+        self.distinct = distinct
+        self.min = min
+        self.max = max
+
+    def __repr__(self) -> str:
+        return 'ColumnStats({}, distinct={}, min={}, max={})'.format(
+            self.name, self.distinct, repr(self.min), repr(self.max))
+
+
+class TableStats:
+    """ Statistics of a table """
+
+    def __init__(self, name:str, rows:int) -> None:
+        self.name = name
+        self.rows = rows
+        self.columns:Dict[str, ColumnStats] = {}
+        self.indexes:List[IndexStats] = []
+
+    def __repr__(self) -> str:
+        return 'TableStats({}, rows={})'.format(self.name, self.rows)
+
+    def column(self, name:str) -> ColumnStats:
+        if name not in self.columns:
+            self.columns[name] = ColumnStats(name)
+        return self.columns[name]
+
+    def leading_index(self, column_name:str) -> Optional[IndexStats]:
+        """ Get the index whose leading column is the column (the unique one first) """
+        indexes = [index for index in self.indexes if index.columns[0] == column_name]
+        indexes.sort(key=lambda index: (not index.unique, len(index.columns)))
+        return indexes[0] if indexes else None
+
+    def is_unique(self, column_name:str) -> bool:
+        """ Check if the column alone is unique (a unique index of the column only) """
+        return any(index.unique and index.columns == [column_name] for index in self.indexes)
+
+    def distinct(self, column_name:str) -> float:
+        """ Get the estimated distinct count of the column """
+        if self.is_unique(column_name):
+            return max(self.rows, 1)
+        distinct = self.column(column_name).distinct
+        if distinct is None:
+            return max(self.rows * DEFAULT_EQ_SELECTIVITY, 1)
+        return max(min(distinct, self.rows), 1)
+
+
+class DatabaseStats:
+    """ Statistics of the tables in a database """
+
+    def __init__(self, tables:Dict[str, TableStats]) -> None:
+        self.tables = tables
+        self.collected_at = time.monotonic()
+
+    def age(self) -> float:
+        """ Get the seconds since collected """
+        return time.monotonic() - self.collected_at
+
+    def table(self, name:str) -> TableStats:
+        if name not in self.tables:
+            self.tables[name] = TableStats(name, 0)
+        return self.tables[name]
+
+
+def collect_stats(db:Database, *, scan:bool = False) -> DatabaseStats:
+    """ Gather the statistics of the tables in the database
+        If `scan` is True, the exact distinct counts and the min/max values of all columns
+        are calculated by scanning the tables (expensive on large tables).
+    """
+    tables:Dict[str, TableStats] = {
+        name: TableStats(name, int(rows or 0))
+        for name, rows in db.execute(Query(
+            'SELECT TABLE_NAME, TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = %s'
+        ), [db.name])
+    }
+
+    for table_name, index_name, column_name, non_unique, cardinality in db.execute(Query(
+        'SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, NON_UNIQUE, CARDINALITY',
+        'FROM INFORMATION_SCHEMA.STATISTICS WHERE TABLE_SCHEMA = %s',
+        'ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX'
+    ), [db.name]):
+        table_stats = tables.setdefault(table_name, TableStats(table_name, 0))
+        if table_stats.indexes and table_stats.indexes[-1].name == index_name:
+            table_stats.indexes[-1].columns.append(column_name)
+            continue
+        table_stats.indexes.append(IndexStats(index_name, [column_name], not int(non_unique), cardinality))
+        if cardinality is not None:
+            table_stats.column(column_name).distinct = float(cardinality)
+
+    for table in db.tables:
+        if table.name not in tables:
+            continue
+        table_stats = tables[table.name]
+        if scan:
+            columns = [column.name for column in table.columns]
+        else:
+            columns = list(dict.fromkeys(index.columns[0] for index in table_stats.indexes))
+        if columns:
+            _collect_column_stats(db, table, table_stats, columns, scan)
+
+    return DatabaseStats(tables)
+
+
+def _collect_column_stats(db:Database, table:Table, table_stats:TableStats, columns:List[str], scan:bool) -> None:
+    """ Get the min/max values (and the distinct counts if `scan`) of the columns by a query """
+    aggregates:List[Query] = []
+    for name in columns:
+        column = Query.as_obj(name)
+        aggregates.append(Query('MIN(', column, ')'))
+        aggregates.append(Query('MAX(', column, ')'))
+        if scan:
+            aggregates.append(Query('COUNT(DISTINCT', column, ')'))
+    rows = db.execute(Query('SELECT', aggregates, 'FROM', table))
+    if not rows:
+        return
+    vals = iter(rows[0])
+    for name in columns:
+        column_stats = table_stats.column(name)
+        column_stats.min = next(vals)
+        column_stats.max = next(vals)
+        if scan:
+            column_stats.distinct = float(next(vals))
+
+
+class Estimate:
+    """ The estimated cardinality of a select, and the flags of the likely expensive parts """
+
+    def __init__(self) -> None:
+        self.rows = 0.0
+        self.scanned_rows = 0.0 # Rows read from the root tables
+        self.full_scans:List[str] = [] # Tables read without the usable index
+        self.unindexed_joins:List[Tuple[Column, Column]] = []
+        self.exploding_joins:List[Tuple[Column, Column, float]] = [] # With the fanout
+        self.cross_joins:List[str] = []
+
+    def warnings(self) -> List[str]:
+        """ Get the messages of the flags """
+        return [
+            *('Full scan of `{}`'.format(name) for name in self.full_scans),
+            *('Join {} = {} is not indexed'.format(repr(f), repr(t)) for f, t in self.unindexed_joins),
+            *('Join {} = {} multiplies the rows by {:.1f}'.format(repr(f), repr(t), fanout)
+              for f, t, fanout in self.exploding_joins),
+            *('Cross join with `{}`'.format(name) for name in self.cross_joins),
+        ]
+
+    def __repr__(self) -> str:
+        return 'Estimate(rows={:.0f}, warnings={})'.format(self.rows, self.warnings())
+
+
+def conjuncts(expr:Optional[Expr]) -> Iterator[Expr]:
+    """ Get the operands of the AND conditions (nested ANDs are flattened) """
+    if expr is None:
+        return
+    if isinstance(expr, OpExpr) and expr.op.upper() in AND_OPS:
+        yield from conjuncts(expr.larg)
+        yield from conjuncts(expr.rarg)
+    else:
+        yield expr
+
+
+def column_and_value(expr:OpExpr) -> Tuple[Optional[Column], Optional[Expr], bool]:
+    """ Get the column, the other side, and whether the column is on the left """
+    if isinstance(expr.larg, ColumnExpr):
+        return expr.larg.entity(), expr.rarg, True
+    if isinstance(expr.rarg, ColumnExpr):
+        return expr.rarg.entity(), expr.larg, False
+    return None, None, True
+
+
+class _Estimator:
+    """ Estimator of the selectivities of the conditions by the statistics """
+
+    def __init__(self, stats:DatabaseStats) -> None:
+        self.stats = stats
+
+    def column_stats(self, column:Column) -> Tuple[TableStats, ColumnStats]:
+        table_stats = self.stats.table(column.table.name)
+        return table_stats, table_stats.column(column.name)
+
+    def selectivity(self, expr:Expr) -> float:
+        if not isinstance(expr, OpExpr):
+            return DEFAULT_SELECTIVITY
+        op = expr.op.upper()
+
+        if op in AND_OPS:
+            return self.selectivity(expr.larg) * self.selectivity(expr.rarg)
+        if op in OR_OPS:
+            s1, s2 = self.selectivity(expr.larg), self.selectivity(expr.rarg)
+            return s1 + s2 - s1 * s2
+
+        column, other, column_left = column_and_value(expr)
+        if column is None:
+            return DEFAULT_SELECTIVITY
+        table_stats, column_stats = self.column_stats(column)
+
+        if op in ('=', '<=>'):
+            if isinstance(other, ColumnExpr):
+                return 1 / max(table_stats.distinct(column.name), self.distinct(other.entity()))
+            return 1 / table_stats.distinct(column.name)
+        if op in ('!=', '<>'):
+            return 1 - 1 / table_stats.distinct(column.name)
+        if op in ('IN', 'NOT IN') and isinstance(other, Values):
+            s = min(len(other.values) / table_stats.distinct(column.name), 1.0)
+            return s if op == 'IN' else 1 - s
+        if op in ('IS', 'IS NOT') and isinstance(other, Value) and other.v is None:
+            return DEFAULT_NULL_SELECTIVITY if op == 'IS' else 1 - DEFAULT_NULL_SELECTIVITY
+        if op in RANGE_OPS and isinstance(other, Value):
+            return self._range_selectivity(op if column_left else _flip(op), column_stats, other.v)
+        if op in ('LIKE', 'NOT LIKE'):
+            return DEFAULT_LIKE_SELECTIVITY if op == 'LIKE' else 1 - DEFAULT_LIKE_SELECTIVITY
+        return DEFAULT_SELECTIVITY
+
+    def distinct(self, column:Column) -> float:
+        return self.stats.table(column.table.name).distinct(column.name)
+
+    @staticmethod
+    def _range_selectivity(op:str, column_stats:ColumnStats, v:Any) -> float:
+        """ Interpolate the fraction by the min/max (for the numeric values) """
+        low, high = column_stats.min, column_stats.max
+        if not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in (low, high, v)):
+            return DEFAULT_RANGE_SELECTIVITY
+        if high <= low:
+            return 1.0 if (v <= low if op in ('>', '>=') else v >= low) else 0.0
+        below = min(max((v - low) / (high - low), 0.0), 1.0)
+        return below if op in ('<', '<=') else 1 - below
+
+    def sargable(self, expr:Expr) -> bool:
+        """ Check if the condition can be answered by an index """
+        if not isinstance(expr, OpExpr):
+            return False
+        op = expr.op.upper()
+        if op in OR_OPS:
+            return self.sargable(expr.larg) and self.sargable(expr.rarg)
+        if op not in ('=', '<=>', 'IN', 'IS', 'LIKE') and op not in RANGE_OPS:
+            return False
+        column, other, _ = column_and_value(expr)
+        if column is None or isinstance(other, ColumnExpr):
+            return False
+        if op == 'LIKE' and not (isinstance(other, Value) and isinstance(other.v, str) and other.v[:1] not in ('%', '_')):
+            return False
+        return self.stats.table(column.table.name).leading_index(column.name) is not None
+
+
+def _flip(op:str) -> str:
+    return {'<': '>', '<=': '>=', '>': '<', '>=': '<='}[op]
+
+
+def estimate(select, stats:DatabaseStats) -> Estimate:
+    """ Estimate the cardinality of the select (See `Select.estimate`) """
+    result = Estimate()
+    estimator = _Estimator(stats)
+    where_conjuncts = list(conjuncts(select.where_expr))
+
+    rows = 1.0
+    for i, (table_name, joins) in enumerate(select.table_joins().items()):
+        table_stats = stats.table(table_name)
+        if i > 0:
+            result.cross_joins.append(table_name)
+        table_rows = float(table_stats.rows)
+        result.scanned_rows += table_rows
+        own_conjuncts = [
+            c for c in where_conjuncts
+            if isinstance(c, OpExpr) and all(
+                column_expr.entity().table.name == table_name
+                for column_expr in select.extract_column_exprs([c])
+            )
+        ]
+        if table_rows > 0 and not any(estimator.sargable(c) for c in own_conjuncts):
+            result.full_scans.append(table_name)
+        rows *= table_rows
+
+        for column_from, column_to in joins:
+            to_stats = stats.table(column_to.table.name)
+            if to_stats.leading_index(column_to.name) is None and not column_to.is_primary:
+                result.unindexed_joins.append((column_from, column_to))
+            if to_stats.is_unique(column_to.name) or column_to.is_primary or column_to.is_unique:
+                fanout = 1.0
+            else:
+                fanout = to_stats.rows / to_stats.distinct(column_to.name)
+            if fanout > JOIN_EXPLOSION_FANOUT:
+                result.exploding_joins.append((column_from, column_to, fanout))
+            rows *= fanout
+
+    for c in where_conjuncts:
+        rows *= estimator.selectivity(c)
+
+    if select.group_exprs is not None:
+        groups = 1.0
+        for expr in select.group_exprs:
+            if isinstance(expr, ColumnExpr):
+                groups *= estimator.distinct(expr.entity())
+            else:
+                groups *= max(rows * DEFAULT_SELECTIVITY, 1)
+        rows = min(rows, groups)
+        if select.having_expr is not None:
+            rows *= estimator.selectivity(select.having_expr)
+
+    if select.offset is not None:
+        rows = max(rows - select.offset, 0.0)
+    if select.count is not None:
+        rows = min(rows, float(select.count))
+
+    result.rows = rows
+    return result
@@ -0,0 +1,269 @@
+"""
+    sql.transaction - Transactions with the savepoints, the retries and the group commit
+
+    `db.transaction()` starts a transaction (or a savepoint in a transaction), which is
+    committed (or released) at the end of the block and rolled back on an exception.
+    `db.run_transaction(func)` also retries the function on the deadlocks and the lock wait
+    timeouts with the jittered exponential backoff.
+    `GroupCommit` runs the small logical transactions of the threads as the savepoints in a
+    shared physical transaction, committed every `interval` seconds (or `max_transactions`
+    transactions), so that the commits (and the fsyncs of the logs) are shared.
+"""
+from typing import Callable, Iterator, Optional, TypeVar
+from contextlib import contextmanager
+import random
+import threading
+import time
+from sql.executor import is_deadlock_error, is_retryable_error
+from sql.expression import Query
+from sql.objects import Database
+
+T = TypeVar('T')
+
+ISOLATION_LEVELS = ('READ UNCOMMITTED', 'READ COMMITTED', 'REPEATABLE READ', 'SERIALIZABLE')
+
+
+def _check_isolation(isolation:Optional[str]) -> Optional[str]:
+    if isolation is None:
+        return None
+    level = isolation.upper().replace('_', ' ')
+    if level not in ISOLATION_LEVELS:
+        raise RuntimeError('Unknown isolation level `{}`.'.format(isolation))
+    return level
+
+
+def backoff_seconds(attempt:int, backoff:float, max_backoff:float) -> float:
+    """ Get the seconds to wait before the retry (the exponential backoff with the full jitter) """
+    return random.uniform(0, min(max_backoff, backoff * (2 ** attempt)))
+
+
+class Transaction:
+    """ A transaction (or a savepoint in the transaction) of the database
+        (The context manager, committed at the end of the block or rolled back on an exception)
+    """
+
+    def __init__(self, db:Database, *, isolation:Optional[str] = None) -> None:
+        self.db = db
+        self.isolation = _check_isolation(isolation)
+        self.savepoint:Optional[str] = None
+
+    def __enter__(self) -> 'Transaction':
+        db = self.db
+        if db.transaction_depth:
+            if self.isolation is not None:
+                raise RuntimeError('The isolation level cannot be set in a transaction.')
+            self.savepoint = 'sp_{}'.format(db.transaction_depth)
+            db.execute(Query('SAVEPOINT', Query.as_obj(self.savepoint)))
+        else:
+            if self.isolation is not None:
+                db.execute(Query('SET TRANSACTION ISOLATION LEVEL', self.isolation))
+            db.execute(Query('START TRANSACTION'))
+        db.transaction_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        db = self.db
+        db.transaction_depth -= 1
+        if self.savepoint is None:
+            if exc_type is None:
+                db.commit()
+            else:
+                db.rollback()
+            return
+        if exc_type is None:
+            db.execute(Query('RELEASE SAVEPOINT', Query.as_obj(self.savepoint)))
+        elif not is_deadlock_error(exc_value):
+            # (The whole transaction is already rolled back on the deadlock,
+            #  but only the statement on the other errors such as the lock wait timeout)
+            db.execute(Query('ROLLBACK TO SAVEPOINT', Query.as_obj(self.savepoint)))
+            db.execute(Query('RELEASE SAVEPOINT', Query.as_obj(self.savepoint)))
+
+
+def run_transaction(
+    db:Database,
+    func:Callable[..., T],
+    *args,
+    isolation:Optional[str] = None,
+    retries:int = 3,
+    backoff:float = 0.05,
+    max_backoff:float = 2.0,
+    **kwargs
+) -> T:
+    """ Run the function in a transaction, retrying it up to `retries` times on the deadlocks
+        and the lock wait timeouts (in an outer transaction, the deadlock is not retried
+        since the outer transaction is rolled back, but the lock wait timeout is retried
+        from the savepoint)
+    """
+    attempt = 0
+    while True:
+        try:
+            with Transaction(db, isolation=isolation):
+                return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not is_retryable_error(e) or (db.transaction_depth and is_deadlock_error(e)):
+                raise
+        time.sleep(backoff_seconds(attempt, backoff, max_backoff))
+        attempt += 1
+
+
+class CommitGroup:
+    """ The logical transactions in a physical transaction (the handle of their commit) """
+
+    def __init__(self, deadline:float) -> None:
+        self.deadline = deadline
+        self.transactions = 0
+        self.savepoints = 0
+        self.done = threading.Event()
+        self.error:Optional[BaseException] = None
+
+    def wait(self, timeout:Optional[float] = None) -> bool:
+        """ Wait for the commit (returns False on timeout), and raise the error if it failed """
+        if not self.done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+class GroupCommit:
+    """ Group commit of the logical transactions (thread-safe)
+
+        The logical transactions are run one by one on the connection (serialized by a lock)
+        as the savepoints in the physical transaction, which is committed by a committer thread
+        `interval` seconds after its start, or when `max_transactions` transactions are run.
+        The logical transaction waits for the commit at the end by default (`wait`), and raises
+        the error if the commit failed. A deadlock rolls back the whole physical transaction,
+        so all logical transactions in it fail (and are retried by `run` if retryable).
+        Without `wait`, the commit is waited (and the error is raised) by `wait()` of the
+        `CommitGroup` given by the block.
+    """
+
+    def __init__(self,
+        db:Database,
+        *,
+        interval:float = 0.01,
+        max_transactions:int = 100,
+        isolation:Optional[str] = None,
+    ) -> None:
+        self.db = db
+        self.interval = interval
+        self.max_transactions = max_transactions
+        self.isolation = _check_isolation(isolation)
+        self.commits = 0 # Number of the physical commits
+        self.transactions = 0 # Number of the committed logical transactions
+        self._lock = threading.RLock()
+        self._group:Optional[CommitGroup] = None
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def transaction(self, *, wait:bool = True) -> Iterator[CommitGroup]:
+        """ Run a logical transaction in the block (given the group of its commit) """
+        if self._closed:
+            raise RuntimeError('The group commit is already closed.')
+        with self._lock:
+            group = self._group
+            if group is None:
+                if self.isolation is not None:
+                    self.db.execute(Query('SET TRANSACTION ISOLATION LEVEL', self.isolation))
+                self.db.execute(Query('START TRANSACTION'))
+                group = self._group = CommitGroup(time.monotonic() + self.interval)
+                self._wakeup.notify()
+            group.savepoints += 1
+            savepoint = Query.as_obj('gc_{}'.format(group.savepoints))
+            self.db.execute(Query('SAVEPOINT', savepoint))
+            try:
+                yield group
+            except BaseException as e:
+                if is_deadlock_error(e):
+                    self._finish(group, e)
+                else:
+                    self.db.execute(Query('ROLLBACK TO SAVEPOINT', savepoint))
+                    self.db.execute(Query('RELEASE SAVEPOINT', savepoint))
+                raise
+            self.db.execute(Query('RELEASE SAVEPOINT', savepoint))
+            group.transactions += 1
+            if group.transactions >= self.max_transactions:
+                self._finish(group)
+        if wait:
+            group.wait()
+
+    def run(self,
+        func:Callable[..., T],
+        *args,
+        retries:int = 3,
+        backoff:float = 0.05,
+        max_backoff:float = 2.0,
+        **kwargs
+    ) -> T:
+        """ Run the function in a logical transaction (waiting for the commit),
+            retrying it on the deadlocks and the lock wait timeouts
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.transaction():
+                    return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= retries or not is_retryable_error(e):
+                    raise
+            time.sleep(backoff_seconds(attempt, backoff, max_backoff))
+            attempt += 1
+
+    def _finish(self, group:CommitGroup, error:Optional[BaseException] = None) -> None:
+        """ Commit the physical transaction (or roll back on the error) and notify the waiters
+            (called with the lock)
+        """
+        if self._group is not group:
+            return
+        self._group = None
+        if error is None:
+            try:
+                self.db.commit()
+                self.commits += 1
+                self.transactions += group.transactions
+            except Exception as e:
+                error = e
+        if error is not None:
+            group.error = error
+            try:
+                self.db.rollback()
+            except Exception:
+                pass
+        group.done.set()
+
+    def _run(self) -> None:
+        with self._lock:
+            while True:
+                group = self._group
+                if group is None:
+                    if self._closed:
+                        return
+                    self._wakeup.wait()
+                    continue
+                delay = group.deadline - time.monotonic()
+                if delay > 0 and not self._closed:
+                    self._wakeup.wait(delay)
+                    continue
+                self._finish(group)
+
+    def commit(self) -> None:
+        """ Commit the current physical transaction now """
+        with self._lock:
+            if self._group is not None:
+                self._finish(self._group)
+
+    def close(self) -> None:
+        """ Commit the current physical transaction and stop the committer thread """
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+
+    def __enter__(self) -> 'GroupCommit':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
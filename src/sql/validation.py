@@ -0,0 +1,92 @@
+"""
+    sql.validation - Batched validation of the column values before writing
+"""
+from typing import Any, List, Optional, Sequence
+from sql.datatypes import DataType
+from sql.objects import Column, Table
+
+
+class Violation:
+    """ An invalid value in the validated rows """
+
+    def __init__(self, row_index:int, column:Optional[Column], value:Any, message:str) -> None:
+        self.row_index = row_index
+        self.column = column
+        self.value = value
+        self.message = message
+
+    def __repr__(self) -> str:
+        return 'Violation(row {}, {}: {})'.format(self.row_index, repr(self.column), self.message)
+
+
+class ValidationError(RuntimeError):
+    """ Error for the rows which have invalid values """
+
+    def __init__(self, violations:List[Violation]) -> None:
+        super().__init__('{} invalid value(s) found: {}'.format(
+            len(violations), ', '.join(map(repr, violations[:10])) + (', ...' if len(violations) > 10 else '')
+        ))
+        self.violations = violations
+
+
+class ColumnValidator:
+    """ Validator of the values of a column (compiled from the column definition) """
+
+    def __init__(self, column:Column) -> None:
+        self.column = column
+        self.datatype:Optional[DataType] = column.datatype if isinstance(column.datatype, DataType) else None
+        # NULL is allowed for the nullable columns and the columns filled by the database
+        self.allow_null = bool(column.nullable or column.auto_increment or column.default_expr is not None)
+
+    def validate(self, vals:Sequence[Any]) -> List[Violation]:
+        """ Validate the values of this column (in order of the rows) """
+        violations:List[Violation] = []
+
+        indexes = range(len(vals))
+        if any(val is None for val in vals):
+            indexes = [i for i, val in enumerate(vals) if val is not None]
+            if not self.allow_null:
+                violations.extend(
+                    Violation(i, self.column, None, 'NULL is not allowed')
+                    for i, val in enumerate(vals) if val is None
+                )
+            vals = [vals[i] for i in indexes]
+
+        if self.datatype is not None:
+            violations.extend(
+                Violation(indexes[i], self.column, vals[i], 'Invalid value for {}'.format(self.datatype.dbtype))
+                for i in self.datatype.pytype.invalid_indexes(vals)
+            )
+
+        return violations
+
+
+class TableValidator:
+    """ Validator of the rows to write into a table (compiled for the given columns) """
+
+    def __init__(self, table:Table, columns:Optional[Sequence[Column]] = None) -> None:
+        self.table = table
+        self.columns = list(columns) if columns is not None else table.columns
+        self.column_validators = [ColumnValidator(column) for column in self.columns]
+
+    def validate(self, rows:Sequence[Sequence[Any]]) -> List[Violation]:
+        """ Validate all rows and get all violations (sorted by the row index) """
+        violations:List[Violation] = []
+
+        for i, row in enumerate(rows):
+            if len(row) != len(self.columns):
+                violations.append(Violation(i, None, row, 'The number of values is not {}'.format(len(self.columns))))
+        if violations or not rows:
+            return violations
+
+        for validator, vals in zip(self.column_validators, zip(*rows)):
+            violations.extend(validator.validate(vals))
+
+        violations.sort(key=lambda v: v.row_index)
+        return violations
+
+    def expect_valid(self, rows:Sequence[Sequence[Any]]) -> None:
+        """ Validate all rows and raise ValidationError if any violations found """
+        violations = self.validate(rows)
+        if violations:
+            raise ValidationError(violations)
@@ -0,0 +1,457 @@
+"""
+    sql.vectorize - Vectorized evaluation of the expressions over columnar values
+
+    The strings are compared case-insensitively (by `str.casefold`) by the comparison
+    operators and LIKE alike, as by the default `_ci` collations of MySQL.
+    ROUND rounds the exact values (int and Decimal) half away from zero, and the floats
+    half to even, as MySQL does for the exact and the approximate values.
+"""
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Union
+import decimal
+import functools
+import math
+import operator
+import re
+from sql.expression import AliasedExpr, Expr, FuncExpr, OpExpr, Value, Values
+from sql.objects import ColumnExpr
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# The columnar values: a list, or a NumPy array when NumPy is used
+Vector = Union[List[Any], 'np.ndarray']
+
+# The input columns: the column key to the column values
+Columns = Mapping[Any, Sequence[Any]]
+
+
+## ---- scalar implementations (SQL semantics on the Python values) ---- ##
+
+def _sql_null_safe(func:Callable[..., Any]) -> Callable[..., Any]:
+    """ Make the function return NULL if any of the arguments is NULL """
+    return lambda *args: None if any(arg is None for arg in args) else func(*args)
+
+def _div(a, b):
+    return None if b == 0 else a / b
+
+def _int_div(a, b):
+    return None if b == 0 else int(a / b)
+
+def _mod(a, b):
+    if b == 0:
+        return None
+    if isinstance(a, float) or isinstance(b, float):
+        return math.fmod(a, b)
+    return int(math.fmod(a, b))
+
+def _casefold(a):
+    return a.casefold() if isinstance(a, str) else a
+
+def _ci(compare:Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    """ Make the comparison case-insensitive for the strings (as the `_ci` collations) """
+    return lambda a, b: compare(_casefold(a), _casefold(b))
+
+def _and(a, b):
+    if a is not None and not a or b is not None and not b:
+        return False
+    if a is None or b is None:
+        return None
+    return True
+
+def _or(a, b):
+    if a is not None and a or b is not None and b:
+        return True
+    if a is None or b is None:
+        return None
+    return False
+
+@functools.lru_cache(maxsize=256)
+def _like_regex(pattern:str) -> 're.Pattern':
+    """ Convert the LIKE pattern into the regular expression """
+    regex = ''
+    escaped = False
+    for c in pattern:
+        if escaped:
+            regex += re.escape(c)
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '%':
+            regex += '.*'
+        elif c == '_':
+            regex += '.'
+        else:
+            regex += re.escape(c)
+    return re.compile(regex, re.DOTALL | re.IGNORECASE)
+
+def _like(a, b):
+    return _like_regex(b).fullmatch(str(a)) is not None
+
+def _sqrt(a):
+    return None if a < 0 else math.sqrt(a)
+
+# (The precision enough for the exact values of the floats)
+_round_context = decimal.Context(prec=1100, rounding=decimal.ROUND_HALF_UP)
+
+def _round(a, d=0):
+    """ Round the exact values half away from zero, and the floats half to even (as MySQL) """
+    d = int(d)
+    if isinstance(a, int) and d >= 0:
+        return a
+    if isinstance(a, float):
+        # rint() of the scaled value, as MySQL does for the doubles
+        scale = 10.0 ** abs(d)
+        return round(a * scale) / scale if d >= 0 else round(a / scale) * scale
+    rounded = _round_context.quantize(decimal.Decimal(a), decimal.Decimal(1).scaleb(-d))
+    if isinstance(a, decimal.Decimal):
+        return rounded
+    return int(rounded) if isinstance(a, int) else float(rounded)
+
+def _coalesce(*args):
+    for arg in args:
+        if arg is not None:
+            return arg
+    return None
+
+
+operators:Dict[str, Callable[[Any, Any], Any]] = {
+    '+'   : _sql_null_safe(operator.add),
+    '-'   : _sql_null_safe(operator.sub),
+    '*'   : _sql_null_safe(operator.mul),
+    '/'   : _sql_null_safe(_div),
+    'DIV' : _sql_null_safe(_int_div),
+    '%'   : _sql_null_safe(_mod),
+    'MOD' : _sql_null_safe(_mod),
+    '&'   : _sql_null_safe(operator.and_),
+    '|'   : _sql_null_safe(operator.or_),
+    '^'   : _sql_null_safe(operator.xor),
+    '<<'  : _sql_null_safe(operator.lshift),
+    '>>'  : _sql_null_safe(operator.rshift),
+    '='   : _sql_null_safe(_ci(operator.eq)),
+    '!='  : _sql_null_safe(_ci(operator.ne)),
+    '<>'  : _sql_null_safe(_ci(operator.ne)),
+    '<'   : _sql_null_safe(_ci(operator.lt)),
+    '<='  : _sql_null_safe(_ci(operator.le)),
+    '>'   : _sql_null_safe(_ci(operator.gt)),
+    '>='  : _sql_null_safe(_ci(operator.ge)),
+    '<=>' : _ci(operator.eq),
+    'IS'  : operator.is_,
+    'IS NOT': operator.is_not,
+    'AND' : _and,
+    '&&'  : _and,
+    'OR'  : _or,
+    '||'  : _or,
+    'XOR' : _sql_null_safe(lambda a, b: bool(a) != bool(b)),
+    'LIKE': _sql_null_safe(_like),
+    'NOT LIKE': _sql_null_safe(lambda a, b: not _like(a, b)),
+}
+
+functions:Dict[str, Callable[..., Any]] = {
+    'ABS'        : _sql_null_safe(abs),
+    'CEIL'       : _sql_null_safe(math.ceil),
+    'CEILING'    : _sql_null_safe(math.ceil),
+    'FLOOR'      : _sql_null_safe(math.floor),
+    'ROUND'      : _sql_null_safe(_round),
+    'SQRT'       : _sql_null_safe(_sqrt),
+    'LOWER'      : _sql_null_safe(str.lower),
+    'LCASE'      : _sql_null_safe(str.lower),
+    'UPPER'      : _sql_null_safe(str.upper),
+    'UCASE'      : _sql_null_safe(str.upper),
+    'TRIM'       : _sql_null_safe(str.strip),
+    'LTRIM'      : _sql_null_safe(str.lstrip),
+    'RTRIM'      : _sql_null_safe(str.rstrip),
+    'LENGTH'     : _sql_null_safe(lambda s: len(s.encode()) if isinstance(s, str) else len(s)),
+    'CHAR_LENGTH': _sql_null_safe(len),
+    'CONCAT'     : _sql_null_safe(lambda *args: ''.join(map(str, args))),
+    'COALESCE'   : _coalesce,
+    'IFNULL'     : _coalesce,
+    'IF'         : lambda cond, a, b: a if cond is not None and cond else b,
+    'GREATEST'   : _sql_null_safe(max),
+    'LEAST'      : _sql_null_safe(min),
+}
+
+
+## ---- NumPy implementations (for the numeric arrays without NULLs) ---- ##
+
+def _no_zero(a, b) -> bool:
+    return not np.any(b == 0)
+
+def _np_round(a, d=0):
+    """ Round the integers half away from zero, and the floats half to even (as MySQL) """
+    if np.ndim(d) != 0:
+        return None
+    d = int(d)
+    a = np.asarray(a)
+    if a.dtype.kind == 'f':
+        return np.round(a, d)
+    if d >= 0:
+        return a
+    scale = 10 ** -d
+    return np.sign(a) * ((np.abs(a) + scale // 2) // scale) * scale
+
+if np is not None:
+    # operator: (function, the condition of the arguments to use this function)
+    _np_operators:Dict[str, Any] = {
+        '+'   : (np.add, None),
+        '-'   : (np.subtract, None),
+        '*'   : (np.multiply, None),
+        '/'   : (np.true_divide, _no_zero),
+        'DIV' : (lambda a, b: np.trunc(np.true_divide(a, b)).astype(np.int64), _no_zero),
+        '%'   : (np.fmod, _no_zero),
+        'MOD' : (np.fmod, _no_zero),
+        '='   : (np.equal, None),
+        '<=>' : (np.equal, None),
+        '!='  : (np.not_equal, None),
+        '<>'  : (np.not_equal, None),
+        '<'   : (np.less, None),
+        '<='  : (np.less_equal, None),
+        '>'   : (np.greater, None),
+        '>='  : (np.greater_equal, None),
+        'AND' : (np.logical_and, None),
+        '&&'  : (np.logical_and, None),
+        'OR'  : (np.logical_or, None),
+        '||'  : (np.logical_or, None),
+        'XOR' : (np.logical_xor, None),
+    }
+    # function: (function, the condition of the arguments to use this function)
+    _np_functions:Dict[str, Any] = {
+        'ABS'     : (np.abs, None),
+        'CEIL'    : (np.ceil, None),
+        'CEILING' : (np.ceil, None),
+        'FLOOR'   : (np.floor, None),
+        'ROUND'   : (_np_round, None),
+        'SQRT'    : (np.sqrt, lambda a: not np.any(a < 0)),
+        'COALESCE': (lambda a, *_: a, None),
+        'IFNULL'  : (lambda a, *_: a, None),
+        'IF'      : (lambda cond, a, b: np.where(cond, a, b), None),
+        'GREATEST': (lambda *args: functools.reduce(np.maximum, args), None),
+        'LEAST'   : (lambda *args: functools.reduce(np.minimum, args), None),
+    }
+
+
+class _Const:
+    """ A constant value (broadcasted to all rows) """
+    __slots__ = ('value',)
+
+    def __init__(self, value:Any) -> None:
+        self.value = value
+
+
+_Node = Callable[[Columns, int], Union[List[Any], 'np.ndarray', _Const]]
+
+
+def _as_list(v:Union[Sequence[Any], _Const], n:int) -> List[Any]:
+    if isinstance(v, _Const):
+        return [v.value] * n
+    return to_list(v)
+
+
+def _as_array(v:Union[List[Any], 'np.ndarray', _Const]) -> Any:
+    """ Get the numeric array (or scalar) for the NumPy operation, or None if not available """
+    if isinstance(v, _Const):
+        if isinstance(v.value, (bool, int, float)):
+            return v.value
+        return None
+    if isinstance(v, list):
+        v = np.asarray(v)
+    return v if v.dtype.kind in 'biuf' else None
+
+
+def to_list(v:Sequence[Any]) -> List[Any]:
+    """ Get the values as a list (Convert the NumPy array into a list) """
+    if isinstance(v, list):
+        return v
+    if np is not None and isinstance(v, np.ndarray):
+        return v.tolist()
+    return list(v)
+
+
+class CompiledExpr:
+    """ The expression compiled into the vectorized evaluator
+
+        Call with the input columns (the column key to the values)
+        to get the values of the expression for each row.
+    """
+
+    def __init__(self, expr:Expr, node:_Node, columns:Dict[Any, Expr]) -> None:
+        self.expr = expr
+        self.node = node
+        self.columns = columns # The column key to the input expression
+
+    def __call__(self, columns:Columns, length:Optional[int] = None) -> Vector:
+        """ Evaluate the expression over the given columns
+            (`length` is required if the expression uses no columns)
+        """
+        if length is None:
+            if not self.columns:
+                raise RuntimeError('The length is required for the expression without columns.')
+            length = len(columns[next(iter(self.columns))])
+        result = self.node(columns, length)
+        if isinstance(result, _Const):
+            if np is not None and isinstance(result.value, (bool, int, float)):
+                return np.full(length, result.value)
+            return [result.value] * length
+        return result
+
+
+def compile_expr(
+    expr:Expr,
+    *,
+    column_key:Callable[[Expr], Any] = lambda expr: expr.path_name(),
+    as_column:Optional[Callable[[Expr], bool]] = None,
+    use_numpy:Optional[bool] = None,
+) -> CompiledExpr:
+    """ Compile the expression into the vectorized evaluator
+
+        The column expressions are looked up in the input columns by `column_key`
+        (In default, the dotted path name such as `Item.group.name`, which is the same
+        as the column name of the select results).
+        The other sub-expressions for which `as_column` returns True are also looked up
+        in the input columns instead of being evaluated.
+
+        NumPy is used for the numeric columns without NULLs if it is installed
+        (or `use_numpy` is True). Otherwise, the values are evaluated as lists.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    elif use_numpy and np is None:
+        raise RuntimeError('NumPy is not installed.')
+    columns:Dict[Any, Expr] = {}
+    return CompiledExpr(expr, _Compiler(column_key, as_column, use_numpy, columns).compile(expr), columns)
+
+
+def evaluate(expr:Expr, columns:Columns, length:Optional[int] = None, **options) -> Vector:
+    """ Evaluate the expression over the given columns (See `compile_expr` for the options) """
+    return compile_expr(expr, **options)(columns, length)
+
+
+class _Compiler:
+    """ Compile the expression tree into the tree of the node functions """
+
+    def __init__(self,
+        column_key:Callable[[Expr], Any],
+        as_column:Optional[Callable[[Expr], bool]],
+        use_numpy:bool,
+        columns:Dict[Any, Expr],
+    ) -> None:
+        self.column_key = column_key
+        self.as_column = as_column
+        self.use_numpy = use_numpy
+        self.columns = columns
+
+    def compile(self, expr:Expr) -> _Node:
+
+        if isinstance(expr, ColumnExpr) or (self.as_column is not None and self.as_column(expr)):
+            return self._column(expr)
+
+        if isinstance(expr, Value):
+            const = _Const(expr.v)
+            return lambda columns, n: const
+
+        if isinstance(expr, AliasedExpr):
+            return self.compile(expr.expr)
+
+        if isinstance(expr, OpExpr):
+            op = expr.op.upper()
+            if op in ('IN', 'NOT IN'):
+                return self._in(expr, op == 'NOT IN')
+            if op not in operators:
+                raise RuntimeError('Operator `{}` cannot be evaluated.'.format(expr.op))
+            return self._apply(
+                operators[op],
+                _np_operators.get(op) if self.use_numpy else None,
+                [self.compile(expr.larg), self.compile(expr.rarg)],
+            )
+
+        if isinstance(expr, FuncExpr):
+            name = expr.name.upper()
+            if name not in functions:
+                raise RuntimeError('Function `{}` cannot be evaluated.'.format(expr.name))
+            return self._apply(
+                functions[name],
+                _np_functions.get(name) if self.use_numpy else None,
+                [self.compile(arg) for arg in expr.args],
+            )
+
+        raise RuntimeError('Cannot evaluate {}.'.format(repr(expr)))
+
+    def _column(self, expr:Expr) -> _Node:
+        key = self.column_key(expr)
+        self.columns[key] = expr
+        if not self.use_numpy:
+            return lambda columns, n: _as_list(columns[key], n)
+
+        def _node(columns:Columns, n:int):
+            vals = columns[key]
+            if isinstance(vals, np.ndarray):
+                return vals
+            array = np.asarray(vals)
+            return array if array.dtype.kind in 'biuf' else to_list(vals)
+        return _node
+
+    def _apply(self, func:Callable[..., Any], np_func:Optional[Any], args:List[_Node]) -> _Node:
+        """ Make the node to apply the function to the values of the arguments """
+
+        def _node(columns:Columns, n:int):
+            vals = [arg(columns, n) for arg in args]
+
+            if all(isinstance(val, _Const) for val in vals):
+                return _Const(func(*(val.value for val in vals)))
+
+            if np_func is not None:
+                arrays = [_as_array(val) for val in vals]
+                if all(array is not None for array in arrays):
+                    f, cond = np_func
+                    if cond is None or cond(*arrays):
+                        result = f(*arrays)
+                        if result is not None:
+                            return result
+
+            if len(vals) == 2:
+                a, b = vals
+                if isinstance(b, _Const):
+                    b = b.value
+                    return [func(_a, b) for _a in _as_list(a, n)]
+                if isinstance(a, _Const):
+                    a = a.value
+                    return [func(a, _b) for _b in _as_list(b, n)]
+                return [func(_a, _b) for _a, _b in zip(_as_list(a, n), _as_list(b, n))]
+
+            if len(vals) == 1:
+                return [func(a) for a in _as_list(vals[0], n)]
+
+            return [func(*_args) for _args in zip(*(_as_list(val, n) for val in vals))]
+
+        return _node
+
+    def _in(self, expr:OpExpr, negate:bool) -> _Node:
+        if not isinstance(expr.rarg, Values) \
+                or not all(isinstance(v, Value) for v in expr.rarg.values):
+            raise RuntimeError('IN operator with non-constant values cannot be evaluated.')
+        vals = set(v.v for v in expr.rarg.values if v.v is not None)
+        has_null = len(vals) != len(expr.rarg.values)
+        larg = self.compile(expr.larg)
+        use_numpy = self.use_numpy and not has_null \
+            and all(isinstance(v, (bool, int, float)) for v in vals)
+
+        def _in(a):
+            if a is None:
+                return None
+            if a in vals:
+                return not negate
+            return None if has_null else negate
+
+        def _node(columns:Columns, n:int):
+            a = larg(columns, n)
+            if isinstance(a, _Const):
+                return _Const(_in(a.value))
+            if use_numpy:
+                array = _as_array(a)
+                if array is not None:
+                    return np.isin(array, list(vals), invert=negate)
+            return [_in(_a) for _a in _as_list(a, n)]
+
+        return _node
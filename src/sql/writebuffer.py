@@ -0,0 +1,215 @@
+"""
+    sql.writebuffer - Write-behind buffer of the insertions into a table
+
+    The rows appended from any threads are queued (a bounded queue, so that the appending
+    blocks when the writer falls behind), and inserted by a writer thread in multi-row
+    insertions when `max_rows` rows or `max_bytes` bytes are buffered, or `max_delay`
+    seconds have passed since the first buffered row.
+"""
+from typing import Any, Callable, List, Optional, Sequence, Union
+import logging
+import queue
+import threading
+import time
+from sql.objects import Column, ColumnName, Table
+
+logger = logging.getLogger(__name__)
+
+# Handler of the failed insertion (the error and the rows not inserted)
+ErrorHandler = Callable[[BaseException, List[Sequence[Any]]], Any]
+
+
+class _Flush:
+    """ Request to flush the buffered rows (the event is set when done, with `error` if the
+        writer thread stopped before)
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.error:Optional[BaseException] = None
+
+_CLOSE = object()
+
+
+def _row_bytes(row:Sequence[Any]) -> int:
+    """ Estimate the size of the row in the insertion """
+    return sum(len(v) if isinstance(v, (str, bytes, bytearray)) else 8 for v in row)
+
+
+class InsertBuffer:
+    """ Write-behind buffer of the insertions into a table (thread-safe) """
+
+    def __init__(self,
+        table:Table,
+        columns_or_names:Sequence[Union[ColumnName, Column]],
+        *,
+        max_rows:int = 1000,
+        max_bytes:int = 1 << 20,
+        max_delay:float = 1.0,
+        queue_size:int = 10000,
+        on_error:Optional[ErrorHandler] = None,
+    ) -> None:
+        """ The rows are inserted with a connection of the writer thread
+            (connected by `table.db.connector` if set, not to share the connection between
+            the threads, otherwise `table.db.connection`), and committed per insertion.
+            The failed insertions are passed to `on_error`, or kept in `errors` and logged
+            if not handled (and the first one is raised by `close`).
+            If the writer thread stops (by the failure to connect), the rows left in the
+            queue are failed in the same way, and `append` and `flush` raise after it.
+        """
+        self.table = table
+        self.columns = [table.to_self_column(c) for c in columns_or_names]
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.on_error = on_error
+        self.errors:List[BaseException] = []
+        self.rows = 0 # Inserted rows
+        self.flushes = 0 # Number of the insertions
+        self._queue:'queue.Queue[Any]' = queue.Queue(queue_size)
+        self._closed = False
+        self._stopped:Optional[BaseException] = None # The error stopped the writer thread
+        self._lock = threading.Lock() # Not to queue anything after `_CLOSE`
+        self._query = table.insertion_sql(self.columns)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, vals:Sequence[Any], *, block:bool = True, timeout:Optional[float] = None) -> None:
+        """ Append a row (blocks while the queue is full, or raises `queue.Full` if not `block`
+            or after `timeout` seconds)
+        """
+        if len(vals) != len(self.columns):
+            raise RuntimeError('The row has {} values for {} columns.'.format(len(vals), len(self.columns)))
+        with self._lock:
+            self._check_open()
+            self._queue.put(tuple(vals), block, timeout)
+
+    def flush(self, timeout:Optional[float] = None) -> bool:
+        """ Insert the rows appended so far, and wait for it (returns False on timeout) """
+        request = _Flush()
+        with self._lock:
+            self._check_open()
+            self._queue.put(request)
+        if not request.done.wait(timeout):
+            return False
+        if request.error is not None:
+            raise RuntimeError('The writer of the insert buffer into `{}` stopped.'.format(
+                self.table.name)) from request.error
+        return True
+
+    def close(self, timeout:Optional[float] = None) -> None:
+        """ Insert the remaining rows and stop the writer thread
+            (raises the first error of the insertions not handled by `on_error`)
+        """
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                if self._stopped is None:
+                    self._queue.put(_CLOSE)
+        self._thread.join(timeout)
+        if self.errors:
+            raise RuntimeError('{} insertions into `{}` failed.'.format(
+                len(self.errors), self.table.name)) from self.errors[0]
+
+    def __enter__(self) -> 'InsertBuffer':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError('The insert buffer is already closed.')
+        if self._stopped is not None:
+            raise RuntimeError('The writer of the insert buffer into `{}` stopped.'.format(
+                self.table.name)) from self._stopped
+
+    def _run(self) -> None:
+        db = self.table.db
+        try:
+            connection = db.connector.connect() if db.connector is not None else db.connection
+        except Exception as e:
+            logger.error('Connection of the insert buffer into `%s` failed: %s', self.table.name, e)
+            self.errors.append(e)
+            self._stop(e)
+            return
+        rows:List[Sequence[Any]] = []
+        try:
+            size = 0
+            deadline = 0.0
+            while True:
+                item:Any = None
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0) if rows else None)
+                except queue.Empty:
+                    pass # The delay is over
+
+                if isinstance(item, tuple):
+                    if not rows:
+                        deadline = time.monotonic() + self.max_delay
+                    rows.append(item)
+                    size += _row_bytes(item)
+                    if len(rows) < self.max_rows and size < self.max_bytes:
+                        continue
+
+                if rows:
+                    self._insert(connection, rows)
+                    rows, size = [], 0
+                if isinstance(item, _Flush):
+                    item.done.set()
+                if item is _CLOSE:
+                    return
+        except BaseException as e:
+            logger.error('Writer of the insert buffer into `%s` failed: %s', self.table.name, e)
+            self.errors.append(e)
+            self._stop(e, rows)
+            raise
+        finally:
+            if connection is not db.connection:
+                connection.close()
+
+    def _stop(self, error:BaseException, rows:Optional[List[Sequence[Any]]] = None) -> None:
+        """ Fail the rows and the flush requests left in the queue after the writer thread stops """
+        self._stopped = error
+        rows = list(rows or [])
+        self._drain(rows, error)
+        with self._lock: # Wait for the appending already passed the check
+            self._drain(rows, error)
+        if rows:
+            if self.on_error is not None:
+                self._failed(error, rows)
+            else: # The error is already kept
+                logger.error('%d rows not inserted into `%s`.', len(rows), self.table.name)
+
+    def _drain(self, rows:List[Sequence[Any]], error:BaseException) -> None:
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, tuple):
+                rows.append(item)
+            elif isinstance(item, _Flush):
+                item.error = error
+                item.done.set()
+
+    def _insert(self, connection:Any, rows:List[Sequence[Any]]) -> None:
+        try:
+            with connection.operate(self.table.db) as op:
+                op.execute(self._query, self.table.to_query_exec_vals(self.columns, rows), many=True)
+            connection.commit()
+            self.rows += len(rows)
+            self.flushes += 1
+            self.table.db.tables_committed(self.table)
+        except Exception as e:
+            self._failed(e, rows)
+
+    def _failed(self, e:BaseException, rows:List[Sequence[Any]]) -> None:
+        if self.on_error is not None:
+            try:
+                self.on_error(e, rows)
+                return
+            except Exception as handler_error:
+                e = handler_error # Kept not to stop the writer thread
+        logger.error('Insertion of %d rows into `%s` failed: %s', len(rows), self.table.name, e)
+        self.errors.append(e)
@@ -0,0 +1,69 @@
+from typing import Any, Callable, List, Optional
+import pytest
+
+
+class FakeOperation:
+    """ Operation of `FakeConnection` (records the queries) """
+
+    def __init__(self, con:'FakeConnection') -> None:
+        self.con = con
+        self.rowcount = 0
+        self.column_names:List[str] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, q, values=None, *, many:bool = False) -> List[Any]:
+        text = q.query_text()
+        values = list(values) if values is not None else None
+        self.con.log.append(text)
+        self.con.values.append(values)
+        if self.con.error is not None and self.con.error[0](text):
+            raise self.con.error[1]
+        rows = self.con.responder(text, values) if self.con.responder is not None else []
+        self.rowcount = self.con.rowcount if not rows else len(rows)
+        return rows
+
+    def execute_multi(self, q) -> None:
+        self.execute(q)
+
+    def fetch_batches(self, q, values=None, *, batch_size:int = 1000):
+        rows = self.execute(q, values)
+        for i in range(0, len(rows), batch_size):
+            yield rows[i:i + batch_size]
+
+
+class FakeConnection:
+    """ Connection recording the queries instead of executing them
+        The result rows are given by `responder(query_text, values)`, and `error` is
+        the pair of the predicate of the query text and the error to raise.
+    """
+
+    def __init__(self) -> None:
+        self.prepared = False
+        self.closed = False
+        self.log:List[str] = []
+        self.values:List[Optional[List[Any]]] = []
+        self.responder:Optional[Callable[[str, Optional[List[Any]]], List[Any]]] = None
+        self.error:Optional[tuple] = None
+        self.rowcount = 0
+
+    def operate(self, db, *, raw:bool = False) -> FakeOperation:
+        return FakeOperation(self)
+
+    def commit(self) -> None:
+        self.log.append('COMMIT')
+
+    def rollback(self) -> None:
+        self.log.append('ROLLBACK')
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def fake_connection() -> FakeConnection:
+    return FakeConnection()
@@ -1,20 +1,19 @@
+import sys
 from schema import SampleDB as db
 from connector import sample_connector
 
 def main():
     db.connect(sample_connector)
 
-    records = db.select([
+    result = db.prepare_select([
         db.Item.id,
         db.Item >> db.Group >> db.Category.name,
         db.Item >> db.Group.name,
         db.Item.name,
-    ])
+    ]).export(sys.stdout.buffer, format='tsv', header=False)
 
-    for record in records:
-        print('\t'.join(record))
+    print(result, file=sys.stderr)
 
 
 if __name__ == "__main__":
     main()
-
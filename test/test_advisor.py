@@ -0,0 +1,69 @@
+import pytest
+from sql.advisor import QueryShape, Workload, _candidates, advise
+from sql.datatypes import Int, VarChar
+from sql.objects import Column, Database, Index, Table
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Category', [Column('id', Int, is_primary=True), Column('name', VarChar(32))])
+    Table(db, 'Item', [
+        Column('id', Int, is_primary=True),
+        Column('category', Int, links=[db.table('Category').id]),
+        Column('name', VarChar(32)),
+        Column('price', Int),
+        Column('stock', Int),
+    ], indexes=[Index('category', 'price')])
+    db.finalize_tables()
+    db.connection = fake_connection
+    db.workload = Workload()
+    return db
+
+
+def test_query_shape(db):
+    Item, Category = db.table('Item'), db.table('Category')
+    select = db.prepare_select(
+        [Item['id'], (Item >> Category)['name']],
+        where=(Item['name'] == 'pen') & (Item['price'] > 10) & (Item['stock'] == Item['price']),
+        order=[(Item['stock'], 'ASC')],
+    )
+    shape = QueryShape.of_select(select)
+    assert shape.equality == [('Item', 'name')]
+    assert shape.range == [('Item', 'price')]
+    assert shape.joins == [('Category', 'id')]
+    assert shape.order == [('Item', 'stock')]
+    # The equality columns first, then a range column (the sort is not usable after a range)
+    assert list(_candidates(shape)) == [('Item', ['name', 'price']), ('Category', ['id'])]
+
+    shape = QueryShape(equality=[('Item', 'name')], order=[('Item', 'stock')])
+    assert list(_candidates(shape)) == [('Item', ['name', 'stock'])]
+
+
+def test_advise(db):
+    Item = db.table('Item')
+    for _ in range(3):
+        Item.select(['id'], where=(Item['name'] == 'pen') & (Item['price'] < 100))
+    Item.select(['id'], where=Item['name'] == 'pen')
+    Item.select(['id'], where=Item['category'] == 1) # Covered by the existing index
+    Item.select(['id'], where=Item['stock'] > 5, order=[(Item['stock'], 'DESC')])
+
+    recommendations = advise(db, db.workload)
+    assert [(r.table.name, r.column_names, r.queries) for r in recommendations] == [
+        ('Item', ['name', 'price'], 4), ('Item', ['stock'], 1),
+    ]
+    assert recommendations[0].benefit >= recommendations[1].benefit
+    assert recommendations[0].declaration() == "Index('name', 'price')"
+    assert recommendations[0].ddl('sqlite') == 'CREATE INDEX "Item_idx_name_price" ON "Item" ("name", "price")'
+
+
+def test_workload_file(db, tmp_path):
+    Item = db.table('Item')
+    Item.select(['id'], where=Item['stock'] == 1)
+    Item.select(['id'], where=Item['stock'] == 2)
+    path = tmp_path / 'workload.json'
+    db.workload.save(path)
+
+    workload = Workload.load(path, path)
+    shape, = workload.shapes.values()
+    assert (shape.equality, shape.count) == ([('Item', 'stock')], 4)
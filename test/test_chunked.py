@@ -0,0 +1,112 @@
+import pytest
+from common.extype import ExType
+from sql.datatypes import DataType, Int
+from sql.objects import Column, Database, Table
+
+KEYS = [1, 2, 3, 5, 8, 9, 10, 13, 14, 20]
+
+
+class KeyRanges:
+    """ Responder of the fake connection over the table of the keys (affecting all keys in the ranges) """
+
+    def __init__(self, keys) -> None:
+        self.keys = keys
+        self.ranges = [] # (lower, upper) of the executed statements
+        self.statements = []
+
+    def __call__(self, text, values):
+        if text.startswith('SELECT MAX('):
+            return [(max(self.keys) if self.keys else None,)]
+        has_lower = '`id` > %s' in text
+        if text.startswith('SELECT'):
+            *bounds, offset = values
+            lower, upper = bounds if has_lower else (None, bounds[0])
+            keys = self._keys(lower, upper)
+            return [(keys[offset],)] if offset < len(keys) else []
+        self.statements.append((text, values))
+        lower, upper = values[-2:] if has_lower else (None, values[-1])
+        self.ranges.append((lower, upper))
+        return [None] * len(self._keys(lower, upper))
+
+    def _keys(self, lower, upper):
+        return [k for k in self.keys if (lower is None or k > lower) and k <= upper]
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Item', [Column('id', Int, is_primary=True), Column('price', Int)])
+    db.finalize_tables()
+    db.connection = fake_connection
+    return db
+
+
+def test_chunk_bounds(db):
+    ranges = db.connection.responder = KeyRanges(KEYS)
+    chunks = []
+    result = db.table('Item').delete_chunked(None, chunk_size=3, progress=lambda p: chunks.append(p.last_key))
+    assert ranges.ranges == [(None, 3), (3, 9), (9, 14), (14, 20)]
+    assert chunks == [3, 9, 14, 20]
+    assert (result.chunks, result.rows, result.done) == (4, 10, True)
+    assert db.connection.log.count('COMMIT') == 4
+    assert ranges.statements[:2] == [
+        ('DELETE FROM `Item` WHERE `Item`.`id` <= %s', [3]),
+        ('DELETE FROM `Item` WHERE `Item`.`id` > %s AND `Item`.`id` <= %s', [3, 9]),
+    ]
+
+
+def test_update_with_condition(db):
+    ranges = db.connection.responder = KeyRanges(KEYS)
+    Item = db.table('Item')
+    Item.update_chunked({'price': 0}, Item['price'] > 10, chunk_size=5)
+    assert ranges.statements == [
+        ('UPDATE `Item` SET `price` = %s WHERE `Item`.`id` <= %s AND(`Item`.`price` > 10)', [0, 8]),
+        ('UPDATE `Item` SET `price` = %s WHERE `Item`.`id` > %s AND `Item`.`id` <= %s AND(`Item`.`price` > 10)', [0, 8, 20]),
+    ]
+
+
+def test_resume(db):
+    ranges = db.connection.responder = KeyRanges(KEYS)
+    saved = []
+
+    def interrupt(progress):
+        saved.append(progress.resume_options())
+        if progress.chunks == 2:
+            raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        db.table('Item').delete_chunked(None, chunk_size=2, progress=interrupt)
+    assert saved[-1] == {'start_after': 5, 'end_key': 20}
+
+    # The rows inserted after the start are not chased (up to the end key of the first run)
+    ranges.keys = KEYS + [21, 22]
+    db.connection.log.clear()
+    result = db.table('Item').delete_chunked(None, chunk_size=2, **saved[-1])
+    assert not any(text.startswith('SELECT MAX(') for text in db.connection.log)
+    assert ranges.ranges[2:] == [(5, 9), (9, 13), (13, 20)]
+    assert (result.start_after, result.last_key, result.rows, result.done) == (5, 20, 6, True)
+
+    # Nothing to do after the end
+    assert db.table('Item').delete_chunked(None, start_after=20, end_key=20).chunks == 0
+
+
+def test_adaptive_chunk_size(db):
+    db.connection.responder = KeyRanges(list(range(1, 101)))
+    sizes = []
+    db.table('Item').delete_chunked(
+        None, chunk_size=4, target_seconds=60, min_chunk_size=1, max_chunk_size=20,
+        progress=lambda p: sizes.append(p.chunk_size),
+    )
+    # The fast chunks grow twice at most per chunk, up to the maximum size
+    assert sizes[:4] == [4, 8, 16, 20]
+    assert sum(sizes) >= 100
+
+
+def test_key_not_comparable(fake_connection):
+    db = Database('DB')
+    Table(db, 'Doc', [Column('id', DataType('JSON', ExType(dict)), is_primary=True)])
+    db.finalize_tables()
+    db.connection = fake_connection
+    with pytest.raises(RuntimeError, match='not of a comparable type'):
+        db.table('Doc').delete_chunked(None)
+    assert fake_connection.log == []
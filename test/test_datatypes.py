@@ -0,0 +1,64 @@
+import datetime
+import decimal
+import pytest
+from sql.datatypes import Int, Double, Decimal, DecimalOf, Text, Blob, Date, DateTime, Time, decode_values
+
+
+def test_param_converter():
+    assert Int.param_converter() is None
+    assert Text.param_converter() is None
+    assert DateTime.param_converter(binary=True) is None
+    to_param = DateTime.param_converter()
+    assert to_param(datetime.datetime(2020, 1, 2, 3, 4, 5)) == '2020-01-02T03:04:05'
+    assert to_param(None) is None
+
+
+def test_result_decoder():
+    assert decode_values(Int.result_decoder(), [b'1', bytearray(b'-20'), None]) == [1, -20, None]
+    assert decode_values(Double.result_decoder(), [b'1.5']) == [1.5]
+    assert decode_values(Text.result_decoder(), [bytearray('abc'.encode())]) == ['abc']
+    assert bytes(Blob.result_decoder()(b'\x00\x01')) == b'\x00\x01'
+    assert Date.result_decoder()(bytearray(b'2020-01-02')) == datetime.date(2020, 1, 2)
+    decode_datetime = DateTime.result_decoder()
+    assert decode_datetime(b'2020-01-02 03:04:05') == datetime.datetime(2020, 1, 2, 3, 4, 5)
+    assert decode_datetime(b'2020-01-02 03:04:05') is decode_datetime(bytearray(b'2020-01-02 03:04:05'))
+
+
+def test_text_decoder():
+    assert Int.text_decoder()('-20') == -20
+    assert Double.text_decoder()('1.5') == 1.5
+    assert Text.text_decoder()('abc') == 'abc'
+    assert Blob.text_decoder()(Blob.text_encoder()(b'\x00\x01')) == b'\x00\x01'
+    assert Date.text_decoder()('2020-01-02') == datetime.date(2020, 1, 2)
+    assert DateTime.text_decoder()('2020-01-02 03:04:05') == datetime.datetime(2020, 1, 2, 3, 4, 5)
+
+
+def test_zero_dates():
+    assert decode_values(Date.result_decoder(), [b'0000-00-00', b'2020-00-10', b'2020-01-02']) == [
+        None, None, datetime.date(2020, 1, 2)]
+    assert DateTime.result_decoder()(b'0000-00-00 00:00:00') is None
+    assert Date.text_decoder()('0000-00-00') is None
+    with pytest.raises(ValueError):
+        Date.text_decoder()('2020-13-01')
+
+
+def test_time_outside_of_day():
+    decode = Time.result_decoder()
+    assert decode(b'12:34:56') == datetime.time(12, 34, 56)
+    assert decode(b'-01:00:00') == -datetime.timedelta(hours=1)
+    assert decode(b'838:59:59') == datetime.timedelta(hours=838, minutes=59, seconds=59)
+    assert Time.text_decoder()('24:00:00.5') == datetime.timedelta(hours=24, microseconds=500000)
+    encode = Time.text_encoder()
+    assert [encode(Time.text_decoder()(text)) for text in ('-01:00:00', '838:59:59', '24:00:00.500000', '12:00:00')] == [
+        '-01:00:00', '838:59:59', '24:00:00.500000', '12:00:00']
+    assert Time.pytype.invalid_indexes([datetime.time(1), datetime.timedelta(hours=-1), '01:00']) == [2]
+
+
+def test_decimal():
+    assert decode_values(Decimal.result_decoder(), [b'0.1', None, bytearray(b'12345678901234567890.12')]) == [
+        decimal.Decimal('0.1'), None, decimal.Decimal('12345678901234567890.12')]
+    assert Decimal.text_decoder()('-1.50') == decimal.Decimal('-1.50')
+    with pytest.raises(ValueError):
+        Decimal.text_decoder()('x')
+    assert (Decimal.type_sql(), DecimalOf(10, 2).type_sql()) == ('DECIMAL', 'DECIMAL(10, 2)')
+    assert DecimalOf(10, 2).pytype.basetype is decimal.Decimal
@@ -0,0 +1,101 @@
+import inspect
+from mysql.connector.cursor import MySQLCursor
+from sql.datatypes import Int
+from sql.deploy import creation_order
+from sql.executor import Operation
+from sql.expression import Query
+from sql.objects import Column, Database, Table
+
+
+def link(db:Database, *links:str) -> None:
+    """ Link the columns ('Table.column -> Table.column'), also to the tables declared later """
+    for link in links:
+        column_from, column_to = (
+            db.table(table_name).column_by_name(column_name)
+            for table_name, column_name in (name.split('.') for name in link.split(' -> '))
+        )
+        column_from.links.append(column_to)
+
+
+def database() -> Database:
+    """ Item -> Category, Shop; Shop -> Region; Category -> Category (self link) """
+    db = Database('DB')
+    Table(db, 'Item', [
+        Column('id', Int, is_primary=True),
+        Column('category', Int),
+        Column('shop', Int),
+    ])
+    Table(db, 'Category', [Column('id', Int, is_primary=True), Column('parent', Int, nullable=True)])
+    Table(db, 'Shop', [Column('id', Int, is_primary=True), Column('region', Int)])
+    Table(db, 'Region', [Column('id', Int, is_primary=True)])
+    link(db, 'Item.category -> Category.id', 'Item.shop -> Shop.id', 'Category.parent -> Category.id', 'Shop.region -> Region.id')
+    db.finalize_tables()
+    return db
+
+
+def test_creation_order():
+    names = [table.name for table in creation_order(database())]
+    assert sorted(names) == ['Category', 'Item', 'Region', 'Shop']
+    assert names.index('Category') < names.index('Item')
+    assert names.index('Region') < names.index('Shop') < names.index('Item')
+
+
+def test_creation_order_circular():
+    db = Database('DB')
+    Table(db, 'A', [Column('id', Int, is_primary=True), Column('b', Int, nullable=True)])
+    Table(db, 'B', [Column('id', Int, is_primary=True), Column('a', Int, nullable=True)])
+    link(db, 'A.b -> B.id', 'B.a -> A.id')
+    db.finalize_tables()
+    # The declaration order
+    assert [table.name for table in creation_order(db)] == ['A', 'B']
+
+
+def test_create_tables(fake_connection):
+    db = database()
+    db.connection = fake_connection
+    db.connection.responder = lambda text, values: [('Region',)] if 'INFORMATION_SCHEMA.TABLES' in text else []
+    created = db.create_tables(batch_size=2)
+    assert [table.name for table in created] == [
+        table.name for table in creation_order(db) if table.name != 'Region'
+    ]
+    statements = db.connection.log[1:]
+    assert len(statements) == 2
+    assert [statement.count('CREATE TABLE') for statement in statements] == [2, 1]
+    assert statements[-1].startswith('CREATE TABLE `Item`')
+    assert all('CREATE TABLE `Region`' not in statement for statement in statements)
+
+
+class SignatureCursor:
+    """ Cursor of the real signature of `execute` of the driver, returning the result sets """
+
+    signature = inspect.signature(MySQLCursor.execute)
+
+    def __init__(self, result_sets) -> None:
+        self.result_sets = result_sets
+        self.executed = []
+
+    def execute(self, *args, **kwargs):
+        self.signature.bind(self, *args, **kwargs) # TypeError for the removed parameters
+        self.executed.append(args[0])
+        self.with_rows = self.result_sets.pop(0)
+
+    def fetchall(self):
+        self.with_rows = False
+        return []
+
+    def nextset(self):
+        if not self.result_sets:
+            return None
+        self.with_rows = self.result_sets.pop(0)
+        return True
+
+    def close(self):
+        pass
+
+
+def test_execute_multi_cursor():
+    op = Operation(None, None)
+    op._cur = cursor = SignatureCursor([False, True, False])
+    op.execute_multi(Query('CREATE TABLE a (x INT)', ';', 'SELECT 1', ';', 'DROP TABLE a'))
+    assert cursor.executed == ['CREATE TABLE a (x INT) ; SELECT 1 ; DROP TABLE a']
+    assert cursor.result_sets == [] # All the results are consumed
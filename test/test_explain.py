@@ -0,0 +1,116 @@
+import json
+import pytest
+from sql.datatypes import Int, VarChar
+from sql.explain import (
+    FILESORT, FULL_SCAN, UNINDEXED_JOIN, SlowQueryThrottle, parse_analyze_plan, parse_json_plan, query_fingerprint,
+)
+from sql.objects import Column, Database, Table
+
+JSON_PLAN = {
+    'query_block': {
+        'select_id': 1,
+        'ordering_operation': {
+            'using_filesort': True,
+            'nested_loop': [
+                {'table': {
+                    'table_name': 'Item', 'access_type': 'ALL', 'possible_keys': ['idx_category'],
+                    'rows_examined_per_scan': 1000, 'filtered': '10.00', 'attached_condition': '(`Item`.`price` > 10)',
+                }},
+                {'table': {
+                    'table_name': 'Category', 'access_type': 'ALL', 'rows_examined_per_scan': 20,
+                    'filtered': '100.00', 'using_join_buffer': 'hash join',
+                }},
+            ],
+        },
+    },
+}
+
+ANALYZE_PLAN = '''\
+-> Sort: Item.price  (actual time=5.1..5.2 rows=100 loops=1)
+    -> Inner hash join (Category.id = Item.category)  (cost=120.5 rows=100) (actual time=0.5..4.8 rows=100 loops=1)
+        -> Table scan on Item  (cost=101.0 rows=1000) (actual time=0.1..3.9 rows=1000 loops=1)
+        -> Hash
+            -> Table scan on Category  (cost=2.2 rows=20) (actual time=0.05..0.1 rows=20 loops=1)
+-> Index lookup on `Item` using `idx_category` (category=1)  (cost=0.35 rows=3) (actual time=0.01..0.02 rows=2 loops=100)
+'''
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Category', [Column('id', Int, is_primary=True), Column('name', VarChar(32))])
+    Table(db, 'Item', [
+        Column('id', Int, is_primary=True),
+        Column('category', Int, links=[db.table('Category').id]),
+        Column('price', Int),
+    ])
+    db.finalize_tables()
+    db.connection = fake_connection
+    db.connection.responder = lambda text, values: [(json.dumps(JSON_PLAN),)] if text.startswith('EXPLAIN') else []
+    return db
+
+
+def test_parse_json_plan():
+    plan = parse_json_plan(json.dumps(JSON_PLAN), 'SELECT 1')
+    assert [(table.name, table.access_type) for table in plan.tables] == [('Item', 'ALL'), ('Category', 'ALL')]
+    item = plan.table('Item')
+    assert (item.rows, item.filtered, item.possible_keys) == (1000, 10.0, ['idx_category'])
+    assert item.condition == '(`Item`.`price` > 10)'
+    assert plan.table('Category').join_buffer == 'hash join'
+    assert plan.filesort and not plan.temporary
+    assert not plan.analyzed and plan.query_text == 'SELECT 1'
+
+
+def test_parse_analyze_plan():
+    plan = parse_analyze_plan(ANALYZE_PLAN)
+    assert [(table.name, table.access_type, table.key) for table in plan.tables] == [
+        ('Item', 'ALL', None), ('Category', 'ALL', None), ('Item', 'ref', 'idx_category'),
+    ]
+    item, category, lookup = plan.tables
+    assert (item.rows, item.actual_rows, item.actual_time, item.loops) == (1000, 1000, 3.9, 1)
+    # Only the tables after the first one in the hash join are joined by the join buffer
+    assert (item.join_buffer, category.join_buffer, lookup.join_buffer) == (None, 'hash join', None)
+    assert (lookup.rows, lookup.actual_rows, lookup.loops) == (3, 2, 100)
+    assert plan.filesort and plan.analyzed
+
+
+def test_explain_issues(db):
+    Item = db.table('Item')
+    select = db.prepare_select([Item['id'], (Item >> db.table('Category'))['name']], where=Item['price'] > 10)
+    plan = select.explain()
+    assert db.connection.log[0].startswith('EXPLAIN FORMAT=JSON SELECT')
+    assert [issue.kind for issue in plan.issues] == [FULL_SCAN, UNINDEXED_JOIN, FILESORT]
+    assert plan.issues[0].source is Item
+
+
+def test_query_fingerprint():
+    assert query_fingerprint("SELECT `a` FROM `t1` WHERE (`b` = 'x''y') AND (`c` > 1.5e3)") == \
+        'SELECT `a` FROM `t1` WHERE (`b` = ?) AND (`c` > ?)'
+    assert query_fingerprint('SELECT * FROM `t` WHERE `id` IN (1, 2, 3)') == \
+        query_fingerprint('SELECT * FROM `t` WHERE `id` IN (4,5)') == 'SELECT * FROM `t` WHERE `id` IN (?+)'
+
+
+def test_slow_query_throttle():
+    throttle = SlowQueryThrottle(10, max_fingerprints=2)
+    assert throttle.acquire('a', now=0) == 0
+    assert throttle.acquire('a', now=5) is None
+    assert throttle.acquire('a', now=6) is None
+    assert throttle.acquire('b', now=6) == 0
+    assert throttle.acquire('a', now=10) == 2
+    # The expired fingerprints are dropped when too many
+    assert throttle.acquire('c', now=17) == 0
+    assert sorted(throttle._reported_at) == ['a', 'c']
+
+
+def test_slow_select_explained_once(db):
+    reported = []
+    db.slow_query_seconds = 0
+    db.slow_query_handler = lambda select, seconds, plan: reported.append(plan)
+    Item = db.table('Item')
+    for price in (10, 20, 30):
+        Item.select(['id'], where=Item['price'] > price)
+    assert len(reported) == 1
+    assert sum(text.startswith('EXPLAIN') for text in db.connection.log) == 1
+
+    Item.select(['id', 'price'])
+    assert len(reported) == 2
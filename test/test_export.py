@@ -0,0 +1,80 @@
+import gzip
+import io
+import json
+import pytest
+from sql.datatypes import Int, VarBinary, VarChar
+from sql.objects import Column, Database, Table
+
+# The raw values of the text protocol
+RAW_ROWS = [
+    (b'1', b'plain', b'\x01\x02'),
+    (b'2', b'\\N', None),
+    (b'3', None, b''),
+    (b'4', b'tab\there\nand \\ back', b'\xff'),
+    (b'5', b'', b'\x00'),
+]
+
+# The decoded values of the binary protocol
+ROWS = [
+    (1, 'plain', b'\x01\x02'),
+    (2, '\\N', None),
+    (3, None, b''),
+    (4, 'tab\there\nand \\ back', b'\xff'),
+    (5, '', b'\x00'),
+]
+
+
+@pytest.fixture(params=[False, True], ids=['text', 'binary'])
+def db(request, fake_connection):
+    db = Database('DB')
+    Table(db, 'Item', [
+        Column('id', Int, is_primary=True),
+        Column('name', VarChar(32), nullable=True),
+        Column('data', VarBinary(8), nullable=True),
+    ])
+    db.finalize_tables()
+    fake_connection.prepared = request.param
+    fake_connection.responder = lambda text, values: list(ROWS if request.param else RAW_ROWS)
+    db.connection = fake_connection
+    return db
+
+
+def export(db, format, **options) -> bytes:
+    fp = io.BytesIO()
+    result = db.table('Item').prepare_select().export(fp, format, batch_size=2, **options)
+    assert result.rows == 5 and result.bytes_written == len(fp.getvalue())
+    return fp.getvalue()
+
+
+def test_tsv(db):
+    lines = export(db, 'tsv').decode().split('\n')
+    assert lines == [
+        'Item.id\tItem.name\tItem.data',
+        '1\tplain\t0102',
+        '2\t\\\\N\t\\N',
+        '3\t\\N\t',
+        '4\ttab\\there\\nand \\\\ back\tff',
+        '5\t\t00',
+        '',
+    ]
+
+
+def test_csv(db):
+    assert export(db, 'csv', header=False).decode().split('\n') == [
+        '1,plain,0102',
+        '2,\\N,',
+        '3,,',
+        '4,"tab\there',
+        'and \\ back",ff',
+        '5,,00',
+        '',
+    ]
+
+
+def test_ndjson(db):
+    db.connection.responder = lambda text, values: list(ROWS) # (Decoded by the driver for NDJSON)
+    lines = export(db, 'ndjson', compress=True)
+    records = [json.loads(line) for line in gzip.decompress(lines).decode().splitlines()]
+    assert records[1] == {'Item.id': 2, 'Item.name': '\\N', 'Item.data': None}
+    assert records[3]['Item.name'] == 'tab\there\nand \\ back'
+    assert [record['Item.data'] for record in records] == ['0102', None, '', 'ff', '00']
@@ -0,0 +1,27 @@
+import decimal
+from common.extype import ExType, RangedType, LenLimitedType
+
+
+def test_invalid_indexes():
+    tinyint = RangedType(int, range(-128, 128))
+    assert tinyint.invalid_indexes([]) == []
+    assert tinyint.invalid_indexes([1, -128, 127]) == []
+    assert tinyint.invalid_indexes([1, 128, -129, 5]) == [1, 2]
+    assert tinyint.invalid_indexes([1, 'a', 2.5, 3]) == [1, 2]
+
+    char4 = LenLimitedType(str, 4)
+    assert char4.invalid_indexes(['abc', '', 'abcd']) == []
+    assert char4.invalid_indexes(['abc', 'abcde', b'ab']) == [1, 2]
+
+    real = ExType(float)
+    assert real.invalid_indexes([1.5, 2.0]) == []
+    assert real.invalid_indexes([1.5, '2.0']) == [1]
+    assert real.invalid_indexes([1.5, 2]) == [1]
+
+    number = ExType(float, other_types=[int, decimal.Decimal])
+    assert number.invalid_indexes([1.5, 2, decimal.Decimal('2.25')]) == []
+    assert number.invalid_indexes([1.5, '2']) == [1]
+    assert number.is_valid(3) and not number.is_valid(None)
+
+    vals = [1, 200, 'x', -5]
+    assert tinyint.invalid_indexes(vals) == [i for i, val in enumerate(vals) if not tinyint.is_valid(val)]
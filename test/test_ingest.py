@@ -0,0 +1,85 @@
+import datetime
+import io
+import pytest
+from sql.datatypes import Date, Int, VarChar
+from sql.ingest import _first_record_end, _record_boundary, parse_chunk, read_chunks
+from sql.objects import Column, Database, Table
+from sql.validation import ValidationError
+
+db = Database('DB')
+Event = Table(db, 'Event', [
+    Column('id', Int, is_primary=True),
+    Column('name', VarChar(10), nullable=True),
+    Column('day', Date),
+])
+db.finalize_tables()
+
+CSV = b'''id,name,day
+1,a,2020-01-02
+2,"multi
+line",2020-01-03
+3,,2020-01-04
+4,"x,""y""",2020-01-05
+'''
+
+
+def import_rows(data, format='csv', **options):
+    written = []
+    result = Event.import_file(io.BytesIO(data), format, processes=0, write=written.extend, **options)
+    assert result.rows == len(written)
+    return written, result
+
+
+def test_record_boundaries():
+    data = b'1,"a\nb"\n2,"c\nd'
+    assert _record_boundary(data, 'csv') == data.index(b'\n2') + 1
+    assert _record_boundary(data, 'tsv') == data.rindex(b'\n') + 1
+    assert _record_boundary(b'1,"a\nb', 'csv') == -1
+    assert _first_record_end(b'1,"a\nb"\n2', 'csv') == 8
+    assert _first_record_end(b'1,"a\nb', 'csv') == 6
+
+    chunks = list(read_chunks(io.BytesIO(CSV), 'csv', chunk_size=7))
+    assert b''.join(chunks) == CSV
+    assert all(chunk.endswith(b'\n') and chunk.count(b'"') % 2 == 0 for chunk in chunks)
+
+
+def test_import_csv():
+    rows, result = import_rows(CSV, chunk_size=16)
+    assert rows == [
+        [1, 'a', datetime.date(2020, 1, 2)],
+        [2, 'multi\nline', datetime.date(2020, 1, 3)],
+        [3, None, datetime.date(2020, 1, 4)],
+        [4, 'x,"y"', datetime.date(2020, 1, 5)],
+    ]
+    assert result.batches > 1 and not result.violations
+
+    # The empty strings are kept with another NULL
+    rows, _ = import_rows(CSV.replace(b'1,a,', b'1,\\N,'), null='\\N')
+    assert [row[1] for row in rows] == [None, 'multi\nline', '', 'x,"y"']
+
+
+def test_import_tsv():
+    data = b'id\tname\tday\n1\t\\\\N\t2020-01-02\n2\t\\N\t2020-01-03\n3\ttab\\there\t2020-01-04\n'
+    rows, _ = import_rows(data, 'tsv')
+    assert [row[1] for row in rows] == ['\\N', None, 'tab\there']
+
+
+def test_invalid_rows():
+    data = b'1,a,2020-01-02\n2,much too long name,2020-01-03\nx,b,2020-01-04\n4,c\n5,d,\n'
+    with pytest.raises(ValidationError) as e:
+        import_rows(data, header=False)
+    assert [v.row_index for v in e.value.violations] == [1, 2, 3, 4]
+
+    rows, result = import_rows(data, header=False, on_error='skip')
+    assert rows == [[1, 'a', datetime.date(2020, 1, 2)]]
+    assert [(v.row_index, v.column.name if v.column is not None else None) for v in result.violations] == [
+        (1, 'name'), (2, 'id'), (3, None), (4, 'day'),
+    ]
+
+
+def test_parse_chunk():
+    specs = [(Int, False), (VarChar(8), True)]
+    rows, violations = parse_chunk(b'1,a\n2,\n', specs)
+    assert rows == [[1, 'a'], [2, None]] and violations == []
+    rows, violations = parse_chunk(b'1,a\n,b\n', specs, null='NULL')
+    assert violations == [(1, 0, '', 'Cannot parse as INT')]
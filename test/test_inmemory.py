@@ -0,0 +1,83 @@
+import pytest
+from sql.datatypes import Int, VarChar
+from sql.expression import FuncExpr
+from sql.inmemory import InMemoryEngine
+from sql.objects import Column, Database, Table
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Category', [Column('id', Int, is_primary=True), Column('name', VarChar(32))])
+    Table(db, 'Item', [
+        Column('id', Int, is_primary=True),
+        Column('category', Int, nullable=True, links=[db.table('Category').id]),
+        Column('name', VarChar(32)),
+        Column('price', Int, nullable=True),
+    ])
+    db.finalize_tables()
+    db.connection = fake_connection
+    db.memory_engine = engine = InMemoryEngine()
+    engine.load(db.table('Category'), [(1, 'Food'), (2, 'Office'), (3, 'Empty')])
+    engine.load(db.table('Item'), [
+        (1, 1, 'apple', 120),
+        (2, 1, 'banana', None),
+        (3, 2, 'pen', 80),
+        (4, 2, 'desk', 9000),
+        (5, None, 'unknown', 10),
+        (6, 1, 'cherry', 300),
+    ])
+    return db
+
+
+def test_where_order_limit(db):
+    Item = db.table('Item')
+    select = db.prepare_select(
+        [Item['name'], Item['price']],
+        where=Item['price'] > 50,
+        order=[(Item['price'], 'DESC')],
+        count=2, offset=1,
+    )
+    assert db.memory_engine.covers(select)
+    assert [tuple(record) for record in select.exec().result] == [('cherry', 300), ('apple', 120)]
+    assert db.connection.log == []
+
+
+def test_nulls_first_in_ascending_order(db):
+    Item = db.table('Item')
+    select = db.prepare_select([Item['name']], order=[(Item['price'], 'ASC'), (Item['name'], 'ASC')], count=2)
+    assert [record[0] for record in db.memory_engine.execute(select)] == ['banana', 'unknown']
+
+
+def test_join_inner(db):
+    Item, Category = db.table('Item'), db.table('Category')
+    select = db.prepare_select(
+        [Item['name'], (Item >> Category)['name']],
+        where=(Item >> Category)['name'] == 'Office',
+        order=[(Item['id'], 'ASC')],
+    )
+    # The item without the category is not joined
+    assert [tuple(record) for record in db.memory_engine.execute(select)] == [('pen', 'Office'), ('desk', 'Office')]
+
+
+def test_group_having(db):
+    Item, Category = db.table('Item'), db.table('Category')
+    name = (Item >> Category)['name']
+    select = db.prepare_select(
+        [name, FuncExpr('COUNT', Item['price']), FuncExpr('SUM', Item['price']), FuncExpr('MAX', Item['price'])],
+        group=[name],
+        having=FuncExpr('COUNT', Item['id']) > 2,
+    )
+    assert [tuple(record) for record in db.memory_engine.execute(select)] == [('Food', 2, 420, 300)]
+
+    select = db.prepare_select([FuncExpr('COUNT', Item['id']), FuncExpr('AVG', Item['price'])])
+    assert [tuple(record) for record in db.memory_engine.execute(select)] == [(6, 9510 / 5)]
+
+
+def test_not_loaded(db):
+    db.memory_engine.discard(db.table('Category'))
+    Item, Category = db.table('Item'), db.table('Category')
+    select = db.prepare_select([(Item >> Category)['name']])
+    assert not db.memory_engine.covers(select)
+    with pytest.raises(RuntimeError):
+        db.memory_engine.execute(select)
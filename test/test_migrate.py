@@ -0,0 +1,71 @@
+from sql.datatypes import Int, VarChar
+from sql.migrate import COPY, INPLACE, INSTANT, TableMigration, table_changes
+from sql.objects import Column, Database, Index, Table
+
+
+def live_column(name, type, *, nullable=False, default=None, auto_increment=False):
+    return {'name': name, 'type': type, 'nullable': nullable, 'default': default,
+            'default_generated': False, 'auto_increment': auto_increment}
+
+
+def live_table(*columns, indexes=()):
+    return {'columns': list(columns), 'primary': ['id'], 'indexes': list(indexes), 'links': []}
+
+
+def item_table(*columns, indexes=()):
+    db = Database('DB')
+    table = Table(db, 'Item', [Column('id', Int, is_primary=True), Column('name', VarChar(32)), *columns], indexes=indexes)
+    db.finalize_tables()
+    return table
+
+
+LIVE = live_table(live_column('id', 'int'), live_column('name', 'varchar(32)'))
+
+
+def statements(migration):
+    return [q.query_text() for q in migration.queries()]
+
+
+def test_no_changes():
+    assert table_changes(item_table(), LIVE) == []
+
+
+def test_instant_add_column():
+    table = item_table(Column('note', VarChar(16), nullable=True))
+    migration = TableMigration(table, table_changes(table, LIVE), rows=1000)
+    assert (migration.algorithm, migration.rebuild, migration.cost) == (INSTANT, False, 0)
+    assert statements(migration) == ['ALTER TABLE `Item` ADD COLUMN `note` VARCHAR(16), ALGORITHM=INSTANT']
+
+
+def test_instant_changes_split_from_inplace():
+    table = item_table(Column('note', VarChar(16), nullable=True), indexes=[Index('name')])
+    migration = TableMigration(table, table_changes(table, LIVE), rows=1000)
+    assert (migration.algorithm, migration.rebuild, migration.cost) == (INPLACE, False, 1000)
+    queries = statements(migration)
+    assert len(queries) == 2
+    assert 'ADD COLUMN' in queries[0] and queries[0].endswith('ALGORITHM=INSTANT')
+    assert 'ADD INDEX' in queries[1] and queries[1].endswith('ALGORITHM=INPLACE, LOCK=NONE')
+
+    # Merged into the rebuild
+    live = live_table(live_column('id', 'int'), live_column('name', 'varchar(32)', nullable=True))
+    migration = TableMigration(table, table_changes(table, live), rows=1000)
+    assert migration.rebuild and len(migration.queries()) == 1
+
+
+def test_add_auto_increment_column_locks():
+    table = item_table(Column('seq', Int, auto_increment=True))
+    migration = TableMigration(table, table_changes(table, LIVE))
+    assert migration.algorithm == INPLACE and migration.rebuild
+    assert statements(migration)[0].endswith('ALGORITHM=INPLACE, LOCK=SHARED')
+
+
+def test_column_changes():
+    live = live_table(live_column('id', 'int'), live_column('name', 'varchar(16)', default='x'))
+    table = item_table()
+    migration = TableMigration(table, table_changes(table, live))
+    assert migration.algorithm == INPLACE and not migration.rebuild # VARCHAR extension
+
+    live = live_table(live_column('id', 'int'), live_column('name', 'int'), live_column('old', 'int'))
+    changes = table_changes(table, live)
+    assert [change.algorithm for change in changes] == [COPY, INPLACE]
+    assert TableMigration(table, changes).algorithm == COPY
@@ -0,0 +1,201 @@
+import datetime
+import pytest
+from sql.datatypes import Date, DateTime, DecimalOf, Int, Text, Time, UnsignedInt, VarChar
+from sql.objects import Column, Database, Index, Table
+
+
+class CaseInsensitiveTables:
+    """ Responder of the fake connection storing the inserted rows, and comparing the strings
+        case-insensitively as the `_ci` collations
+    """
+
+    def __init__(self, columns) -> None:
+        self.columns = columns # The table name to the number of the columns
+        self.rows = {name: [] for name in columns}
+
+    @staticmethod
+    def _normalize(v):
+        return v.casefold() if isinstance(v, str) else v
+
+    def __call__(self, text, values):
+        table = text.split('JOIN `' if text.startswith('SELECT') else 'INTO `')[1].split('`')[0]
+        n = self.columns[table]
+        if text.startswith('SELECT'):
+            # The positions and the values of the records
+            result = []
+            for i in range(0, len(values), n + 1):
+                pos, *record = values[i:i + n + 1]
+                for key, row in enumerate(self.rows[table], 1):
+                    if [self._normalize(v) for v in row] == [self._normalize(v) for v in record]:
+                        result.append((pos, key))
+            return result
+        if text.startswith('INSERT'):
+            self.rows[table].extend(values)
+        return []
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Category', [Column('id', Int, is_primary=True), Column('name', VarChar(32))])
+    Table(db, 'Item', [
+        Column('id', Int, is_primary=True),
+        Column('category', Int, nullable=True, links=[db.table('Category').id]),
+        Column('name', VarChar(32)),
+    ])
+    db.finalize_tables()
+    db.connection = fake_connection
+    return db
+
+
+def test_insert_across_linked_tables(db):
+    Category, Item = db.table('Category'), db.table('Item')
+    tables = db.connection.responder = CaseInsensitiveTables({'Category': 1, 'Item': 2})
+    tables.rows['Category'].append(('Food',))
+
+    inserted = db.insert([Item['name'], (Item >> Category)['name']], [
+        ('apple', 'FOOD'), ('pen', 'Office'), ('desk', 'Office'), ('x', None),
+    ])
+    # 'FOOD' is the existing 'Food' by the collation (not inserted again)
+    assert inserted == {'Category': 1, 'Item': 4}
+    assert tables.rows['Category'] == [('Food',), ('Office',)]
+    assert tables.rows['Item'] == [('apple', 1), ('pen', 2), ('desk', 2), ('x', None)]
+
+
+def test_select_keys_chunked(db):
+    Category = db.table('Category')
+    Category.SELECT_KEYS_CHUNK_SIZE = 2
+    tables = db.connection.responder = CaseInsensitiveTables({'Category': 1})
+    tables.rows['Category'].extend([('a',), ('b',), ('c',)])
+    keys = Category.select_key_with_insertion([Category['name']], [('A',), ('b',), ('C',), ('d',), ('b',)])
+    assert keys == {('A',): 1, ('b',): 2, ('C',): 3, ('d',): 4}
+    assert sum(text.startswith('SELECT') for text in db.connection.log) == 3
+    assert db.connection.log[0] == (
+        'SELECT `_records`.`_pos`, `Category`.`id` FROM (VALUES ROW(%s, %s), ROW(%s, %s)) AS `_records`(`_pos`, `_v0`)'
+        ' JOIN `Category` ON `Category`.`name` <=> `_records`.`_v0`'
+    )
+    assert db.connection.values[0] == [0, 'A', 1, 'b']
+
+
+def test_creation_sql():
+    db = Database('DB')
+    Table(db, 'Category', [Column('id', Int, is_primary=True)])
+    Item = Table(db, 'Item', [
+        Column('id', UnsignedInt, is_primary=True, auto_increment=True),
+        Column('category', Int, nullable=True, links=[db.table('Category').id]),
+        Column('code', VarChar(16), is_unique=True),
+        Column('price', DecimalOf(10, 2), index=True),
+        Column('note', Text, nullable=True),
+    ], indexes=[Index('price', ('note', 32), name='idx_price_note'), Index('note')])
+    db.finalize_tables()
+    assert Item.creation_sql().query_text() == (
+        'CREATE TABLE `Item`('
+        '`id` INT UNSIGNED NOT NULL PRIMARY KEY AUTO_INCREMENT, '
+        '`category` INT, '
+        '`code` VARCHAR(16) NOT NULL UNIQUE KEY, '
+        '`price` DECIMAL(10, 2) NOT NULL, '
+        '`note` TEXT, '
+        'INDEX `idx_price_note`(`price`, `note`(32)), '
+        'INDEX `idx_note`(`note`(255)), '
+        'INDEX `idx_category`(`category`), '
+        'INDEX `idx_price`(`price`))'
+    )
+
+
+def test_unique_text_needs_prefix():
+    db = Database('DB')
+    with pytest.raises(RuntimeError):
+        Table(db, 'A', [Column('id', Int, is_primary=True), Column('t', Text)], indexes=[Index('t', unique=True)])
+    with pytest.raises(RuntimeError):
+        Table(db, 'B', [Column('id', Int, is_primary=True), Column('t', Text, is_unique=True)])
+    table = Table(db, 'C', [Column('id', Int, is_primary=True), Column('t', Text)], indexes=[Index(('t', 64), unique=True)])
+    assert table.indexes[0].prefixes == [64]
+
+
+def test_update_many_case(db):
+    Category = db.table('Category')
+    db.connection.rowcount = 2
+    assert Category.update_many(['name'], {1: ('Food',), 2: ('Office',), 3: ('Misc',)}, chunk_size=2, commit=True) == [2, 2]
+    assert db.connection.log == [
+        'UPDATE `Category` SET `Category`.`name` = CASE `Category`.`id` WHEN %s THEN %s WHEN %s THEN %s'
+        ' ELSE `Category`.`name` END WHERE `Category`.`id` IN (%s, %s)',
+        'COMMIT',
+        'UPDATE `Category` SET `Category`.`name` = CASE `Category`.`id` WHEN %s THEN %s'
+        ' ELSE `Category`.`name` END WHERE `Category`.`id` IN (%s)',
+        'COMMIT',
+    ]
+    assert db.connection.values == [[1, 'Food', 2, 'Office', 1, 2], [3, 'Misc', 3]]
+
+
+def test_update_many_join(db):
+    Item = db.table('Item')
+    Item.update_many(['category', 'name'], [(1, 2, 'apple'), (2, None, 'pen')], strategy='join')
+    assert db.connection.log == [
+        'UPDATE `Item` JOIN (VALUES ROW(%s, %s, %s), ROW(%s, %s, %s)) AS `_values`(`_key`, `_v0`, `_v1`)'
+        ' ON `Item`.`id` = `_values`.`_key`'
+        ' SET `Item`.`category` = `_values`.`_v0`, `Item`.`name` = `_values`.`_v1`',
+    ]
+    assert db.connection.values == [[1, 2, 'apple', 2, None, 'pen']]
+
+    # JOIN for the large chunks by default
+    Item.UPDATE_MANY_CASE_MAX_ROWS = 1
+    Item.update_many(['name'], {1: ('a',), 2: ('b',)})
+    assert db.connection.log[-1].startswith('UPDATE `Item` JOIN (VALUES')
+    with pytest.raises(RuntimeError):
+        Item.update_many(['name'], {1: ('a',)}, strategy='merge')
+
+@pytest.fixture
+def events(fake_connection):
+    db = Database('DB')
+    Table(db, 'Event', [
+        Column('id', Int, is_primary=True),
+        Column('name', VarChar(32), nullable=True),
+        Column('day', Date, nullable=True),
+        Column('at', DateTime, nullable=True),
+        Column('duration', Time, nullable=True),
+        Column('note', 'VARCHAR(32)', nullable=True), # (Not a DataType object)
+    ])
+    db.finalize_tables()
+    db.connection = fake_connection
+    return db.table('Event')
+
+
+EVENT = (1, 'launch', datetime.date(2020, 1, 2), datetime.datetime(2020, 1, 2, 3, 4, 5), datetime.timedelta(hours=-1), datetime.date(2020, 1, 3))
+
+
+def test_param_converters(events):
+    converters = events.param_converters(['id', 'name', 'day', 'note'])
+    assert converters[:2] == [None, None]
+    assert converters[2]('x') == 'x' and converters[3] == events.to_query_exec_val
+    # Chosen once per column set and protocol
+    assert events.param_converters(['id', 'name', 'day', 'note']) is converters
+    assert events.param_converters(['id', 'name', 'day', 'note'], binary=True) is not converters
+    assert events.param_converters(['id', 'name', 'day'], binary=True) == [None, None, None]
+
+
+def test_to_query_exec_vals_text(events):
+    columns = [c.name for c in events.columns]
+    assert events.to_query_exec_vals(columns, [EVENT, (2, None, None, None, None, None)]) == [
+        (1, 'launch', '2020-01-02', '2020-01-02T03:04:05', '-01:00:00', '2020-01-03'),
+        (2, None, None, None, None, None),
+    ]
+    # The values not of the column type are passed as they are (checked by the server or by `validate`)
+    assert events.to_query_exec_vals(['day', 'duration'], [('2020-01-02', 3600)]) == [('2020-01-02', 3600)]
+    assert events.to_query_exec_vals(['id', 'name'], [(1, 'a')]) == [(1, 'a')]
+    assert events.to_query_exec_vals(columns, []) == []
+
+
+def test_to_query_exec_vals_binary(events):
+    events.db.connection.prepared = True
+    columns = ['id', 'day', 'at', 'duration']
+    assert events.to_query_exec_vals(columns, [EVENT[:1] + EVENT[2:5]]) == [EVENT[:1] + EVENT[2:5]]
+
+
+def test_insert_and_update_params(events):
+    events.insert(['id', 'day', 'at'], [(1, EVENT[2], EVENT[3]), (2, None, EVENT[3])])
+    assert events.db.connection.log == ['INSERT INTO `Event`(`id`, `day`, `at`) VALUES(%s, %s, %s)']
+    assert events.db.connection.values == [[(1, '2020-01-02', '2020-01-02T03:04:05'), (2, None, '2020-01-02T03:04:05')]]
+
+    events.update({'day': EVENT[2], 'name': events['note']}, events['id'] == 1)
+    assert events.db.connection.log[-1] == 'UPDATE `Event` SET `day` = %s, `name` = `Event`.`note` WHERE(`Event`.`id` = 1)'
+    assert events.db.connection.values[-1] == ['2020-01-02']
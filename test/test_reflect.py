@@ -0,0 +1,115 @@
+import decimal
+import pytest
+from sql.datatypes import Double, Int, UnsignedInt
+from sql.objects import Database
+from sql.reflect import parse_column_type
+
+COLUMNS = [
+    ('Category', 'id', 'int', 'NO', None, 'auto_increment'),
+    ('Category', 'name', 'varchar(32)', 'NO', None, ''),
+    ('Item', 'id', 'int unsigned', 'NO', None, ''),
+    ('Item', 'category', 'int', 'YES', None, ''),
+    ('Item', 'code', 'varchar(16)', 'NO', None, ''),
+    ('Item', 'note', 'text', 'YES', None, ''),
+    ('Item', 'price', 'decimal(10,2)', 'NO', '0.00', ''),
+    ('Item', 'created', 'datetime', 'NO', 'CURRENT_TIMESTAMP', 'DEFAULT_GENERATED'),
+    ('Log', 'a', 'int', 'NO', None, ''),
+    ('Log', 'b', 'int', 'NO', None, ''),
+]
+STATISTICS = [
+    ('Category', 'PRIMARY', 'id', 0, None),
+    ('Item', 'PRIMARY', 'id', 0, None),
+    ('Item', 'code', 'code', 0, None),
+    ('Item', 'idx_note', 'note', 1, 64),
+    ('Item', 'idx_price_category', 'price', 1, None),
+    ('Item', 'idx_price_category', 'category', 1, None),
+    ('Log', 'PRIMARY', 'a', 0, None),
+    ('Log', 'PRIMARY', 'b', 0, None),
+]
+LINKS = [('Item', 'category', 'Category', 'id')]
+
+
+class Schema:
+    """ Responder of the fake connection answering the INFORMATION_SCHEMA queries """
+
+    def __init__(self) -> None:
+        self.checksum = ('10:1', '8:2', '1:3')
+
+    def __call__(self, text, values):
+        if 'CRC32(' in text:
+            return [self.checksum]
+        if 'FROM INFORMATION_SCHEMA.COLUMNS' in text:
+            return COLUMNS
+        if 'FROM INFORMATION_SCHEMA.STATISTICS' in text:
+            return STATISTICS
+        if 'FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE' in text:
+            return LINKS
+        return []
+
+
+@pytest.mark.parametrize('column_type, type_sql', [
+    ('int(11)', 'INT'),
+    ('int unsigned', 'INT UNSIGNED'),
+    ('bigint(20) unsigned zerofill', 'BIGINT UNSIGNED'),
+    ('varchar(32)', 'VARCHAR(32)'),
+    ('decimal', 'DECIMAL(10, 0)'),
+    ('decimal(12,4)', 'DECIMAL(12, 4)'),
+    ('numeric(5,2)', 'DECIMAL(5, 2)'),
+    ('double', 'DOUBLE'),
+    ('timestamp', 'TIMESTAMP'),
+    ("enum('a','b')", "enum('a','b')"),
+    ('json', 'json'),
+])
+def test_parse_column_type(column_type, type_sql):
+    assert parse_column_type(column_type).type_sql() == type_sql
+
+
+def test_parse_column_type_pytypes():
+    assert parse_column_type('int(11)') is Int
+    assert parse_column_type('INT UNSIGNED') is UnsignedInt
+    assert parse_column_type('double') is Double
+    assert parse_column_type('decimal').pytype.basetype is decimal.Decimal
+    assert parse_column_type("enum('a','b')").pytype.basetype is str
+
+
+def test_reflect(fake_connection):
+    db = Database('DB')
+    db.connection = fake_connection
+    db.connection.responder = Schema()
+    tables = db.reflect()
+    # The table without a single-column primary key is skipped
+    assert [table.name for table in tables] == ['Category', 'Item']
+    assert sum(text.startswith('SELECT') for text in db.connection.log) == 4
+
+    Item = db.table('Item')
+    assert Item.key_column.name == 'id'
+    assert Item['code'].is_unique and Item['category'].nullable
+    assert Item['category'].links == [db.table('Category')['id']]
+    assert [(index.name, index.column_names(), index.prefixes) for index in Item.indexes] == [
+        ('idx_note', ['note'], [64]), ('idx_price_category', ['price', 'category'], [None, None]),
+    ]
+    assert db.table('Category')['id'].auto_increment
+
+
+def test_reflect_snapshot(fake_connection, tmp_path):
+    path = tmp_path / 'schema.json'
+    schema = Schema()
+    db = Database('DB')
+    db.connection = fake_connection
+    db.connection.responder = schema
+    db.reflect(snapshot=path)
+    assert path.exists()
+
+    # The snapshot is used if the checksum matches (only the checksum is queried)
+    db = Database('DB')
+    db.connection = fake_connection
+    fake_connection.log.clear()
+    assert [table.name for table in db.reflect(snapshot=path)] == ['Category', 'Item']
+    assert len(fake_connection.log) == 1
+
+    db = Database('DB')
+    db.connection = fake_connection
+    fake_connection.log.clear()
+    schema.checksum = ('11:1', '8:2', '1:3')
+    db.reflect(snapshot=path)
+    assert len(fake_connection.log) == 4
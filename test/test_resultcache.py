@@ -0,0 +1,80 @@
+import pytest
+from common.tablelib import Table
+from sql import objects
+from sql.datatypes import Int
+from sql.expression import Query
+from sql.resultcache import DirectoryCache, SQLiteCache, fingerprint
+
+
+@pytest.fixture(params=['directory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'directory':
+        return DirectoryCache(tmp_path / 'cache', max_bytes=4000, evict_interval=1)
+    return SQLiteCache(tmp_path / 'cache.sqlite', max_bytes=4000)
+
+
+def test_fingerprint():
+    assert fingerprint('SELECT 1') == fingerprint('SELECT 1')
+    assert fingerprint('SELECT 1', [1]) != fingerprint('SELECT 1', [2])
+
+
+def test_get_and_invalidate(cache):
+    table = Table(['id', 'name'], [[1, 'a'], [2, None]])
+    key = fingerprint('SELECT id, name FROM Item')
+    assert cache.get(key) is None
+
+    cache.put(key, table, cache.versions(['Item']), types=[int, str])
+    assert cache.get(key).rows == table.rows
+    assert cache.get(key, ['name']).rows == [['a'], [None]]
+
+    cache.bump(['Other'])
+    assert cache.get(key) is not None
+    cache.bump(['Item'])
+    assert cache.get(key) is None
+
+
+def test_eviction(cache):
+    table = Table(['id'], [[i] for i in range(50)])
+    for i in range(20):
+        cache.put(fingerprint('SELECT {}'.format(i)), table, cache.versions(['Item']))
+    assert cache.get(fingerprint('SELECT 0')) is None
+    assert cache.get(fingerprint('SELECT 19')) is not None
+
+
+def test_invalidated_on_commit(cache, fake_connection):
+    db = objects.Database('DB')
+    Item = objects.Table(db, 'Item', [objects.Column('id', Int, is_primary=True)])
+    db.finalize_tables()
+    db.connection = fake_connection
+    db.result_cache = cache
+
+    versions = cache.versions(['Item'])
+    Item.insert(['id'], [[1]])
+    assert cache.versions(['Item']) == versions # (Not committed yet)
+    assert db.uncommitted_tables == {'Item'}
+    db.commit()
+    assert cache.versions(['Item']) != versions
+
+    versions = cache.versions(['Item'])
+    Item.delete(None)
+    db.rollback()
+    assert cache.versions(['Item']) == versions and not db.uncommitted_tables
+
+
+def test_raw_write_notified(cache, fake_connection):
+    db = objects.Database('DB')
+    objects.Table(db, 'Item', [objects.Column('id', Int, is_primary=True)])
+    db.finalize_tables()
+    db.connection = fake_connection
+    db.result_cache = cache
+
+    # The raw writes are not detected
+    versions = cache.versions(['Item'])
+    db.execute(Query('DELETE FROM `Item`'))
+    db.commit()
+    assert cache.versions(['Item']) == versions
+
+    db.execute(Query('DELETE FROM `Item`'))
+    db.table_modified('Item')
+    db.commit()
+    assert cache.versions(['Item']) != versions
@@ -0,0 +1,158 @@
+import io
+import mysql.connector
+import pytest
+from conftest import FakeConnection
+from sql.datatypes import Int
+from sql.expression import Query
+from sql.objects import Column, Database, Table
+from sql.resultcache import DirectoryCache
+
+
+class FakeConnector:
+    """ Connector to a fake replica (the lag and the failures are set by the test) """
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.lag = 0.0
+        self.down = False
+        self.connections = []
+
+    def connect(self):
+        if self.down:
+            raise mysql.connector.Error('Cannot connect', errno=2003)
+        connection = FakeConnection()
+        connection.replica = self
+        connection.responder = lambda text, values: [(self.name,)]
+        self.connections.append(connection)
+        return connection
+
+
+def lost():
+    return mysql.connector.Error('Lost connection', errno=2013)
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Item', [Column('id', Int, is_primary=True)])
+    db.finalize_tables()
+    fake_connection.responder = lambda text, values: [('primary',)]
+    db.connection = fake_connection
+    return db
+
+
+def route(db, connectors, **options):
+    pings = []
+
+    def ping(connection):
+        pings.append(connection)
+        if connection.closed:
+            raise lost()
+
+    db.connect_replicas(connectors, measure_lag=lambda db, con: con.replica.lag, ping=ping, **options)
+    return pings
+
+
+def read(db) -> str:
+    return db.execute_read(Query('SELECT 1'))[0][0]
+
+
+def test_least_outstanding_and_lag(db):
+    connectors = [FakeConnector('r0'), FakeConnector('r1')]
+    route(db, connectors, lag_check_interval=0)
+    assert {read(db) for _ in range(20)} == {'r0', 'r1'}
+    assert all(len(connector.connections) == 1 for connector in connectors) # Reused
+
+    connectors[0].lag = 10.0
+    assert {read(db) for _ in range(10)} == {'r1'}
+    connectors[1].lag = None # Not replicating
+    assert read(db) == 'primary'
+    assert db.replica_router.primary_reads == 1
+
+
+def test_connect_failure_marks_down(db):
+    connectors = [FakeConnector('r0'), FakeConnector('r1')]
+    connectors[0].down = True
+    route(db, connectors)
+    assert {read(db) for _ in range(10)} == {'r1'}
+    replicas = db.replica_router.replicas
+    assert replicas[0].down_until > replicas[1].down_until
+    assert [replica.outstanding for replica in replicas] == [0, 0]
+
+
+def test_connection_lost_in_read_fails_over(db):
+    connectors = [FakeConnector('r0')]
+    route(db, connectors)
+    assert read(db) == 'r0'
+    connectors[0].connections[0].error = (lambda text: True, lost())
+    assert read(db) == 'primary'
+    assert db.replica_router.replicas[0].outstanding == 0
+    assert connectors[0].connections[0].closed
+
+    # The errors of the queries are raised
+    route(db, [FakeConnector('r1')])
+    read(db)
+    db.replica_router.replicas[0]._idle[0][0].error = (lambda text: True, mysql.connector.Error('Syntax', errno=1064))
+    with pytest.raises(mysql.connector.Error):
+        read(db)
+    assert db.replica_router.replicas[0].down_until < 0
+
+
+def test_idle_connection_pinged(db):
+    connectors = [FakeConnector('r0')]
+    pings = route(db, connectors, ping_idle_seconds=0)
+    assert read(db) == 'r0'
+    assert read(db) == 'r0'
+    assert pings == connectors[0].connections
+
+    connectors[0].connections[0].closed = True # Lost while idle
+    assert read(db) == 'r0'
+    assert len(connectors[0].connections) == 2 # Reconnected
+
+    pings = route(db, [FakeConnector('r1')], ping_idle_seconds=60)
+    read(db), read(db)
+    assert pings == []
+
+
+def test_stream_read(db):
+    connectors = [FakeConnector('r0')]
+    route(db, connectors)
+    assert list(db.stream_read(Query('SELECT 1'), batch_size=1)) == [[('r0',)]]
+    assert db.replica_router.reads == 1
+
+    # Failed over before the first batch
+    connectors[0].connections[0].error = (lambda text: True, lost())
+    assert list(db.stream_read(Query('SELECT 1'))) == [[('primary',)]]
+    assert db.replica_router.primary_reads == 1
+
+    # The connection of the stream not read to the end is not reused
+    route(db, [FakeConnector('r1')])
+    stream = db.stream_read(Query('SELECT 1'), batch_size=1)
+    next(stream)
+    stream.close()
+    replica = db.replica_router.replicas[0]
+    assert replica.outstanding == 0 and replica._idle == []
+
+
+def test_export_reads_from_replica(db):
+    connectors = [FakeConnector('r0')]
+    route(db, connectors)
+    out = io.BytesIO()
+    db.prepare_select([db.table('Item')['id']]).export(out, 'ndjson')
+    assert out.getvalue() == b'{"Item.id":"r0"}\n'
+    assert db.connection.log == []
+    assert connectors[0].connections[0].log == ['SELECT `Item`.`id` FROM `Item`']
+
+
+def test_cached_select_reads_from_primary(db, tmp_path):
+    db.result_cache = DirectoryCache(tmp_path / 'cache')
+    connectors = [FakeConnector('r0')]
+    route(db, connectors)
+    Item = db.table('Item')
+    # The rows of a lagging replica are not cached (the miss reads the primary)
+    assert db.prepare_select([Item['id']]).exec(cache=True).result[0][0] == 'primary'
+    assert db.prepare_select([Item['id']]).exec(cache=True).result[0][0] == 'primary'
+    assert db.connection.log == ['SELECT `Item`.`id` FROM `Item`']
+    assert db.replica_router.reads == 0
+    # The uncached reads go to the replica
+    assert db.prepare_select([Item['id']]).exec().result[0][0] == 'r0'
@@ -0,0 +1,93 @@
+import pytest
+from sql.datatypes import Int, VarChar
+from sql.expression import FuncExpr, OpExpr, Query
+from sql.objects import Column, Database, Table
+from sql.sharding import HashSharding, RangeSharding
+from sql.sqlite import SQLiteConnector
+
+
+@pytest.fixture(params=['hash', 'range'])
+def reviews(request, tmp_path):
+    db = Database('DB')
+    Review = Table(db, 'Review', [
+        Column('id', Int, is_primary=True),
+        Column('item', Int),
+        Column('score', Int),
+        Column('title', VarChar(16)),
+    ])
+    function = HashSharding(3) if request.param == 'hash' else RangeSharding([10, 20])
+    connectors = [SQLiteConnector(tmp_path / 'shard{}.sqlite'.format(i)) for i in range(3)]
+    with Review.shard('id', function, connectors) as sharded:
+        sharded.create()
+        sharded.insert(['id', 'item', 'score', 'title'], [[i, i % 4, (i * 7) % 10, 'r{}'.format(i)] for i in range(30)])
+        yield Review, sharded
+
+
+def test_hash_and_range_functions():
+    assert HashSharding(4).shard_of('abc') == HashSharding(4).shard_of('abc')
+    assert {HashSharding(4).shard_of(i) for i in range(100)} == {0, 1, 2, 3}
+    ranges = RangeSharding([10, 20])
+    assert [ranges.shard_of(v) for v in (0, 9, 10, 19, 20, 100)] == [0, 0, 1, 1, 2, 2]
+    assert ranges.shards_in_range(12, None) == {1, 2}
+    assert ranges.shards_in_range(None, 10) == {0, 1}
+    with pytest.raises(RuntimeError):
+        RangeSharding([20, 10])
+
+
+def test_insert_partitioned(reviews):
+    Review, sharded = reviews
+    results = sharded.execute(sharded.prepare_select(['id']).sql_query())
+    assert sorted(i for rows in results.values() for i, in rows) == list(range(30))
+    for shard, rows in results.items():
+        assert all(sharded.shard_of(i) == shard for i, in rows)
+
+
+def test_routing(reviews):
+    Review, sharded = reviews
+    assert sharded.target_shards(Review.id == 5) == {sharded.shard_of(5)}
+    assert sharded.target_shards(OpExpr('IN', Review.id, [5, 25])) == {sharded.shard_of(5), sharded.shard_of(25)}
+    assert sharded.target_shards((Review.id == 5) | (Review.id == 25)) == {sharded.shard_of(5), sharded.shard_of(25)}
+    assert sharded.target_shards((Review.id == 5) & (Review.score > 3)) == {sharded.shard_of(5)}
+    assert sharded.target_shards(Review.score == 5) == {0, 1, 2}
+    if isinstance(sharded.function, RangeSharding):
+        assert sharded.target_shards(Review.id >= 15) == {1, 2}
+        assert sharded.target_shards(3 > Review.id) == {0}
+
+    records = sharded.select(['id', 'score'], where=Review.id == 7).result
+    assert [tuple(r) for r in records] == [(7, 9)]
+
+
+def test_scatter_gather_ordered_and_limited(reviews):
+    Review, sharded = reviews
+    expected = sorted(([(i * 7) % 10, i] for i in range(30)), key=lambda r: (-r[0], r[1]))
+    select = sharded.select(['id'], where=Review.score >= 2, order=[(Review.score, 'DESC'), (Review.id, 'ASC')],
+        count=5, offset=3)
+    assert [r[0] for r in select.result] == [i for score, i in expected if score >= 2][3:8]
+
+    select = sharded.select(['id'], order=[(Review.id, 'ASC')])
+    assert [r[0] for r in select.result] == list(range(30))
+    assert len(sharded.select(['id'], count=4).result) == 4
+    with pytest.raises(RuntimeError):
+        sharded.select(['item'], group=[Review.item])
+
+
+def test_not_mergeable_selects(reviews):
+    Review, sharded = reviews
+    assert [tuple(r) for r in sharded.select([FuncExpr('COUNT', Review.id)], where=Review.id == 4).result] == [(1,)]
+    with pytest.raises(RuntimeError):
+        sharded.select([FuncExpr('COUNT', Review.id)])
+    with pytest.raises(RuntimeError):
+        sharded.select([Query('DISTINCT', Review.item)])
+    with pytest.raises(RuntimeError):
+        sharded.select(['id'], order=[(Review.title, 'ASC')])
+
+
+def test_update_and_delete(reviews):
+    Review, sharded = reviews
+    assert sharded.update({'score': 100}, Review.id == 3) == 1
+    assert [tuple(r) for r in sharded.select(['score'], where=Review.id == 3).result] == [(100,)]
+    assert sharded.update({'score': 0}, Review.item == 1) == 8
+    assert sharded.delete(Review.id < 10) == 10
+    assert len(sharded.select(['id']).result) == 20
+    with pytest.raises(RuntimeError):
+        sharded.delete(Review.score == 0, 1)
@@ -0,0 +1,86 @@
+import pytest
+from sql.datatypes import Int, VarChar
+from sql.objects import Column, Database, Table
+from sql.stats import DEFAULT_EQ_SELECTIVITY
+
+TABLE_ROWS = [('Category', 10), ('Item', 1000)]
+INDEX_ROWS = [
+    ('Category', 'PRIMARY', 'id', 0, 10),
+    ('Item', 'PRIMARY', 'id', 0, 1000),
+    ('Item', 'idx_category', 'category', 1, 10),
+    ('Item', 'idx_price_name', 'price', 1, 500),
+    ('Item', 'idx_price_name', 'name', 1, 900),
+]
+MIN_MAX = {'Category': (1, 10), 'Item': (1, 1000, 1, 10, 0, 100)}
+
+
+def responder(text, values):
+    if 'INFORMATION_SCHEMA.TABLES' in text:
+        return TABLE_ROWS
+    if 'INFORMATION_SCHEMA.STATISTICS' in text:
+        return INDEX_ROWS
+    if text.startswith('SELECT MIN('):
+        return [MIN_MAX[text.split('FROM `')[1].split('`')[0]]]
+    return []
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Category', [Column('id', Int, is_primary=True), Column('name', VarChar(32))])
+    Table(db, 'Item', [
+        Column('id', Int, is_primary=True),
+        Column('category', Int, links=[db.table('Category').id]),
+        Column('price', Int),
+        Column('name', VarChar(32)),
+    ])
+    db.finalize_tables()
+    db.connection = fake_connection
+    db.connection.responder = responder
+    return db
+
+
+def test_collect_stats(db):
+    stats = db.collect_stats()
+    item = stats.table('Item')
+    assert item.rows == 1000
+    assert [(index.name, index.columns, index.unique) for index in item.indexes] == [
+        ('PRIMARY', ['id'], True), ('idx_category', ['category'], False), ('idx_price_name', ['price', 'name'], False),
+    ]
+    assert (item.column('price').min, item.column('price').max) == (0, 100)
+    assert item.is_unique('id') and not item.is_unique('price')
+    assert item.leading_index('price').name == 'idx_price_name' and item.leading_index('name') is None
+    assert item.distinct('category') == 10
+    # Cached until the TTL passes
+    assert db.collect_stats() is stats
+    assert db.collect_stats(refresh=True) is not stats
+
+
+def test_estimate_range_and_equality(db):
+    Item = db.table('Item')
+    estimate = db.prepare_select([Item['id']], where=Item['price'] >= 75).estimate()
+    assert estimate.rows == pytest.approx(250)
+    assert estimate.full_scans == []
+
+    estimate = db.prepare_select([Item['id']], where=(Item['category'] == 3) & (Item['price'] < 50)).estimate()
+    assert estimate.rows == pytest.approx(1000 / 10 * 0.5)
+
+    # The non-leading column of an index has no distinct count (the default selectivity), and is not indexed
+    estimate = db.prepare_select([Item['id']], where=Item['name'] == 'pen').estimate()
+    assert estimate.rows == pytest.approx(1000 / (1000 * DEFAULT_EQ_SELECTIVITY))
+    assert estimate.full_scans == ['Item']
+    assert estimate.warnings() == ['Full scan of `Item`']
+
+
+def test_estimate_join_group_and_limit(db):
+    Item, Category = db.table('Item'), db.table('Category')
+    select = db.prepare_select([(Item >> Category)['name']], where=Item['price'] > 90)
+    estimate = select.estimate()
+    assert estimate.rows == pytest.approx(100)
+    assert estimate.unindexed_joins == [] and estimate.exploding_joins == []
+
+    select = db.prepare_select([Item['category']], group=[Item['category']])
+    assert select.estimate().rows == pytest.approx(10)
+
+    select = db.prepare_select([Item['id']], count=20, offset=10)
+    assert select.estimate().rows == 20
@@ -0,0 +1,47 @@
+import datetime
+from common.tablelib import Table
+from common import tablefile
+
+
+def _sample_table():
+    return Table(['id', 'price', 'name', 'data', 'day', 'at', 'flag', 'big'], [
+        [i, i * 0.5, 'név{}'.format(i) if i % 3 else None, bytes([i]),
+         datetime.date(2020, 1, 1 + i), datetime.datetime(2020, 1, 2, 3, 4, 5, i),
+         i % 2 == 0, 2 ** 70 if i == 5 else i]
+        for i in range(20)
+    ])
+
+
+def test_roundtrip():
+    table = _sample_table()
+    data = tablefile.dumps(table)
+    assert tablefile.loads(data).rows == table.rows
+
+    table_file = tablefile.TableFile(data)
+    assert table_file.column_names == table.column_names
+    assert [table_file.kind(name) for name in table.column_names] == [
+        'int', 'float', 'str', 'bytes', 'date', 'datetime', 'bool', 'pickle']
+
+
+def test_projection_and_mmap(tmp_path):
+    table = _sample_table()
+    path = tmp_path / 'table.tblc'
+    with open(path, 'wb') as f:
+        tablefile.dump(table, f)
+
+    projected = tablefile.load(path, ['name', 'id'])
+    assert projected.column_names == ['name', 'id']
+    assert projected.rows == [[row[2], row[0]] for row in table.rows]
+
+    with tablefile.open_file(path) as table_file:
+        ids = table_file.raw_column('id')
+        assert isinstance(ids, memoryview) and sum(ids) == sum(range(20))
+        assert table_file.raw_column('name') is None
+        del ids
+
+
+def test_types():
+    table = Table(['a'], [[None], [None]])
+    table_file = tablefile.TableFile(tablefile.dumps(table, types=[int]))
+    assert table_file.kind('a') == 'int'
+    assert table_file.column('a') == [None, None]
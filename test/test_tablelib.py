@@ -0,0 +1,86 @@
+from common.tablelib import Table, record_class
+
+
+def test_record_class():
+    Record = record_class(['Item.id', 'Item.group.category.name', 'Item.group.name', 'Item.name'])
+    assert Record is record_class(('Item.id', 'Item.group.category.name', 'Item.group.name', 'Item.name'))
+
+    record = Record((1, 'fruit', 'apple', 'apple A'))
+    assert record == (1, 'fruit', 'apple', 'apple A')
+    assert tuple(record) == (1, 'fruit', 'apple', 'apple A')
+    assert len(record) == 4
+    assert record[0] == 1
+    assert record[-1] == 'apple A'
+    assert record[1:3] == ('fruit', 'apple')
+    assert record.value('Item.group.name') == 'apple'
+    assert record.Item.id == 1
+    assert record.Item.group.category.name == 'fruit'
+    assert record.Item.group.name == 'apple'
+    assert record.Item.name == 'apple A'
+    assert record.Item is record # (Merged into the record, not allocated)
+    assert record.as_dict()['Item.name'] == 'apple A'
+
+    item_id, *_ = record
+    assert item_id == 1
+
+    try:
+        record.foo = 1
+        assert False
+    except AttributeError:
+        pass
+
+
+def test_record_class_conflicting_names():
+    Record = record_class(['Item.group', 'Item.group.name', 'COUNT(`Item`.`id`)'])
+    record = Record((3, 'apple', 10))
+    assert record.value('Item.group') == 3
+    assert record.Item.group.name == 'apple'
+    assert record.value('COUNT(`Item`.`id`)') == 10
+
+
+def test_record_name_index():
+    # (Compatible with the former `Record` class)
+    Record = record_class(['Item.id', 'COUNT(`Item`.`id`)'])
+    record = Record((1, 10))
+    assert record['Item.id'] == 1
+    assert record['COUNT(`Item`.`id`)'] == 10
+    assert record[1] == 10
+    try:
+        record['Item.name']
+        assert False
+    except KeyError:
+        pass
+
+
+def test_table_records():
+    table = Table(['id', 'name'], [[1, 'apple'], [2, 'orange']])
+    records = list(table)
+    assert records[0].value('name') == 'apple'
+    assert records[1].name == 'orange'
+    assert records[1] == (2, 'orange')
+
+
+def test_table_indexes():
+    table = Table(['id', 'group', 'price'], [
+        [1, 'fruit', 120],
+        [2, 'fruit', 80],
+        [3, 'vegetable', 200],
+        [4, 'vegetable', None],
+        [5, 'meat', 500],
+    ])
+    assert [r.id for r in table.lookup('group', 'fruit')] == [1, 2]
+    assert [r.id for r in table.lookup(('group', 'price'), ('vegetable', 200))] == [3]
+    assert len(table.lookup('group', 'fish')) == 0
+    assert table.hash_index('group') is table.hash_index(['group'])
+
+    assert [r.id for r in table.range('price', 100, 500)] == [1, 3]
+    assert [r.id for r in table.range('price', 100, 500, include_high=True)] == [1, 3, 5]
+    assert [r.id for r in table.range('price', 120, include_low=False)] == [3, 5]
+    assert [r.id for r in table.range('price', high=120)] == [2]
+    assert table.range('price')[0].price == 80
+
+    index = table.hash_index('group')
+    table.append([6, 'fruit', 90])
+    assert table.hash_index('group') is not index
+    assert [r.id for r in table.lookup('group', 'fruit')] == [1, 2, 6]
+    assert [r.id for r in table.range('price', 80, 100)] == [2, 6]
@@ -0,0 +1,101 @@
+import mysql.connector
+import pytest
+from sql.datatypes import Int
+from sql.expression import Query
+from sql.objects import Column, Database, Table
+
+
+def lock_wait_timeout():
+    return mysql.connector.Error('Lock wait timeout exceeded', errno=1205)
+
+def deadlock():
+    return mysql.connector.Error('Deadlock found', errno=1213)
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Item', [Column('id', Int, is_primary=True)])
+    db.finalize_tables()
+    db.connection = fake_connection
+    return db
+
+
+def test_nested_savepoints(db):
+    with db.transaction(isolation='read committed'):
+        with db.transaction():
+            db.execute(Query('UPDATE 1'))
+        with pytest.raises(ValueError):
+            with db.transaction():
+                raise ValueError()
+    assert db.connection.log == [
+        'SET TRANSACTION ISOLATION LEVEL READ COMMITTED', 'START TRANSACTION',
+        'SAVEPOINT `sp_1`', 'UPDATE 1', 'RELEASE SAVEPOINT `sp_1`',
+        'SAVEPOINT `sp_1`', 'ROLLBACK TO SAVEPOINT `sp_1`', 'RELEASE SAVEPOINT `sp_1`',
+        'COMMIT',
+    ]
+    assert db.transaction_depth == 0
+
+
+def test_nested_lock_wait_timeout_rolls_back_to_savepoint(db):
+    with db.transaction():
+        with pytest.raises(mysql.connector.Error):
+            with db.transaction():
+                db.execute(Query('UPDATE 1'))
+                raise lock_wait_timeout()
+    assert 'ROLLBACK TO SAVEPOINT `sp_1`' in db.connection.log
+    assert db.connection.log[-1] == 'COMMIT'
+
+    db.connection.log.clear()
+    with pytest.raises(mysql.connector.Error):
+        with db.transaction():
+            with db.transaction():
+                raise deadlock()
+    assert 'ROLLBACK TO SAVEPOINT `sp_1`' not in db.connection.log
+    assert db.connection.log[-1] == 'ROLLBACK'
+
+
+def test_run_transaction_retries(db):
+    calls = []
+
+    def func(error):
+        calls.append(error)
+        if len(calls) < 3:
+            raise error()
+        return len(calls)
+
+    assert db.run_transaction(func, deadlock, backoff=0) == 3
+    assert db.connection.log.count('ROLLBACK') == 2
+
+    # The lock wait timeout is retried from the savepoint in an outer transaction, the deadlock is not
+    calls.clear()
+    with db.transaction():
+        assert db.run_transaction(func, lock_wait_timeout, backoff=0) == 3
+    calls.clear()
+    with pytest.raises(mysql.connector.Error):
+        with db.transaction():
+            db.run_transaction(func, deadlock, backoff=0)
+    assert len(calls) == 1
+
+
+def test_group_commit(db):
+    with db.group_commit(interval=10, max_transactions=2) as group_commit:
+        with group_commit.transaction(wait=False) as group:
+            db.execute(Query('UPDATE 1'))
+        assert not group.wait(0)
+        with group_commit.transaction(wait=False):
+            db.execute(Query('UPDATE 2'))
+        assert group.wait(1)
+    assert group_commit.commits == 1 and group_commit.transactions == 2
+    assert db.connection.log.count('COMMIT') == 1
+
+
+def test_group_commit_error_reaches_waiters(db):
+    with db.group_commit(interval=10) as group_commit:
+        with group_commit.transaction(wait=False) as group:
+            db.execute(Query('UPDATE 1'))
+        with pytest.raises(mysql.connector.Error):
+            with group_commit.transaction(wait=False):
+                raise deadlock()
+        with pytest.raises(mysql.connector.Error):
+            group.wait(1)
@@ -0,0 +1,53 @@
+import decimal
+import pytest
+from sql.datatypes import DecimalOf, Double, Int, TinyInt, VarChar
+from sql.objects import Column, Database, Table
+from sql.validation import TableValidator, ValidationError
+
+db = Database('DB')
+Item = Table(db, 'Item', [
+    Column('id', Int, is_primary=True, auto_increment=True),
+    Column('name', VarChar(4)),
+    Column('rank', TinyInt, nullable=True),
+    Column('weight', Double),
+    Column('price', DecimalOf(10, 2)),
+])
+db.finalize_tables()
+
+
+def test_valid_rows():
+    validator = TableValidator(Item)
+    assert validator.validate([]) == []
+    assert validator.validate([
+        (1, 'abc', 5, 1.5, decimal.Decimal('9.99')),
+        (None, 'abcd', None, 2, 10), # ints for DOUBLE and DECIMAL
+        (3, '', -128, 0.0, 1.25),
+    ]) == []
+
+
+def test_violations():
+    validator = TableValidator(Item)
+    violations = validator.validate([
+        (1, 'abcde', 5, 1.5, 1),
+        (2, 'a', 128, '1.5', None),
+        (3, 'a'),
+    ])
+    assert [(v.row_index, v.column) for v in violations] == [(2, None)]
+
+    violations = validator.validate([
+        (1, 'abcde', 5, 1.5, 1),
+        (2, None, 128, '1.5', decimal.Decimal(2)),
+        (3, 'a', 1, 2.0, 'x'),
+    ])
+    assert [(v.row_index, v.column.name, v.value) for v in violations] == [
+        (0, 'name', 'abcde'), (1, 'name', None), (1, 'rank', 128), (1, 'weight', '1.5'), (2, 'price', 'x'),
+    ]
+    with pytest.raises(ValidationError) as e:
+        validator.expect_valid([(1, 'abcde', 5, 1.5, 1)])
+    assert len(e.value.violations) == 1
+
+
+def test_columns_subset():
+    validator = TableValidator(Item, [Item['name'], Item['price']])
+    assert validator.validate([('abc', 1), ('abc', 1.5)]) == []
+    assert [v.row_index for v in validator.validate([('abc', 1), ('abc', b'1')])] == [1]
@@ -0,0 +1,118 @@
+import decimal
+import math
+import sqlite3
+import pytest
+from sql.datatypes import Double, Int, VarChar
+from sql.expression import FuncExpr, OpExpr, Query, Values
+from sql.objects import Column, Database, Table
+from sql.vectorize import compile_expr, evaluate, np
+
+db = Database('DB')
+T = Table(db, 'T', [
+    Column('id', Int, is_primary=True),
+    Column('a', Int, nullable=True),
+    Column('b', Double),
+    Column('s', VarChar(16), nullable=True),
+])
+db.finalize_tables()
+
+ROWS = [
+    (1, 7, 2.5, 'apple'),
+    (2, -7, -2.5, 'Banana'),
+    (3, None, 0.5, None),
+    (4, 0, 1.25, 'cherry'),
+    (5, 3, -1.5, 'APRICOT'),
+]
+
+# The expressions evaluated the same as SQL (compared with SQLite)
+# (ROUND of the floats differs: half to even in MySQL, half away from zero in SQLite)
+EXPRESSIONS = [
+    T['a'] + 1,
+    T['a'] * T['b'],
+    T['a'] - T['b'],
+    T['b'] / 2.0,
+    OpExpr('%', T['a'], 3),
+    T['a'] > 0,
+    T['a'] == 7,
+    OpExpr('AND', T['a'] > 0, T['b'] > 0),
+    OpExpr('OR', T['a'] > 0, T['b'] > 0),
+    OpExpr('LIKE', T['s'], 'a%'),
+    FuncExpr('ABS', T['b']),
+    FuncExpr('UPPER', T['s']),
+    FuncExpr('LOWER', T['s']),
+    FuncExpr('COALESCE', T['a'], 0),
+    FuncExpr('IFNULL', T['s'], 'none'),
+    FuncExpr('LENGTH', T['s']),
+]
+
+
+@pytest.fixture(scope='module')
+def sqlite():
+    con = sqlite3.connect(':memory:')
+    con.execute('CREATE TABLE T (id INT, a INT, b DOUBLE, s TEXT)')
+    con.executemany('INSERT INTO T VALUES (?, ?, ?, ?)', ROWS)
+    yield con
+    con.close()
+
+
+def columns():
+    return {'T.' + name: [row[i] for row in ROWS] for i, name in enumerate(['id', 'a', 'b', 's'])}
+
+
+def same(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b)
+    return a == b
+
+
+@pytest.mark.parametrize('use_numpy', [False, True] if np is not None else [False])
+@pytest.mark.parametrize('expr', EXPRESSIONS, ids=lambda expr: Query(expr).query_text())
+def test_same_as_sql(sqlite, expr, use_numpy):
+    expected = [row[0] for row in sqlite.execute('SELECT {} FROM T ORDER BY id'.format(Query(expr).query_text()))]
+    values = evaluate(expr, columns(), use_numpy=use_numpy)
+    values = values.tolist() if np is not None and isinstance(values, np.ndarray) else values
+    assert all(same(v, e) for v, e in zip(values, expected)), (values, expected)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True] if np is not None else [False])
+def test_round(use_numpy):
+    # The floats (DOUBLE) are rounded half to even as MySQL
+    b = [2.5, -2.5, 0.5, 1.5, -0.5, 2.25]
+    assert list(evaluate(FuncExpr('ROUND', T['b']), {'T.b': b}, use_numpy=use_numpy)) == [2, -2, 0, 2, -0, 2]
+    assert list(evaluate(FuncExpr('ROUND', T['b'], 1), {'T.b': [0.25, 0.35, 25.0]}, use_numpy=use_numpy)) == [0.2, 0.4, 25]
+    # The exact values (INT and DECIMAL) are rounded half away from zero
+    a = [15, -25, 14, 5]
+    assert list(evaluate(FuncExpr('ROUND', T['a'], -1), {'T.a': a}, use_numpy=use_numpy)) == [20, -30, 10, 10]
+    assert list(evaluate(FuncExpr('ROUND', T['b'], -1), {'T.b': [25.0, 35.0]}, use_numpy=use_numpy)) == [20, 40]
+
+
+def test_round_decimal():
+    values = [decimal.Decimal('2.5'), decimal.Decimal('-2.5'), decimal.Decimal('1.25')]
+    assert evaluate(FuncExpr('ROUND', T['b'], 1), {'T.b': values}) == [
+        decimal.Decimal('2.5'), decimal.Decimal('-2.5'), decimal.Decimal('1.3'),
+    ]
+    assert evaluate(FuncExpr('ROUND', T['b']), {'T.b': values}) == [3, -3, 1]
+
+
+def test_string_comparison_case_insensitive():
+    columns = {'T.s': ['apple', 'APPLE', 'Banana', None]}
+    assert evaluate(T['s'] == 'Apple', columns) == [True, True, False, None]
+    assert evaluate(OpExpr('LIKE', T['s'], 'ap%'), columns) == [True, True, False, None]
+    assert evaluate(T['s'] < 'b', columns) == [True, True, False, None]
+    assert evaluate(OpExpr('<=>', T['s'], 'BANANA'), columns) == [False, False, True, False]
+
+
+@pytest.mark.parametrize('use_numpy', [False, True] if np is not None else [False])
+def test_in(use_numpy):
+    values = evaluate(OpExpr('IN', T['a'], Values([7, 3])), columns(), use_numpy=use_numpy)
+    assert [bool(v) if v is not None else None for v in values] == [True, False, None, False, True]
+
+
+def test_constants_and_columns():
+    compiled = compile_expr(T['a'] + FuncExpr('ROUND', 3))
+    assert list(compiled.columns) == ['T.a']
+    assert list(compiled({'T.a': [1, 2]})) == [4, 5]
+    with pytest.raises(RuntimeError):
+        compile_expr(FuncExpr('ROUND', 1.5))({})
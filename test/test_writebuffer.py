@@ -0,0 +1,60 @@
+import pytest
+from sql.datatypes import Int, VarChar
+from sql.objects import Column, Database, Table
+
+
+class FailingConnector:
+    def __init__(self) -> None:
+        self.error = ConnectionError('Cannot connect')
+
+    def connect(self):
+        raise self.error
+
+
+@pytest.fixture
+def db(fake_connection):
+    db = Database('DB')
+    Table(db, 'Log', [Column('id', Int, is_primary=True), Column('message', VarChar(64))])
+    db.finalize_tables()
+    db.connection = fake_connection
+    return db
+
+
+def test_insert_buffer(db):
+    Log = db.table('Log')
+    with Log.insert_buffer(['id', 'message'], max_rows=2, max_delay=10) as buffer:
+        for i in range(3):
+            buffer.append((i, 'message {}'.format(i)))
+        assert buffer.flush(1)
+        buffer.append((3, 'last'))
+    assert (buffer.rows, buffer.flushes) == (4, 3)
+    assert db.connection.log == [db.connection.log[0], 'COMMIT'] * 3
+    assert [len(values) for values in db.connection.values if values is not None] == [2, 1, 1]
+    with pytest.raises(RuntimeError):
+        buffer.append((4, 'closed'))
+
+
+def test_insertion_error_handled(db):
+    failed = []
+    db.connection.error = (lambda text: text.startswith('INSERT'), ValueError('Failed'))
+    with db.table('Log').insert_buffer(['id', 'message'], on_error=lambda e, rows: failed.extend(rows)) as buffer:
+        buffer.append((1, 'a'))
+        buffer.flush(1)
+        buffer.append((2, 'b'))
+    assert failed == [(1, 'a'), (2, 'b')]
+    assert not buffer.errors
+
+
+def test_connect_failure(db):
+    db.connector = FailingConnector()
+    buffer = db.table('Log').insert_buffer(['id', 'message'])
+    buffer._thread.join(1)
+    assert buffer.errors == [db.connector.error]
+    with pytest.raises(RuntimeError) as e:
+        buffer.append((1, 'a'))
+    assert e.value.__cause__ is db.connector.error
+    with pytest.raises(RuntimeError):
+        buffer.flush(1)
+    with pytest.raises(RuntimeError) as e:
+        buffer.close(1)
+    assert e.value.__cause__ is db.connector.error